@@ -0,0 +1,353 @@
+# api_server.py - Headless JSON recommendation service sharing the app's catalog and model
+import argparse
+import asyncio
+import json
+import math
+import os
+import time
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import tornado.httpserver
+import tornado.netutil
+import tornado.process
+import tornado.web
+
+import catalog
+import catalog_store
+from recommendation_cache import RecommendationCache, model_fingerprint
+from recommender import (DEFAULT_MMR_LAMBDA, FilterIndex, diversity_settings, filtered_neighbors, mmr_rerank,
+                         recommend_batch, recommendation_filters)
+from search_index import TitleSearchIndex
+
+MOVIE_FIELDS = [
+    'id', 'title', 'release_year', 'genres', 'cast', 'director', 'rating', 'vote_count',
+    'popularity', 'revenue', 'poster_path', 'streaming_on', 'original_language'
+]
+MAX_RESULTS = 100
+
+
+def to_json_value(value):
+    """Convert numpy/pandas scalars to JSON-safe Python values (NaN and NA become null)."""
+    if isinstance(value, (list, tuple)):
+        return [to_json_value(v) for v in value]
+    if value is pd.NA:
+        return None
+    if isinstance(value, np.floating) and value.dtype.itemsize < 8:
+        # float32 columns: the shortest repr ("7.3"), not the widened double
+        return float(str(value)) if np.isfinite(value) else None
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+class RecommendationService:
+    """Catalog, model and indexes loaded once, before worker processes are forked."""
+
+    def __init__(self, movies_df, vectors, search_index: TitleSearchIndex,
+                 details: Optional[catalog_store.CatalogDetails] = None):
+        self.movies = movies_df
+        self.vectors = vectors
+        self.search_index = search_index
+        # Store-backed catalogs keep list columns out of the frame (see catalog_store)
+        self.details = details
+        self.genre_lists = details.lists.get('genres') if details is not None else None
+        self.filter_index = FilterIndex.from_catalog(movies_df, details)
+        self.genre_bitmap = self.filter_index.genre_bitmap
+        self.model_version = model_fingerprint(vectors)
+        columns = set(movies_df.columns) | (set(details.lists) if details is not None else set())
+        self.fields = [f for f in MOVIE_FIELDS if f in columns]
+        self.position_by_id = {int(movie_id): pos for pos, movie_id in enumerate(movies_df['id'].tolist())}
+        # Filter results are memoized by their parameters, like the app's explorer view
+        self.filter = lru_cache(maxsize=256)(self._filter)
+
+    @classmethod
+    def from_artifacts(cls) -> "RecommendationService":
+        """Map the same catalog store (dataset and TF-IDF model) as the Streamlit app."""
+        path = catalog.find_dataset()
+        if path is None:
+            raise SystemExit("No dataset found. Run fetch_tmdb_data_enhanced.py and data_processing_enhanced.py first.")
+        movies_df, vectors, details = catalog_store.load_store(path)
+        popularity = movies_df['popularity'] if 'popularity' in movies_df.columns else None
+        search_index = TitleSearchIndex(movies_df['title'].astype(str).tolist(), popularity)
+        return cls(movies_df, vectors, search_index, details)
+
+    def _filter(self, genres: Tuple[str, ...], year_range: Optional[Tuple[int, int]], min_rating: float,
+                min_revenue: float, sort_by: str, ascending: bool) -> np.ndarray:
+        return catalog.filter_movies(self.movies, genres, year_range, min_rating, min_revenue, sort_by, ascending,
+                                     genre_lists=self.genre_lists)
+
+    def filtered_candidates(self, pos: int, num_candidates: int, filters: Tuple) -> Tuple[np.ndarray, np.ndarray]:
+        """Nearest neighbours of pos among the movies passing filters (see recommendation_filters)."""
+        indices, scores = filtered_neighbors(self.vectors, pos, num_candidates, self.filter_index.mask(filters))
+        keep = indices >= 0
+        return indices[keep], scores[keep]
+
+    def movie(self, pos: int) -> Dict:
+        return self.movies_at([pos])[0]
+
+    def movies_at(self, positions) -> List[Dict]:
+        rows = self.movies.iloc[np.asarray(positions, dtype=np.int64)]
+        if self.details is not None:
+            rows = self.details.expand(rows)
+        # Column-wise, so float32 columns reach to_json_value as float32 scalars, not widened floats
+        columns = {}
+        for field in self.fields:
+            column = rows[field]
+            values = column.to_numpy() if column.dtype == np.float32 else column.tolist()
+            columns[field] = [to_json_value(value) for value in values]
+        return [{field: columns[field][i] for field in self.fields} for i in range(len(rows))]
+
+
+class MicroBatcher:
+    """Collects concurrent single-seed requests and scores them with one recommend_batch call.
+
+    A batch is flushed when max_batch requests are waiting or max_wait_ms has passed
+    since the first one arrived. Scoring runs on a worker thread so the event loop
+    keeps accepting requests meanwhile.
+    """
+
+    def __init__(self, service: RecommendationService, max_batch: int = 64, max_wait_ms: float = 2.0):
+        self.service = service
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue: "asyncio.Queue[Tuple[int, int, asyncio.Future]]" = asyncio.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.batches = 0
+        self.batched_requests = 0
+
+    def start(self):
+        asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, pos: int, num_candidates: int) -> Tuple[np.ndarray, np.ndarray]:
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((pos, num_candidates, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Requests for the same seed share one row of the batch
+            seeds = sorted({pos for pos, _, _ in batch})
+            row_of = {pos: row for row, pos in enumerate(seeds)}
+            k = max(num for _, num, _ in batch)
+            try:
+                indices, scores = await loop.run_in_executor(
+                    self.executor, recommend_batch, self.service.vectors, seeds, k)
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.batched_requests += len(batch)
+            for pos, num, future in batch:
+                if not future.done():
+                    row = row_of[pos]
+                    candidates, relevance = indices[row][:num], scores[row][:num]
+                    keep = candidates >= 0
+                    future.set_result((candidates[keep], relevance[keep]))
+
+
+class BaseHandler(tornado.web.RequestHandler):
+    def initialize(self, service: RecommendationService, batcher: MicroBatcher, cache: RecommendationCache):
+        self.service = service
+        self.batcher = batcher
+        self.cache = cache
+
+    def write_json(self, payload: Dict, status: int = 200):
+        self.set_status(status)
+        self.set_header('Content-Type', 'application/json')
+        self.finish(json.dumps(payload))
+
+    def write_error(self, status_code: int, **kwargs):
+        reason = self._reason
+        if 'exc_info' in kwargs and isinstance(kwargs['exc_info'][1], tornado.web.HTTPError):
+            reason = kwargs['exc_info'][1].log_message or reason
+        self.write_json({'error': reason}, status_code)
+
+    def get_int(self, name: str, default: Optional[int] = None, low: int = 0, high: int = MAX_RESULTS) -> Optional[int]:
+        raw = self.get_argument(name, None)
+        if raw is None:
+            return default
+        try:
+            value = int(raw)
+        except ValueError:
+            raise tornado.web.HTTPError(400, f"'{name}' must be an integer")
+        return min(max(value, low), high)
+
+    def get_float(self, name: str, default: float) -> float:
+        raw = self.get_argument(name, None)
+        try:
+            return default if raw is None else float(raw)
+        except ValueError:
+            raise tornado.web.HTTPError(400, f"'{name}' must be a number")
+
+    def get_list(self, name: str) -> Tuple[str, ...]:
+        return tuple(value for value in self.get_argument(name, '').split(',') if value)
+
+    def get_year_range(self) -> Optional[Tuple[int, int]]:
+        year_min = self.get_int('year_min', None, low=0, high=10000)
+        year_max = self.get_int('year_max', None, low=0, high=10000)
+        if year_min is None and year_max is None:
+            return None
+        return (year_min if year_min is not None else 0, year_max if year_max is not None else 10000)
+
+
+class RecommendHandler(BaseHandler):
+    """GET /recommend?id=<tmdb id>&k=10&diversity=0.3  or  ?title=<query>&k=10
+
+    Optional filters: genres=, providers=, languages= (comma-separated, any of),
+    year_min=, year_max=, min_rating=. They are applied inside the neighbour search,
+    so k results come back whenever k movies qualify.
+    """
+
+    async def get(self):
+        k = self.get_int('k', 10, low=1)
+        diversity = min(max(self.get_float('diversity', 1 - DEFAULT_MMR_LAMBDA), 0.0), 1.0)
+        mmr_lambda = 1 - diversity
+        filters = recommendation_filters(self.get_list('genres'), self.get_year_range(),
+                                         self.get_float('min_rating', 0.0), self.get_list('providers'),
+                                         self.get_list('languages'))
+        pos = self.resolve_seed()
+        movie_id = int(self.service.movies['id'].iloc[pos])
+        key = (movie_id, k, diversity_settings(mmr_lambda), filters)
+        started = time.perf_counter()
+        positions = self.cache.peek(key, self.service.model_version)
+        if positions is None:
+            if filters is None:
+                candidates, relevance = await self.batcher.submit(pos, k * 3)
+            else:
+                # Filtered queries don't share candidates, so they skip the micro-batcher
+                candidates, relevance = await asyncio.get_running_loop().run_in_executor(
+                    self.batcher.executor, self.service.filtered_candidates, pos, k * 3, filters)
+            positions = self.cache.get_or_compute(
+                key,
+                lambda: mmr_rerank(self.service.vectors, self.service.genre_bitmap, candidates, relevance, k, mmr_lambda),
+                self.service.model_version)
+        self.write_json({
+            'seed': self.service.movie(pos),
+            'results': self.service.movies_at(positions),
+            'model_version': self.service.model_version,
+            'took_ms': round((time.perf_counter() - started) * 1000, 3),
+        })
+
+    def resolve_seed(self) -> int:
+        movie_id = self.get_argument('id', None)
+        if movie_id is not None:
+            try:
+                return self.service.position_by_id[int(movie_id)]
+            except (KeyError, ValueError):
+                raise tornado.web.HTTPError(404, f"Unknown movie id '{movie_id}'")
+        title = self.get_argument('title', None)
+        if title:
+            matches = self.service.search_index.search(title, limit=1)
+            if matches:
+                return matches[0][0]
+            raise tornado.web.HTTPError(404, f"No movie matches '{title}'")
+        raise tornado.web.HTTPError(400, "Pass 'id' or 'title'")
+
+
+class SearchHandler(BaseHandler):
+    """GET /search?q=<query>&limit=10"""
+
+    def get(self):
+        query = self.get_argument('q', '')
+        limit = self.get_int('limit', 10, low=1)
+        matches = self.service.search_index.search(query, limit=limit)
+        results = []
+        for pos, score in matches:
+            movie = self.service.movie(pos)
+            movie['score'] = score
+            results.append(movie)
+        self.write_json({'query': query, 'results': results})
+
+
+class FilterHandler(BaseHandler):
+    """GET /filter?genres=Action,Drama&year_min=&year_max=&min_rating=&min_revenue=&sort=Rating&ascending=0&offset=0&limit=20"""
+
+    def get(self):
+        genres = self.get_list('genres')
+        year_range = self.get_year_range()
+        sort_by = self.get_argument('sort', 'Popularity')
+        if sort_by not in catalog.SORT_COLUMNS:
+            raise tornado.web.HTTPError(400, f"'sort' must be one of {', '.join(catalog.SORT_COLUMNS)}")
+        positions = self.service.filter(
+            genres, year_range,
+            self.get_float('min_rating', 0.0), self.get_float('min_revenue', 0.0),
+            sort_by, self.get_argument('ascending', '0') in ('1', 'true'),
+        )
+        offset = self.get_int('offset', 0, high=len(positions))
+        limit = self.get_int('limit', 20, low=1)
+        self.write_json({
+            'total': int(len(positions)),
+            'offset': offset,
+            'results': self.service.movies_at(positions[offset:offset + limit]),
+        })
+
+
+class StatsHandler(BaseHandler):
+    """GET /stats - cache and micro-batching counters for this worker process."""
+
+    def get(self):
+        self.write_json({
+            'pid': os.getpid(),
+            'movies': len(self.service.movies),
+            'cache': self.cache.stats(),
+            'batches': self.batcher.batches,
+            'batched_requests': self.batcher.batched_requests,
+        })
+
+
+def make_app(service: RecommendationService) -> tornado.web.Application:
+    batcher = MicroBatcher(service)
+    batcher.start()
+    deps = {'service': service, 'batcher': batcher, 'cache': RecommendationCache()}
+    return tornado.web.Application([
+        (r'/recommend', RecommendHandler, deps),
+        (r'/search', SearchHandler, deps),
+        (r'/filter', FilterHandler, deps),
+        (r'/stats', StatsHandler, deps),
+    ])
+
+
+async def serve(service: RecommendationService, sockets):
+    server = tornado.httpserver.HTTPServer(make_app(service))
+    server.add_sockets(sockets)
+    await asyncio.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PopcornPicks JSON recommendation service")
+    parser.add_argument('--port', type=int, default=int(os.getenv('PORT', 8000)))
+    parser.add_argument('--address', default='0.0.0.0')
+    parser.add_argument('--workers', type=int, default=0, help="Worker processes (0 = one per CPU)")
+    args = parser.parse_args()
+
+    # Load before forking so every worker starts from the same copy-on-write pages
+    print("Loading catalog and building model...")
+    service = RecommendationService.from_artifacts()
+    print(f"Serving {len(service.movies):,} movies (model {service.model_version}) on {args.address}:{args.port}")
+    sockets = tornado.netutil.bind_sockets(args.port, address=args.address)
+    if args.workers != 1:
+        tornado.process.fork_processes(args.workers)
+    asyncio.run(serve(service, sockets))
+
+
+if __name__ == '__main__':
+    main()
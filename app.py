@@ -3,6 +3,8 @@ import streamlit as st
 import pandas as pd
 import pickle
 import ast
+import os
+import numpy as np
 
 # --- Page Configuration (MUST be the first Streamlit command) ---
 st.set_page_config(page_title="PopcornPicks", layout="wide", page_icon="🍿")
@@ -70,10 +72,16 @@ div[data-testid="stButton"] > button:hover { transform: scale(1.05); }
 """, unsafe_allow_html=True)
 
 # --- Data Loading (Cached for Performance) ---
-@st.cache_data
+# cache_resource hands every session the same objects; cache_data would copy the
+# frame and the similarity matrix on every call.
+@st.cache_resource
 def load_data():
     movies_df = pickle.load(open('tmdb_movies_df.pkl', 'rb'))
-    similarity = pickle.load(open('tmdb_similarity.pkl', 'rb'))
+    # The .npy copy is memory-mapped read-only, so every process shares one copy of the matrix
+    if os.path.exists('tmdb_similarity.npy') and os.path.getmtime('tmdb_similarity.npy') >= os.path.getmtime('tmdb_similarity.pkl'):
+        similarity = np.load('tmdb_similarity.npy', mmap_mode='r')
+    else:
+        similarity = pickle.load(open('tmdb_similarity.pkl', 'rb'))
     for col in ['genres', 'cast']:
         if col in movies_df.columns:
             movies_df[col] = movies_df[col].apply(lambda x: ast.literal_eval(x) if isinstance(x, str) else x)
@@ -1,13 +1,28 @@
 # app_enhanced.py - Enhanced version with all improvements
-import streamlit as st
-import pandas as pd
-import pickle
-import ast
-import os
-from rapidfuzz import fuzz, process
-import numpy as np
-from typing import List, Dict, Tuple
-import time
+from startup_profile import PROFILE
+
+# Heavy dependencies (scipy, pyarrow's compute kernels, rapidfuzz, scikit-learn) are
+# imported by the modules below only when their code path first runs
+with PROFILE.phase('imports'):
+    import streamlit as st
+    import pandas as pd
+    import html
+    import os
+    import numpy as np
+    from typing import List, Dict, Optional, Tuple
+    from artifact_builder import RAW_DATASET, ArtifactBuilder, partial_popular
+    from catalog import ENHANCED_DATASET, SORT_COLUMNS, filter_movies, find_dataset
+    from collaborative import ItemItemCF
+    from event_log import EventLog
+    from hybrid import hybrid_recommend
+    from model_registry import ModelBundle, ModelRegistry
+    from personalization import ProfileStore
+    from recommendation_cache import RecommendationCache
+    from recommender import DEFAULT_MMR_LAMBDA, diverse_recommendations, diversity_settings, recommendation_filters
+    from search_index import TitleSearchIndex
+    from user_feeds import FeedStore, FeedWorker
+    from user_management import (UserManager, add_rating_listener, add_watchlist_listener, display_rating_widget,
+                                 display_user_dashboard, get_user_store, remove_rating_listener)
 
 # --- Page Configuration ---
 st.set_page_config(
@@ -86,6 +101,28 @@ div[data-testid="stTabs"] button[data-selected="true"] {
     border-color: var(--accent);
 }
 
+/* View Navigation (horizontal radio styled as tabs) */
+div[data-testid="stRadio"] > div[role="radiogroup"] {
+    justify-content: center;
+    gap: 0.8rem;
+    padding-bottom: 2rem;
+}
+div[data-testid="stRadio"] > div[role="radiogroup"] > label {
+    background-color: var(--card-bg); 
+    border-radius: 10px;
+    padding: 10px 22px; 
+    border: 1px solid var(--card-border);
+    transition: all 0.2s ease;
+}
+div[data-testid="stRadio"] > div[role="radiogroup"] > label:has(input:checked) {
+    background-color: var(--accent); 
+    border-color: var(--accent);
+}
+div[data-testid="stRadio"] > div[role="radiogroup"] > label:has(input:checked) p {
+    color: #1c253b; 
+    font-weight: 700; 
+}
+
 /* Enhanced Button Styling */
 div[data-testid="stButton"] > button {
     background-color: var(--accent-2); 
@@ -167,6 +204,16 @@ div[data-testid="stButton"] > button:hover {
     margin-top: 0.5rem; 
 }
 
+/* Page grid: all cards of a page in one element, 5 per row on wide screens */
+.movie-grid {
+    display: grid;
+    grid-template-columns: repeat(5, minmax(0, 1fr));
+    gap: 1rem;
+    margin-bottom: 1rem;
+}
+@media (max-width: 1100px) { .movie-grid { grid-template-columns: repeat(3, minmax(0, 1fr)); } }
+@media (max-width: 640px) { .movie-grid { grid-template-columns: repeat(2, minmax(0, 1fr)); } }
+
 /* equal-height settings removed */
 
 /* Pagination Styling */
@@ -264,108 +311,120 @@ div[data-testid="stButton"] > button:hover {
 
 # --- Enhanced Data Loading with Error Handling ---
 @st.cache_resource
-def load_data():
-    """Load movie data with automatic data generation if files are missing."""
-    # Try to load enhanced dataset first
-    try:
-        if os.path.exists('processed_tmdb_enhanced_dataset.csv'):
-            movies_df = pd.read_csv('processed_tmdb_enhanced_dataset.csv')
-            st.success("✅ Loaded enhanced dataset with 20,000+ movies!")
-        elif os.path.exists('tmdb_movies_df.pkl'):
-            movies_df = pickle.load(open('tmdb_movies_df.pkl', 'rb'))
-            st.info("📊 Loaded basic dataset")
-        else:
-            # No data files found - generate them automatically
-            st.warning("🔄 No data files found. Generating dataset automatically...")
-            return generate_data_automatically()
-        
-        # Process list columns
-        for col in ['genres', 'cast', 'streaming_on']:
-            if col in movies_df.columns:
-                movies_df[col] = movies_df[col].apply(
-                    lambda x: ast.literal_eval(x) if isinstance(x, str) else x
-                )
-        return movies_df
-        
-    except Exception as e:
-        st.error(f"Error loading data: {e}")
-        st.info("🔄 Attempting to generate data automatically...")
-        return generate_data_automatically()
-
-def generate_data_automatically():
-    """Automatically generate data files if they don't exist."""
-    import subprocess
-    import sys
-    
-    try:
-        # Show progress
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-        
-        # Step 1: Fetch data
-        status_text.text("📡 Fetching movie data from TMDB...")
-        progress_bar.progress(25)
-        
-        result = subprocess.run([sys.executable, 'fetch_tmdb_data_enhanced.py'], 
-                              capture_output=True, text=True, timeout=300)
-        
-        if result.returncode != 0:
-            st.error(f"Data fetching failed: {result.stderr}")
-            return None
-            
-        # Step 2: Process data
-        status_text.text("🔧 Processing data and building ML model...")
-        progress_bar.progress(75)
-        
-        result = subprocess.run([sys.executable, 'data_processing_enhanced.py'], 
-                              capture_output=True, text=True, timeout=300)
-        
-        if result.returncode != 0:
-            st.error(f"Data processing failed: {result.stderr}")
+def get_model_registry() -> ModelRegistry:
+    """Process-wide model registry; new artifact versions are loaded and swapped in the background."""
+    registry = ModelRegistry()
+    # Card HTML is per catalog version too
+    registry.add_swap_listener(lambda old, new: get_card_fragments().clear())
+    return registry
+
+@st.cache_resource
+def get_artifact_builder() -> ArtifactBuilder:
+    """Background data pipeline shared by every session in this process."""
+    return ArtifactBuilder()
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def get_partial_popular(version: Tuple) -> Optional[pd.DataFrame]:
+    """Popular titles from partial pipeline output; version is the files' mtimes."""
+    return partial_popular(FOR_YOU_COUNT)
+
+def load_movies(builder: ArtifactBuilder, registry: ModelRegistry) -> Optional[ModelBundle]:
+    """The model bundle this run is served from, or None while the catalog is missing or being built.
+
+    The bundle is read once per run, so a hot reload never changes data under a
+    running session; the next rerun picks up the new version.
+    """
+    bundle = registry.current
+    if bundle is None:
+        path = find_dataset()
+        if path is None or builder.busy:
             return None
-            
-        # Step 3: Load the generated data
-        status_text.text("✅ Loading generated dataset...")
-        progress_bar.progress(100)
-        
-        if os.path.exists('processed_tmdb_enhanced_dataset.csv'):
-            movies_df = pd.read_csv('processed_tmdb_enhanced_dataset.csv')
-            # Process list columns
-            for col in ['genres', 'cast', 'streaming_on']:
-                if col in movies_df.columns:
-                    movies_df[col] = movies_df[col].apply(
-                        lambda x: ast.literal_eval(x) if isinstance(x, str) else x
-                    )
-            
-            status_text.text("🎉 Dataset generated successfully!")
-            time.sleep(2)
-            progress_bar.empty()
-            status_text.empty()
-            st.success("✅ Ready to go! Your movie recommender is now loaded with 20,000+ movies!")
-            return movies_df
-        else:
-            st.error("❌ Data generation failed - files not created")
+        try:
+            bundle = registry.load(path)
+        except Exception as e:
+            st.error(f"Error loading data: {e}")
             return None
-            
-    except subprocess.TimeoutExpired:
-        st.error("⏰ Data generation timed out. Please try again.")
-        return None
-    except Exception as e:
-        st.error(f"❌ Error during data generation: {e}")
-        return None
+        registry.watch()
+    if bundle.dataset_path == ENHANCED_DATASET:
+        st.success("✅ Loaded enhanced dataset with 20,000+ movies!")
+    else:
+        st.info("📊 Loaded basic dataset")
+    return bundle
+
+# Recommendation results kept by the process-wide cache.
+RECOMMENDATION_CACHE_SIZE = 2048
 
 @st.cache_resource
-def build_models(movies_df: pd.DataFrame):
-    """Build TF-IDF vectors and a NearestNeighbors index on tags (memory efficient)."""
-    from sklearn.feature_extraction.text import TfidfVectorizer
-    from sklearn.neighbors import NearestNeighbors
-    tags_col = 'enhanced_tags' if 'enhanced_tags' in movies_df.columns else 'tags'
-    texts = movies_df[tags_col].astype(str).tolist()
-    tfidf = TfidfVectorizer(max_features=10000, stop_words='english', ngram_range=(1, 2), min_df=2, max_df=0.8)
-    vectors = tfidf.fit_transform(texts)
-    knn = NearestNeighbors(n_neighbors=50, metric='cosine', algorithm='brute')
-    knn.fit(vectors)
-    return tfidf, vectors, knn
+def get_recommendation_cache() -> RecommendationCache:
+    """Recommendation results shared by every session in this process."""
+    return RecommendationCache(max_entries=RECOMMENDATION_CACHE_SIZE)
+
+def create_profile_store(bundle: ModelBundle) -> ProfileStore:
+    store = ProfileStore(bundle.vectors, bundle.position_by_id)
+    add_rating_listener(store.on_rating)
+    # A retired version stops receiving rating events, so it can be freed
+    bundle.add_finalizer(lambda: remove_rating_listener(store.on_rating))
+    return store
+
+def get_profile_store(bundle: ModelBundle) -> ProfileStore:
+    """User taste profiles for this model version, kept current by saved ratings instead of rebuilt per rerun."""
+    return bundle.resource('profile_store', create_profile_store)
+
+def create_cf_model(bundle: ModelBundle) -> ItemItemCF:
+    model = ItemItemCF.from_store(get_user_store(), bundle.position_by_id)
+    add_rating_listener(model.on_rating)
+    def retire():
+        remove_rating_listener(model.on_rating)
+        model.close()
+    bundle.add_finalizer(retire)
+    return model
+
+def get_cf_model(bundle: ModelBundle) -> ItemItemCF:
+    """Item-item neighbours from every stored rating, built once per model version and kept current by saved ratings."""
+    return bundle.resource('cf_model', create_cf_model)
+
+def score_feed(bundle: ModelBundle, user_id: str, ratings: Dict[str, Dict], watchlist: List[int], n: int):
+    """(positions, scores, CF weight) of a user's top-n For You picks, watchlist excluded."""
+    store = get_profile_store(bundle)
+    # One read of the published state: its vector and ratings always match
+    profile = store.get(user_id, ratings).state
+    exclude = [store.position_by_id[i] for i in watchlist if i in store.position_by_id]
+    return hybrid_recommend(bundle.vectors, profile.vector, profile.ratings, get_cf_model(bundle), n, exclude=exclude)
+
+@st.cache_resource
+def get_feed_worker() -> FeedWorker:
+    """Process-wide worker keeping active users' For You feeds current in the background."""
+    registry = get_model_registry()
+    worker = FeedWorker(FeedStore(), get_user_store(), lambda: registry.current, score_feed)
+    add_rating_listener(worker.on_rating)
+    add_watchlist_listener(worker.on_watchlist)
+    return worker
+
+# --- Implicit Feedback ---
+@st.cache_resource
+def get_event_log() -> EventLog:
+    """Process-wide recorder of card views, picks, searches and page views (see event_log.py)."""
+    return EventLog()
+
+def log_event(kind: str, movie_id: Optional[int] = None, detail: Optional[str] = None):
+    get_event_log().log(UserManager().get_user_id(), kind, movie_id, detail)
+
+def log_search(key: str):
+    """on_change callback of a search box: record the query once per edit."""
+    query = st.session_state.get(key)
+    if query:
+        log_event('search', detail=query)
+
+def log_card_views(movie_ids: np.ndarray, list_key: str):
+    """Record a page of cards the first time this session shows it, not on every rerun that redraws it."""
+    signature = hash(movie_ids.tobytes())
+    logged = st.session_state.setdefault('_logged_cards', {})
+    if logged.get(list_key) == signature:
+        return
+    logged[list_key] = signature
+    events, user_id = get_event_log(), UserManager().get_user_id()
+    for movie_id in movie_ids.tolist():
+        events.log(user_id, 'view', movie_id)
 
 # --- Enhanced Helper Functions ---
 def get_poster_url(path):
@@ -374,155 +433,513 @@ def get_poster_url(path):
         return "https://via.placeholder.com/500x750.png?text=No+Image"
     return f"https://image.tmdb.org/t/p/w500/{path}"
 
-def fuzzy_search_movies(query: str, movies_df: pd.DataFrame, limit: int = 10) -> List[Tuple[str, int]]:
+def fuzzy_search_movies(query: str, search_index: TitleSearchIndex, limit: int = 10) -> List[Tuple[str, int]]:
     """Enhanced fuzzy search for movie titles."""
     if not query or len(query) < 2:
         return []
     
-    # Get all movie titles
-    titles = movies_df['title'].tolist()
-    
-    # Use fuzzy matching
-    matches = process.extract(query, titles, limit=limit, scorer=fuzz.partial_ratio)
-    
-    # Filter matches with score > 60 (rapidfuzz returns (choice, score, idx))
-    return [(title, score) for title, score, _ in matches if score > 60]
-
-def paginate_dataframe(df: pd.DataFrame, page: int, per_page: int = 20) -> Tuple[pd.DataFrame, int]:
-    """Paginate a dataframe."""
-    total_pages = (len(df) + per_page - 1) // per_page
-    start_idx = (page - 1) * per_page
-    end_idx = start_idx + per_page
-    return df.iloc[start_idx:end_idx], total_pages
-
-def get_diverse_recommendations_knn(movies_df: pd.DataFrame, vectors, knn, movie_idx: int, num_recommendations: int = 5) -> pd.DataFrame:
-    """Get recommendations using KNN over TF-IDF vectors, with basic diversity."""
-    distances, indices = knn.kneighbors(vectors[movie_idx], n_neighbors=num_recommendations * 3 + 1)
-    candidate_indices = [i for i in indices.flatten().tolist() if i != movie_idx]
-    selected_indices = []
-    selected_genres = set()
-    for idx in candidate_indices:
-        if len(selected_indices) >= num_recommendations:
-            break
-        genres_value = movies_df.iloc[idx]['genres']
-        if not isinstance(genres_value, list):
-            genres_value = []
-        movie_genres = set(genres_value)
-        if not movie_genres.issubset(selected_genres) or len(selected_indices) < 2:
-            selected_indices.append(idx)
-            selected_genres.update(movie_genres)
-    if len(selected_indices) < num_recommendations:
-        for idx in candidate_indices:
-            if idx not in selected_indices:
-                selected_indices.append(idx)
-            if len(selected_indices) >= num_recommendations:
-                break
-    return movies_df.iloc[selected_indices[:num_recommendations]]
+    # Prefix + fuzzy lookup against the precomputed index (positions with scores)
+    matches = search_index.search(query, limit=limit)
+    return [(search_index.titles[pos], int(score)) for pos, score in matches]
+
+def format_title(movie) -> str:
+    """Title with release year, for pickers."""
+    year = movie.get('release_year')
+    return f"{movie['title']} ({int(year)})" if pd.notna(year) else str(movie['title'])
+
+def paginate_positions(positions: np.ndarray, page: int, per_page: int = 20) -> Tuple[np.ndarray, int]:
+    """Row positions on one page of a result (page is clamped to the valid range) and the page count."""
+    total_pages = max((len(positions) + per_page - 1) // per_page, 1)
+    page = min(max(page, 1), total_pages)
+    return positions[(page - 1) * per_page:page * per_page], total_pages
+
+def get_diverse_recommendation_positions(bundle: ModelBundle, movie_idx: int, num_recommendations: int = 5,
+                                         mmr_lambda: float = DEFAULT_MMR_LAMBDA,
+                                         filters: Optional[Tuple] = None) -> np.ndarray:
+    """Row positions of KNN recommendations over TF-IDF vectors, MMR-reranked for diversity.
+
+    filters (from recommendation_filters) are applied inside the neighbour search.
+    """
+    return diverse_recommendations(bundle.vectors, bundle.genre_bitmap, movie_idx, num_recommendations, mmr_lambda,
+                                   allowed=bundle.filter_index.mask(filters))
+
+def get_diverse_recommendations_knn(bundle: ModelBundle, movie_idx: int, num_recommendations: int = 5,
+                                    mmr_lambda: float = DEFAULT_MMR_LAMBDA) -> pd.DataFrame:
+    """Get recommendations using KNN over TF-IDF vectors, MMR-reranked for diversity."""
+    return bundle.movies.iloc[get_diverse_recommendation_positions(bundle, movie_idx, num_recommendations, mmr_lambda)]
+
+def get_cached_recommendations(bundle: ModelBundle, movie_idx: int, num_recommendations: int = 5,
+                               mmr_lambda: float = DEFAULT_MMR_LAMBDA, filters: Optional[Tuple] = None) -> pd.DataFrame:
+    """Recommendations served from the process-wide cache, keyed by (movie id, count, diversity settings, filters)."""
+    cache = get_recommendation_cache()
+    key = (int(bundle.movies.iloc[movie_idx]['id']), num_recommendations, diversity_settings(mmr_lambda), filters)
+    positions = cache.get_or_compute(
+        key,
+        lambda: get_diverse_recommendation_positions(bundle, movie_idx, num_recommendations, mmr_lambda, filters),
+        bundle.version,
+    )
+    return bundle.movies.iloc[positions]
 
-def display_movie_card(movie, col, show_compare_button=False, key_prefix=""):
-    """Enhanced movie card with comparison feature."""
-    with col:
-        overview = movie.get('overview', 'No overview available.')
-        if len(overview) > 120:
-            overview = overview[:120] + "..."
-        
-        # Create unique key for comparison (prefix ensures uniqueness across tabs/sections)
-        movie_key = f"{key_prefix}_compare_{movie['id']}"
-        
-        # Safe field extraction to avoid NaN casting errors
-        release_year_val = movie.get('release_year')
-        try:
-            release_year_str = str(int(release_year_val)) if pd.notna(release_year_val) else "N/A"
-        except Exception:
-            release_year_str = "N/A"
+@st.cache_resource
+def get_card_fragments() -> Dict[int, str]:
+    """Rendered card HTML by movie id, shared by every session and page."""
+    return {}
+
+def movie_card_html(movie, cache: bool = True) -> str:
+    """Escaped HTML for one movie card, built once per movie id (cache=False for data outside the catalog)."""
+    fragments = get_card_fragments()
+    movie_id = int(movie['id'])
+    cached = fragments.get(movie_id) if cache else None
+    if cached is not None:
+        return cached
+
+    overview = movie.get('overview')
+    overview = " ".join(overview.split()) if isinstance(overview, str) and overview.strip() else 'No overview available.'
+    if len(overview) > 120:
+        overview = overview[:120] + "..."
+
+    # Safe field extraction to avoid NaN casting errors
+    release_year_val = movie.get('release_year')
+    try:
+        release_year_str = str(int(release_year_val)) if pd.notna(release_year_val) else "N/A"
+    except Exception:
+        release_year_str = "N/A"
 
-        genres_val = movie.get('genres')
-        if not isinstance(genres_val, list):
-            genres_val = []
-        genres_str = ", ".join(genres_val) if genres_val else "Unknown"
+    genres_val = movie.get('genres')
+    if not isinstance(genres_val, list):
+        genres_val = []
+    genres_str = ", ".join(genres_val) if genres_val else "Unknown"
 
-        rating_val = movie.get('rating')
-        try:
-            rating_str = f"{float(rating_val):.1f}" if pd.notna(rating_val) else "N/A"
-        except Exception:
-            rating_str = "N/A"
+    rating_val = movie.get('rating')
+    try:
+        rating_str = f"{float(rating_val):.1f}" if pd.notna(rating_val) else "N/A"
+    except Exception:
+        rating_str = "N/A"
 
-        revenue_val = movie.get('revenue')
-        try:
-            revenue_str = f"{int(revenue_val):,}" if pd.notna(revenue_val) else "0"
-        except Exception:
-            revenue_str = "0"
-
-        cast_val = movie.get('cast')
-        if not isinstance(cast_val, list):
-            cast_val = []
-        cast_str = ", ".join(cast_val[:3]) if cast_val else "N/A"
-
-        st.markdown(f"""
-        <div class="movie-card">
-            <div>
-                <img src="{get_poster_url(movie['poster_path'])}" class="poster-img">
-                <p class="movie-title">{movie['title']} ({release_year_str})</p>
-                <p class="movie-genres">{genres_str}</p>
-                <p class="movie-overview">{overview}</p>
-                <p class="movie-details">⭐ {rating_str}/10 | 💰 ${revenue_str}</p>
-                <p class="movie-details"><b>Cast:</b> {cast_str}</p>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
-        
+    revenue_val = movie.get('revenue')
+    try:
+        revenue_str = f"{int(revenue_val):,}" if pd.notna(revenue_val) else "0"
+    except Exception:
+        revenue_str = "0"
+
+    cast_val = movie.get('cast')
+    if not isinstance(cast_val, list):
+        cast_val = []
+    cast_str = ", ".join(cast_val[:3]) if cast_val else "N/A"
+
+    # One line, no blank lines: cards are concatenated into a single markdown HTML block.
+    # "$" is an entity so a page of revenues isn't read as inline math.
+    fragment = (
+        '<div class="movie-card"><div>'
+        f'<img src="{html.escape(get_poster_url(movie.get("poster_path")))}" class="poster-img" loading="lazy">'
+        f'<p class="movie-title">{html.escape(str(movie["title"]))} ({release_year_str})</p>'
+        f'<p class="movie-genres">{html.escape(genres_str)}</p>'
+        f'<p class="movie-overview">{html.escape(overview)}</p>'
+        f'<p class="movie-details">⭐ {rating_str}/10 | 💰 ${revenue_str}</p>'
+        f'<p class="movie-details"><b>Cast:</b> {html.escape(cast_str)}</p>'
+        '</div></div>'
+    ).replace("$", "&#36;")
+    if cache:
+        fragments[movie_id] = fragment
+    return fragment
+
+def display_movie_card(movie, col, show_compare_button=False, key_prefix=""):
+    """Enhanced movie card with comparison feature."""
+    with col:
+        st.markdown(movie_card_html(movie), unsafe_allow_html=True)
         # Comparison feature removed
 
-def display_movie_list(df_list, show_pagination=True, per_page=20, key_prefix="movie_page_selector", compare_key_prefix="compare"):
-    """Enhanced movie list display with pagination."""
-    if df_list.empty:
+def display_movie_grid(page_data: pd.DataFrame, cache_cards: bool = True, details=None):
+    """Render a page of cards as one HTML payload (a single element instead of one per card).
+
+    details (the bundle's CatalogDetails) fills in genres, cast and overview for just this page.
+    """
+    if details is not None:
+        page_data = details.expand(page_data)
+    cards = "".join(movie_card_html(movie, cache_cards) for _, movie in page_data.iterrows())
+    st.markdown(f'<div class="movie-grid">{cards}</div>', unsafe_allow_html=True)
+
+def _step_page(key: str, delta: int, total_pages: int):
+    st.session_state[key] = min(max(st.session_state.get(key, 1) + delta, 1), total_pages)
+
+def page_selector(total: int, per_page: int, key: str, signature: Tuple) -> int:
+    """Prev/next buttons around a numeric page input; returns the 1-based page.
+
+    The page is reset to 1 whenever signature (the result being paged) changes.
+    """
+    total_pages = (total + per_page - 1) // per_page
+    signature_key = f"{key}_result"
+    if st.session_state.get(signature_key) != signature:
+        st.session_state[signature_key] = signature
+        st.session_state[key] = 1
+    elif st.session_state.get(key, 1) > total_pages:
+        st.session_state[key] = total_pages
+
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        st.button("◀ Prev", key=f"{key}_prev", on_click=_step_page, args=(key, -1, total_pages),
+                  disabled=st.session_state.get(key, 1) <= 1, use_container_width=True)
+    with col2:
+        page = st.number_input(f"Page (of {total_pages:,}):", min_value=1, max_value=total_pages, step=1, key=key)
+    with col3:
+        st.button("Next ▶", key=f"{key}_next", on_click=_step_page, args=(key, 1, total_pages),
+                  disabled=page >= total_pages, use_container_width=True)
+    return int(page)
+
+def display_movie_list(movies: pd.DataFrame, positions: Optional[np.ndarray] = None, show_pagination=True, per_page=20,
+                       key_prefix="movie_page_selector", compare_key_prefix="compare", cache_cards=True, details=None):
+    """Page through result row positions (all of movies when None), rendering one page of cards.
+
+    Only the positions array of the result is paged: a page change slices it and
+    builds a 20-row frame, however large the result. Page controls are a number
+    input plus prev/next, so their size doesn't grow with the page count.
+    """
+    if positions is None:
+        positions = np.arange(len(movies))
+    if len(positions) == 0:
         st.warning("No movies found matching your criteria.")
         return
-    
-    # Pagination
-    if show_pagination and len(df_list) > per_page:
-        total_pages = (len(df_list) + per_page - 1) // per_page
-        
-        # Page selector
-        col1, col2, col3 = st.columns([1, 2, 1])
-        with col2:
-            page = st.selectbox(
-                "Page:", 
-                range(1, total_pages + 1), 
-                key=f"{key_prefix}"
-            )
-        
-        # Get page data
+
+    if show_pagination and len(positions) > per_page:
+        signature = (len(positions), hash(positions[:per_page].tobytes()))
+        page = page_selector(len(positions), per_page, key_prefix, signature)
+        page_positions, _ = paginate_positions(positions, page, per_page)
         start_idx = (page - 1) * per_page
-        end_idx = start_idx + per_page
-        page_data = df_list.iloc[start_idx:end_idx]
-        
-        st.info(f"Showing {start_idx + 1}-{min(end_idx, len(df_list))} of {len(df_list)} movies")
+        st.info(f"Showing {start_idx + 1:,}-{start_idx + len(page_positions):,} of {len(positions):,} movies")
     else:
-        page_data = df_list.head(per_page)
-    
-    # Display movies in grid
-    num_cols = 5
-    for i in range(0, len(page_data), num_cols):
-        cols = st.columns(num_cols)
-        chunk = page_data.iloc[i:i+num_cols]
-        for j in range(len(chunk)):
-            movie = chunk.iloc[j]
-            if j < len(cols):
-                # Include grid coordinates in key to avoid duplicate keys if same movie appears in multiple sections
-                display_movie_card(movie, cols[j], key_prefix=f"{compare_key_prefix}_{i}_{j}")
+        page_positions = positions[:per_page]
+
+    page = movies.iloc[page_positions]
+    log_card_views(page['id'].to_numpy(dtype=np.int64), f"{key_prefix}/{compare_key_prefix}")
+    display_movie_grid(page, cache_cards, details)
 
 def display_comparison_modal():
     """Comparison feature removed."""
     return
 
+# --- Memoized View Queries ---
+# Each view's expensive filter/sort work is cached by its widget inputs and returns
+# row positions only, so switching back to a view (or re-running an unchanged one)
+# costs a cache lookup. The movies frame (or bundle) is not hashed; the model version
+# stands in for it, so a hot-reloaded catalog never gets another version's positions.
+# List columns are code arrays in bundle.details, so genre and cast filters never build
+# Python lists. Position arrays are cached as shared read-only resources rather than
+# data, so paging through a result reuses the same array instead of unpickling a copy
+# of it on every rerun.
+def _frozen(positions: np.ndarray) -> np.ndarray:
+    positions.setflags(write=False)
+    return positions
+
+@st.cache_data(show_spinner=False)
+def get_genre_options(_bundle: ModelBundle, version: str) -> List[str]:
+    """Sorted list of all genres in the catalog."""
+    return _bundle.details.lists['genres'].name_list()
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def query_explorer(_bundle: ModelBundle, version: str, genres: Tuple[str, ...], year_range: Tuple[int, int],
+                   min_rating: float, min_revenue: int, sort_by: str, ascending: bool) -> np.ndarray:
+    """Row positions matching the explorer filters, in display order."""
+    return _frozen(filter_movies(_bundle.movies, genres, year_range, min_rating, min_revenue, sort_by, ascending,
+                                 genre_lists=_bundle.details.lists['genres']))
+
+@st.cache_resource(show_spinner=False)
+def query_acclaimed(_movies: pd.DataFrame, version: str) -> np.ndarray:
+    """Row positions ordered by rating, then vote count."""
+    return _frozen(np.lexsort((-_movies['vote_count'].to_numpy(), -_movies['rating'].to_numpy())))
+
+@st.cache_resource(show_spinner=False)
+def query_grossing(_movies: pd.DataFrame, version: str) -> np.ndarray:
+    """Row positions of movies with revenue, highest first."""
+    revenue = _movies['revenue'].to_numpy()
+    positions = np.flatnonzero(revenue > 0)
+    return _frozen(positions[np.argsort(-revenue[positions], kind='stable')])
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def query_actor(_bundle: ModelBundle, version: str, search_term: str) -> np.ndarray:
+    """Row positions of movies whose cast matches the (lowercased) search term."""
+    cast = _bundle.details.lists['cast']
+    # Substring match over the distinct names once, then a code lookup over the rows
+    return _frozen(np.flatnonzero(cast.rows_containing(cast.codes_matching(search_term))))
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def query_genre(_bundle: ModelBundle, version: str, genre: Optional[str]) -> np.ndarray:
+    """Row positions for a genre by rating, or all movies by popularity when genre is None."""
+    movies = _bundle.movies
+    if genre is None:
+        return _frozen(np.argsort(-movies['popularity'].to_numpy(), kind='stable'))
+    genres = _bundle.details.lists['genres']
+    positions = np.flatnonzero(genres.rows_containing(genres.codes_of([genre])))
+    return _frozen(positions[np.argsort(-movies['rating'].to_numpy()[positions], kind='stable')])
+
+# Number of title matches offered by the recommender's typeahead picker.
+TYPEAHEAD_LIMIT = 20
+# Personalized picks shown in the For You view.
+FOR_YOU_COUNT = 20
+
+# Widget keys whose values should survive while their view is not rendered.
+PERSISTENT_WIDGET_KEYS = (
+    "recommender_query", "recommender_select", "recommender_count", "recommender_diversity",
+    "recommender_genres", "recommender_years", "recommender_rating", "recommender_providers", "recommender_languages",
+    "explorer_genres", "explorer_years", "explorer_rating", "explorer_revenue",
+    "explorer_sort", "explorer_ascending",
+    "actor_query", "genre_select", "rate_query",
+)
+
+def keep_widget_state():
+    """Re-commit widget values so Streamlit doesn't drop them while their view is hidden."""
+    for key in PERSISTENT_WIDGET_KEYS:
+        if key in st.session_state:
+            st.session_state[key] = st.session_state[key]
+
+# --- Views ---
+def recommendation_filter_controls(bundle: ModelBundle) -> Optional[Tuple]:
+    """Metadata filter widgets for the recommender; returns recommendation_filters(...) of their values."""
+    index = bundle.filter_index
+    movies = bundle.movies
+    with st.expander("🎛️ Filter recommendations"):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            genres = st.multiselect("Genres:", index.genre_names, key="recommender_genres")
+            providers = st.multiselect("Streaming on:", index.provider_names, key="recommender_providers")
+        with col2:
+            min_year, max_year = int(movies['release_year'].min()), int(movies['release_year'].max())
+            year_range = st.slider("Release years:", min_year, max_year, (min_year, max_year), key="recommender_years")
+            languages = st.multiselect("Original language:", index.language_names, key="recommender_languages")
+        with col3:
+            min_rating = st.slider("Minimum rating:", 0.0, 10.0, 0.0, 0.5, key="recommender_rating")
+    # The full year span is no filter (it would drop movies without a release year)
+    if tuple(year_range) == (min_year, max_year):
+        year_range = None
+    return recommendation_filters(genres, year_range, min_rating, providers, languages)
+
+def render_recommender_view(bundle: ModelBundle):
+    movies = bundle.movies
+    st.subheader("🤖 Get Personalized Recommendations")
+
+    # Typeahead picker: only the top matches for the typed query are sent to the browser
+    search_index = bundle.search_index
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        query = st.text_input("Search for a movie you like:", placeholder="Start typing a title...", key="recommender_query",
+                              on_change=log_search, args=("recommender_query",))
+        if query:
+            options = [pos for pos, _ in search_index.search(query, limit=TYPEAHEAD_LIMIT)]
+        else:
+            options = search_index.popular(TYPEAHEAD_LIMIT)
+        # Keep the current pick selectable while the query changes
+        current = st.session_state.get("recommender_select")
+        if current is not None and current not in options:
+            options = [current] + options[:TYPEAHEAD_LIMIT - 1]
+        selected_pos = st.selectbox(
+            "Pick a movie you like:",
+            options,
+            index=None,
+            format_func=lambda pos: format_title(movies.iloc[pos]),
+            placeholder="Select from the matches..." if options else "No matches - try another spelling",
+            key="recommender_select"
+        )
+
+    with col2:
+        num_recommendations = st.selectbox("Number of recommendations:", [5, 10, 15, 20], index=0, key="recommender_count")
+        # Slider reads as "more variety" to the right; MMR's lambda is the relevance share
+        diversity = st.slider("Variety:", 0.0, 1.0, round(1 - DEFAULT_MMR_LAMBDA, 2), 0.1, key="recommender_diversity",
+                              help="Higher values trade similarity to your pick for more varied results")
+
+    filters = recommendation_filter_controls(bundle)
+
+    if st.button("🎯 Get Recommendations", use_container_width=True):
+        if selected_pos is not None:
+            selected_movie = movies.iloc[selected_pos]['title']
+            log_event('select', int(movies.iloc[selected_pos]['id']))
+            with st.spinner("🔍 Finding cinematic soulmates..."):
+                try:
+                    recommendations = get_cached_recommendations(bundle, selected_pos, num_recommendations, 1 - diversity,
+                                                                 filters)
+
+                    if recommendations.empty:
+                        st.warning("No movies match these filters - try loosening them.")
+                    else:
+                        st.success(f"✨ Found {len(recommendations)} recommendations based on '{selected_movie}'")
+                        display_movie_list(recommendations, show_pagination=False, details=bundle.details)
+
+                except IndexError:
+                    st.error("Movie not found in database!")
+                except Exception as e:
+                    st.error(f"Error generating recommendations: {e}")
+        else:
+            st.warning("Please select a movie first.")
+
+def render_explorer_view(bundle: ModelBundle):
+    movies = bundle.movies
+    st.header("🔎 Advanced Movie Explorer")
+
+    # Enhanced filters
+    col1, col2, col3, col4 = st.columns(4)
+
+    with col1:
+        selected_genres = st.multiselect("Select genres:", get_genre_options(bundle, bundle.version), key="explorer_genres")
+
+    with col2:
+        min_year, max_year = int(movies['release_year'].min()), int(movies['release_year'].max())
+        year_range = st.slider("Release year range:", min_year, max_year, (min_year, max_year), key="explorer_years")
+
+    with col3:
+        min_rating = st.slider("Minimum rating:", 0.0, 10.0, 5.0, 0.5, key="explorer_rating")
+
+    with col4:
+        min_revenue = st.number_input("Minimum revenue ($):", min_value=0, value=0, step=1000000, key="explorer_revenue")
+
+    # Sort options
+    sort_by = st.selectbox("Sort by:", list(SORT_COLUMNS), key="explorer_sort")
+    sort_ascending = st.checkbox("Ascending order", key="explorer_ascending")
+
+    positions = query_explorer(bundle, bundle.version, tuple(selected_genres), tuple(year_range), min_rating, min_revenue, sort_by, sort_ascending)
+
+    st.subheader(f"🎬 Found {len(positions):,} movies matching your criteria")
+    display_movie_list(movies, positions, key_prefix="movie_page_selector_explorer", details=bundle.details)
+
+def render_acclaimed_view(bundle: ModelBundle):
+    movies = bundle.movies
+    st.header("🏆 Critically Acclaimed Movies")
+    display_movie_list(movies, query_acclaimed(movies, bundle.version), key_prefix="movie_page_selector_acclaimed", compare_key_prefix="acclaimed", details=bundle.details)
+
+def render_grossing_view(bundle: ModelBundle):
+    movies = bundle.movies
+    st.header("💰 Highest Grossing Movies")
+    display_movie_list(movies, query_grossing(movies, bundle.version), key_prefix="movie_page_selector_grossing", compare_key_prefix="grossing", details=bundle.details)
+
+def render_actor_view(bundle: ModelBundle):
+    movies = bundle.movies
+    st.header("🧑‍🎤 Search by Actor")
+    actor_name_input = st.text_input("Enter an actor's name:", placeholder="e.g., Tom Cruise", key="actor_query",
+                                     on_change=log_search, args=("actor_query",))
+
+    if actor_name_input:
+        positions = query_actor(bundle, bundle.version, actor_name_input.lower())
+
+        if len(positions):
+            st.success(f"Found **{len(positions)}** movies starring **{actor_name_input}**")
+            display_movie_list(movies, positions, key_prefix="movie_page_selector_actor", compare_key_prefix="actor", details=bundle.details)
+        else:
+            st.warning(f"No movies found for '{actor_name_input}'. Try a different name.")
+
+def render_genre_view(bundle: ModelBundle):
+    movies = bundle.movies
+    st.header("🎬 Discover by Genre")
+    selected_genre = st.selectbox("Choose a genre:", ["All Genres"] + get_genre_options(bundle, bundle.version), key="genre_select")
+
+    if selected_genre != "All Genres":
+        st.subheader(f"🎭 Top {selected_genre} Movies")
+        display_movie_list(movies, query_genre(bundle, bundle.version, selected_genre), key_prefix="movie_page_selector_genre", compare_key_prefix="genre", details=bundle.details)
+    else:
+        st.subheader("🔥 Most Popular Movies")
+        display_movie_list(movies, query_genre(bundle, bundle.version, None), key_prefix="movie_page_selector_popular", compare_key_prefix="popular", details=bundle.details)
+
+def render_for_you_view(bundle: ModelBundle):
+    movies = bundle.movies
+    st.header("✨ Picked For You")
+    user_manager = UserManager()
+    ratings = user_manager.get_user_ratings()
+
+    with st.expander("⭐ Rate movies you've seen", expanded=not ratings):
+        query = st.text_input("Find a movie to rate:", placeholder="Start typing a title...", key="rate_query",
+                              on_change=log_search, args=("rate_query",))
+        if query:
+            for pos, _ in bundle.search_index.search(query, limit=5):
+                movie = movies.iloc[pos]
+                display_rating_widget(int(movie['id']), format_title(movie), user_manager.get_movie_rating(movie['id']))
+
+    with st.expander("📥 Import ratings from another service"):
+        upload = st.file_uploader("CSV with title, year and rating columns", type=["csv"], key="ratings_upload")
+        if upload is not None and st.button("Import ratings", key="import_ratings"):
+            result = user_manager.import_ratings(bundle, upload.getvalue())
+            st.success(f"Imported **{result['imported']}** ratings.")
+            for problem in result['problems'][:5]:
+                st.warning(problem)
+            if result['low_confidence']:
+                st.caption(f"{len(result['low_confidence'])} titles were matched loosely - check them below.")
+                st.dataframe(pd.DataFrame([{'Your title': m.row.title, 'Year': m.row.year,
+                                            'Matched': format_title(movies.iloc[m.position]),
+                                            'Score': round(m.score)} for m in result['low_confidence']]),
+                             hide_index=True)
+            if result['unmatched']:
+                st.caption(f"{len(result['unmatched'])} titles weren't found: "
+                           + ", ".join(row.title for row in result['unmatched'][:20]))
+            ratings = user_manager.get_user_ratings()
+
+    if not ratings:
+        st.info("Rate a few movies and we'll build recommendations around your taste.")
+        return
+
+    # One feed lookup when the background worker is up to date, scored here when it isn't
+    user_id = user_manager.get_user_id()
+    worker = get_feed_worker()
+    worker.touch(user_id)
+    feed = worker.feed(bundle, user_id, ratings, user_manager.get_watchlist())
+    positions, cf_share = feed.positions[:FOR_YOU_COUNT], feed.cf_weight
+    if len(positions) == 0:
+        st.info("Your ratings are all middle-of-the-road so far - rate some favourites (or flops) to steer your picks.")
+        return
+    st.success(f"Based on your **{len(ratings)}** ratings")
+    if cf_share:
+        st.caption(f"Blends movie similarity with what viewers who rate like you enjoyed ({cf_share:.0%} weight).")
+    display_movie_list(movies, positions, show_pagination=False, compare_key_prefix="for_you", details=bundle.details)
+
+# Only the active view is rendered on each rerun, so hidden views cost nothing.
+VIEWS = {
+    "🤖 AI Recommender": render_recommender_view,
+    "🔎 Movie Explorer": render_explorer_view,
+    "🏆 Critically Acclaimed": render_acclaimed_view,
+    "💰 Highest Grossing": render_grossing_view,
+    "🧑‍🎤 Search by Actor": render_actor_view,
+    "🎬 Discover by Genre": render_genre_view,
+    "✨ For You": render_for_you_view,
+    "👤 Your Profile": display_user_dashboard,
+}
+
+# --- Degraded Mode ---
+# Seconds between build status polls while the catalog is missing or being rebuilt.
+BUILD_POLL_SECONDS = 3
+
+@st.fragment(run_every=BUILD_POLL_SECONDS)
+def render_degraded_view(builder: ArtifactBuilder):
+    """Build progress plus popular titles from partial data, refreshed until the catalog is ready."""
+    status = builder.status()
+    if status['state'] == 'done' and not builder.busy:
+        if find_dataset() is not None:
+            # Full app rerun: load_movies() now maps the finished catalog
+            st.rerun()
+        # Reported done but nothing loadable exists: offer a retry instead of rerunning forever
+        status = dict(status, state='failed', error="The build finished without writing a dataset.")
+
+    if status['state'] == 'failed':
+        st.error("❌ Building the movie catalog failed.")
+        with st.expander("Details"):
+            st.code(status['error'] or "No output")
+        if st.button("🔄 Retry build", use_container_width=True):
+            builder.start()
+            st.rerun()
+    else:
+        st.info(f"🔄 Building the movie catalog - recommendations will switch on automatically when it's ready. "
+                f"{status['message']}")
+        st.progress(min(max(float(status['progress']), 0.0), 1.0))
+
+    version = tuple(os.path.getmtime(p) if os.path.exists(p) else None for p in (ENHANCED_DATASET, RAW_DATASET))
+    popular = get_partial_popular(version)
+    if popular is not None and not popular.empty:
+        st.subheader(f"🔥 Popular right now ({len(popular)} titles)")
+        # Partial rows must not end up in the card cache the full catalog is served from
+        display_movie_list(popular, show_pagination=False, compare_key_prefix="degraded", cache_cards=False)
+
 # --- Main App Logic ---
 def main():
-    # Load data
-    movies = load_data()
-    if movies is None:
-        st.stop()
-    tfidf, vectors, knn = build_models(movies)
+    # Load data; while it is missing or being rebuilt a background build runs and
+    # every session is served from partial data instead of blocking on it
+    builder = get_artifact_builder()
+    bundle = load_movies(builder, get_model_registry())
+    if bundle is None and builder.status()['state'] == 'idle':
+        builder.start()
+    keep_widget_state()
     
     # Sidebar removed per request
     
@@ -532,6 +949,11 @@ def main():
     with main_col:
         st.markdown('<div class="title-container"><h1>🍿 PopcornPicks</h1><p>Smart movie recommendations</p></div>', unsafe_allow_html=True)
         st.markdown("<hr>", unsafe_allow_html=True)
+
+        if bundle is None:
+            render_degraded_view(builder)
+            PROFILE.first_render('degraded')
+            return
         
         # Show comparison if requested
         if st.session_state.get('show_comparison', False):
@@ -541,133 +963,13 @@ def main():
                 st.rerun()
             return
         
-        # Enhanced tabs
-        tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
-            "🤖 AI Recommender", "🔎 Movie Explorer", "🏆 Critically Acclaimed",
-            "💰 Highest Grossing", "🧑‍🎤 Search by Actor", "🎬 Discover by Genre"
-        ])
-        
-        with tab1:
-            st.subheader("🤖 Get Personalized Recommendations")
-            
-            # Enhanced movie selection with search
-            col1, col2 = st.columns([3, 1])
-            with col1:
-                selected_movie = st.selectbox(
-                    "Pick a movie you like:", 
-                    movies['title'].values, 
-                    index=None, 
-                    placeholder="Type or select a movie...",
-                    key="recommender_select"
-                )
-            
-            with col2:
-                num_recommendations = st.selectbox("Number of recommendations:", [5, 10, 15, 20], index=0)
-            
-            if st.button("🎯 Get Recommendations", use_container_width=True):
-                if selected_movie:
-                    with st.spinner("🔍 Finding cinematic soulmates..."):
-                        try:
-                            idx = movies[movies['title'] == selected_movie].index[0]
-                            recommendations = get_diverse_recommendations_knn(movies, vectors, knn, idx, num_recommendations)
-                            
-                            st.success(f"✨ Found {len(recommendations)} recommendations based on '{selected_movie}'")
-                            display_movie_list(recommendations, show_pagination=False)
-                            
-                        except IndexError:
-                            st.error("Movie not found in database!")
-                        except Exception as e:
-                            st.error(f"Error generating recommendations: {e}")
-                else:
-                    st.warning("Please select a movie first.")
-        
-        with tab2:
-            st.header("🔎 Advanced Movie Explorer")
-            
-            # Enhanced filters
-            col1, col2, col3, col4 = st.columns(4)
-            
-            with col1:
-                selected_genres = st.multiselect("Select genres:", sorted(list(set([g for sublist in movies['genres'] for g in sublist]))))
-            
-            with col2:
-                min_year, max_year = int(movies['release_year'].min()), int(movies['release_year'].max())
-                year_range = st.slider("Release year range:", min_year, max_year, (min_year, max_year))
-            
-            with col3:
-                min_rating = st.slider("Minimum rating:", 0.0, 10.0, 5.0, 0.5)
-            
-            with col4:
-                min_revenue = st.number_input("Minimum revenue ($):", min_value=0, value=0, step=1000000)
-            
-            # Apply filters
-            filtered = movies.copy()
-            
-            if selected_genres:
-                filtered = filtered[filtered['genres'].apply(lambda x: any(g in x for g in selected_genres))]
-            
-            filtered = filtered[
-                (filtered['release_year'] >= year_range[0]) & 
-                (filtered['release_year'] <= year_range[1]) &
-                (filtered['rating'] >= min_rating) &
-                (filtered['revenue'] >= min_revenue)
-            ]
-            
-            # Sort options
-            sort_by = st.selectbox("Sort by:", ["Popularity", "Rating", "Revenue", "Release Year", "Vote Count"])
-            sort_ascending = st.checkbox("Ascending order")
-            
-            sort_columns = {
-                "Popularity": "popularity",
-                "Rating": "rating", 
-                "Revenue": "revenue",
-                "Release Year": "release_year",
-                "Vote Count": "vote_count"
-            }
-            
-            filtered = filtered.sort_values(sort_columns[sort_by], ascending=sort_ascending)
-            
-            st.subheader(f"🎬 Found {len(filtered):,} movies matching your criteria")
-            display_movie_list(filtered, key_prefix="movie_page_selector_explorer")
-        
-        with tab3:
-            st.header("🏆 Critically Acclaimed Movies")
-            acclaimed = movies.sort_values(['rating', 'vote_count'], ascending=False)
-            display_movie_list(acclaimed, key_prefix="movie_page_selector_acclaimed", compare_key_prefix="acclaimed")
-        
-        with tab4:
-            st.header("💰 Highest Grossing Movies")
-            grossing = movies[movies['revenue'] > 0].sort_values('revenue', ascending=False)
-            display_movie_list(grossing, key_prefix="movie_page_selector_grossing", compare_key_prefix="grossing")
-        
-        with tab5:
-            st.header("🧑‍🎤 Search by Actor")
-            actor_name_input = st.text_input("Enter an actor's name:", placeholder="e.g., Tom Cruise")
-            
-            if actor_name_input:
-                search_term = actor_name_input.lower()
-                actor_movies = movies[movies['cast'].apply(
-                    lambda cast_list: any(search_term in actor.lower() for actor in cast_list)
-                )]
-                
-                if not actor_movies.empty:
-                    st.success(f"Found **{len(actor_movies)}** movies starring **{actor_name_input}**")
-                    display_movie_list(actor_movies, key_prefix="movie_page_selector_actor", compare_key_prefix="actor")
-                else:
-                    st.warning(f"No movies found for '{actor_name_input}'. Try a different name.")
-        
-        with tab6:
-            st.header("🎬 Discover by Genre")
-            all_genres = sorted(list(set([g for sublist in movies['genres'] for g in sublist])))
-            selected_genre = st.selectbox("Choose a genre:", ["All Genres"] + all_genres)
-            
-            if selected_genre != "All Genres":
-                genre_movies = movies[movies['genres'].apply(lambda x: selected_genre in x)]
-                st.subheader(f"🎭 Top {selected_genre} Movies")
-                display_movie_list(genre_movies.sort_values("rating", ascending=False), key_prefix="movie_page_selector_genre", compare_key_prefix="genre")
-            else:
-                st.subheader("🔥 Most Popular Movies")
-                display_movie_list(movies.sort_values("popularity", ascending=False), key_prefix="movie_page_selector_popular", compare_key_prefix="popular")
+        # View navigation (replaces st.tabs, which executed every tab on each rerun)
+        active_view = st.radio("View", list(VIEWS), horizontal=True, key="active_view", label_visibility="collapsed")
+        if st.session_state.get('_logged_view') != active_view:
+            st.session_state['_logged_view'] = active_view
+            log_event('page', detail=active_view)
+        VIEWS[active_view](bundle)
+        PROFILE.first_render('full')
         
         # Comparison tab removed
 
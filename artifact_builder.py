@@ -0,0 +1,249 @@
+# artifact_builder.py - Background data pipeline runs with a progress/status API
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional, Sequence, Tuple
+
+import pandas as pd
+
+import catalog
+import file_lock
+
+# (step name, label shown while it runs, pipeline script)
+BUILD_STEPS: Tuple[Tuple[str, str, str], ...] = (
+    ('fetch', "Fetching movie data from TMDB", 'fetch_tmdb_data_enhanced.py'),
+    ('process', "Processing data and building the model", 'data_processing_enhanced.py'),
+)
+# Checkpointed by the fetcher while it runs; good enough to show popular titles meanwhile
+RAW_DATASET = 'tmdb_enhanced_dataset.csv'
+LOCK_FILE = '.artifact_build.lock'
+STATUS_FILE = '.artifact_build.json'
+# How often progress is written to STATUS_FILE for other worker processes
+STATUS_INTERVAL = 0.5
+# Seconds a pipeline script may run before it is killed and the build marked failed
+STEP_TIMEOUT = 300.0
+
+_PERCENT = re.compile(r'(\d{1,3})%\|')
+
+
+def _lock_owner(lock_path: str) -> Optional[int]:
+    """Pid of the process holding a build lock, or None when no build runs.
+
+    The lock is an OS file lock (see file_lock.py), released when its holder exits,
+    so a crashed build never leaves a stale lock behind.
+    """
+    try:
+        fd = os.open(lock_path, os.O_RDONLY)
+    except FileNotFoundError:
+        return None
+    try:
+        if not file_lock.lock(fd, shared=True, blocking=False):
+            owner = os.read(fd, 32).decode(errors='ignore').strip()
+            return int(owner) if owner.isdigit() else -1
+        file_lock.unlock(fd)
+        return None
+    finally:
+        os.close(fd)
+
+
+class ArtifactBuilder:
+    """Runs the fetch and processing scripts in a background thread.
+
+    One build runs per box: the builder that takes LOCK_FILE runs the steps and
+    publishes its progress to STATUS_FILE, builders in other worker processes just
+    follow that file until the lock is released. status() never blocks, so every
+    session can poll it while serving degraded results.
+    """
+
+    def __init__(self, steps: Sequence[Tuple[str, str, str]] = BUILD_STEPS,
+                 lock_path: str = LOCK_FILE, status_path: str = STATUS_FILE, step_timeout: float = STEP_TIMEOUT):
+        self.steps = tuple(steps)
+        self.step_timeout = step_timeout
+        self.lock_path = lock_path
+        self.status_path = status_path
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._lock_fd: Optional[int] = None
+        self._output: deque = deque(maxlen=20)
+        self._published = 0.0
+        self._status: Dict = {'state': 'idle', 'step': None, 'message': '', 'progress': 0.0,
+                              'error': None, 'started_at': None, 'finished_at': None, 'owner': None}
+
+    @property
+    def running(self) -> bool:
+        """True while this process runs or follows a build."""
+        with self._lock:
+            return self._status['state'] in ('running', 'waiting')
+
+    @property
+    def busy(self) -> bool:
+        """True while any process on the box is building (artifacts may be half-written)."""
+        return self.running or _lock_owner(self.lock_path) is not None
+
+    def status(self) -> Dict:
+        """Snapshot: state (idle/running/waiting/done/failed), step, message, progress 0-1, error."""
+        with self._lock:
+            status = dict(self._status)
+        if status['state'] == 'waiting':
+            # Another process owns the build; report its published progress
+            try:
+                with open(self.status_path) as f:
+                    shared = json.load(f)
+                status.update({k: shared[k] for k in ('step', 'message', 'progress', 'started_at') if k in shared})
+            except (OSError, ValueError):
+                pass
+        return status
+
+    def start(self) -> bool:
+        """Start a build unless one is already running in this process. Returns True if started."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            self._output.clear()
+            self._status.update(state='running', step=None, message="Starting build...", progress=0.0,
+                                error=None, started_at=time.time(), finished_at=None, owner=os.getpid())
+            self._thread = threading.Thread(target=self._run, name='artifact-builder', daemon=True)
+            self._thread.start()
+            return True
+
+    def wait(self, timeout: Optional[float] = None) -> Dict:
+        """Block until the current build finishes (for scripts); returns the final status."""
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        return self.status()
+
+    # --- Internals ---
+    def _update(self, publish: bool = False, **fields):
+        with self._lock:
+            self._status.update(fields)
+            snapshot = dict(self._status)
+        now = time.monotonic()
+        if publish or now - self._published >= STATUS_INTERVAL:
+            self._published = now
+            tmp = f"{self.status_path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp, 'w') as f:
+                    json.dump(snapshot, f)
+                os.replace(tmp, self.status_path)
+            except OSError:
+                pass
+
+    def _acquire(self) -> bool:
+        """Take the cross-process build lock; False while another process holds it."""
+        fd = os.open(self.lock_path, os.O_CREAT | os.O_RDWR, 0o644)
+        if not file_lock.lock(fd, blocking=False):
+            os.close(fd)
+            return False
+        # The file is never removed: unlinking a locked file would let a second
+        # builder lock a fresh inode at the same path
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._lock_fd = fd
+        return True
+
+    def _release(self):
+        fd, self._lock_fd = self._lock_fd, None
+        if fd is not None:
+            os.ftruncate(fd, 0)
+            file_lock.unlock(fd)
+            os.close(fd)
+
+    def _run(self):
+        if not self._acquire():
+            self._follow()
+            return
+        try:
+            for i, (name, label, script) in enumerate(self.steps):
+                self._update(publish=True, step=name, message=label, progress=i / len(self.steps))
+                returncode = self._run_step(i, script)
+                if returncode != 0:
+                    detail = "\n".join(self._output) or f"{script} exited with code {returncode}"
+                    self._update(publish=True, state='failed', error=detail, finished_at=time.time())
+                    return
+            if catalog.find_dataset() is None:
+                # Every script exited cleanly but nothing loadable was written
+                detail = "\n".join(self._output) or "The pipeline finished without writing a dataset"
+                self._update(publish=True, state='failed', error=detail, finished_at=time.time())
+                return
+            self._update(publish=True, state='done', step=None, message="Build complete", progress=1.0,
+                         finished_at=time.time())
+        except Exception as e:
+            self._update(publish=True, state='failed', error=str(e), finished_at=time.time())
+        finally:
+            self._release()
+
+    def _run_step(self, index: int, script: str) -> int:
+        """Run one pipeline script, turning its output (tqdm bars included) into progress.
+
+        A script still running after step_timeout seconds is killed; its step fails.
+        """
+        proc = subprocess.Popen([sys.executable, '-u', script], stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                text=True, bufsize=1)
+        reader = threading.Thread(target=self._read_output, args=(index, proc.stdout), daemon=True)
+        reader.start()
+        try:
+            returncode = proc.wait(timeout=self.step_timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+            reader.join()
+            self._output.append(f"{script} timed out after {self.step_timeout:.0f}s")
+            return proc.returncode or -1
+        reader.join()
+        return returncode
+
+    def _read_output(self, index: int, stdout):
+        # Text mode splits on \r too, so each tqdm redraw arrives as its own line
+        for line in stdout:
+            line = line.strip()
+            if not line:
+                continue
+            self._output.append(line)
+            match = _PERCENT.search(line)
+            fraction = min(int(match.group(1)), 100) / 100 if match else None
+            fields = {'message': line[:200]}
+            if fraction is not None:
+                fields['progress'] = (index + fraction) / len(self.steps)
+            self._update(**fields)
+
+    def _follow(self):
+        """Mirror a build owned by another process until its lock goes away."""
+        self._update(state='waiting', message="Another worker is building the catalog...")
+        while _lock_owner(self.lock_path) is not None:
+            time.sleep(1.0)
+        try:
+            with open(self.status_path) as f:
+                shared = json.load(f)
+        except (OSError, ValueError):
+            shared = {}
+        if catalog.find_dataset() is not None and shared.get('state') != 'failed':
+            self._update(state='done', step=None, message="Build complete", progress=1.0, finished_at=time.time())
+        else:
+            self._update(state='failed', error=shared.get('error') or "The build in another worker did not finish",
+                         finished_at=time.time())
+
+
+def partial_popular(limit: int = 20) -> Optional[pd.DataFrame]:
+    """Most popular movies from whatever the pipeline has written so far, or None."""
+    for path in (catalog.ENHANCED_DATASET, RAW_DATASET):
+        if not os.path.exists(path):
+            continue
+        try:
+            movies_df = catalog.read_movies(path)
+        except Exception:
+            # A checkpoint may be mid-write; the next poll will pick up a complete one
+            continue
+        if movies_df.empty or 'title' not in movies_df.columns:
+            continue
+        if 'id' in movies_df.columns:
+            movies_df = movies_df.drop_duplicates(subset='id')
+        if 'popularity' in movies_df.columns:
+            movies_df = movies_df.sort_values('popularity', ascending=False, kind='stable')
+        return movies_df.head(limit).reset_index(drop=True)
+    return None
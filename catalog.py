@@ -0,0 +1,91 @@
+# catalog.py - Streamlit-free catalog loading, model building and filter queries
+import ast
+import os
+import pickle
+import numpy as np
+import pandas as pd
+from typing import Optional, Sequence, Tuple
+
+ENHANCED_DATASET = 'processed_tmdb_enhanced_dataset.csv'
+BASIC_DATASET = 'tmdb_movies_df.pkl'
+LIST_COLUMNS = ['genres', 'cast', 'streaming_on']
+
+SORT_COLUMNS = {
+    "Popularity": "popularity",
+    "Rating": "rating",
+    "Revenue": "revenue",
+    "Release Year": "release_year",
+    "Vote Count": "vote_count"
+}
+
+
+def find_dataset() -> Optional[str]:
+    """Path of the best available dataset, or None when nothing has been generated yet."""
+    for path in (ENHANCED_DATASET, BASIC_DATASET):
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def read_movies(path: str) -> pd.DataFrame:
+    """Load a processed dataset (CSV or pickle) and parse its list columns."""
+    if path.endswith('.pkl'):
+        with open(path, 'rb') as f:
+            movies_df = pickle.load(f)
+    else:
+        movies_df = pd.read_csv(path)
+    for col in LIST_COLUMNS:
+        if col in movies_df.columns:
+            movies_df[col] = movies_df[col].apply(
+                lambda x: ast.literal_eval(x) if isinstance(x, str) else x
+            )
+    return movies_df
+
+
+def build_vectors(movies_df: pd.DataFrame):
+    """Fit the TF-IDF vectorizer on the tags column; returns (tfidf, CSR vectors)."""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    tags_col = 'enhanced_tags' if 'enhanced_tags' in movies_df.columns else 'tags'
+    texts = movies_df[tags_col].astype(str).tolist()
+    tfidf = TfidfVectorizer(max_features=10000, stop_words='english', ngram_range=(1, 2), min_df=2, max_df=0.8, dtype=np.float32)
+    return tfidf, tfidf.fit_transform(texts)
+
+
+def build_knn(vectors):
+    """Brute-force cosine NearestNeighbors index over the TF-IDF vectors."""
+    from sklearn.neighbors import NearestNeighbors
+    knn = NearestNeighbors(n_neighbors=50, metric='cosine', algorithm='brute')
+    knn.fit(vectors)
+    return knn
+
+
+def build_models(movies_df: pd.DataFrame):
+    """Build TF-IDF vectors and a NearestNeighbors index on tags (memory efficient)."""
+    tfidf, vectors = build_vectors(movies_df)
+    return tfidf, vectors, build_knn(vectors)
+
+
+def filter_movies(movies_df: pd.DataFrame, genres: Sequence[str] = (), year_range: Optional[Tuple[int, int]] = None,
+                  min_rating: float = 0.0, min_revenue: float = 0, sort_by: str = "Popularity",
+                  ascending: bool = False, genre_lists=None) -> np.ndarray:
+    """Row positions matching the explorer filters, in display order.
+
+    genre_lists is the store's genres ListColumn when movies_df comes from the catalog
+    store (which keeps list columns out of the frame); otherwise movies_df['genres'] is used.
+    """
+    mask = (
+        (movies_df['rating'] >= min_rating) &
+        (movies_df['revenue'] >= min_revenue)
+    ).to_numpy()
+    if year_range is not None:
+        mask &= ((movies_df['release_year'] >= year_range[0]) & (movies_df['release_year'] <= year_range[1])).to_numpy()
+    if genres and genre_lists is not None:
+        mask &= genre_lists.rows_containing(genre_lists.codes_of(genres))
+    elif genres:
+        wanted = set(genres)
+        mask &= movies_df['genres'].apply(lambda x: not wanted.isdisjoint(x)).to_numpy()
+    positions = np.flatnonzero(mask)
+    order = movies_df[SORT_COLUMNS[sort_by]].to_numpy()[positions].argsort(kind='stable')
+    if not ascending:
+        order = order[::-1]
+    return positions[order]
@@ -0,0 +1,430 @@
+# catalog_benchmark.py - Synthetic TMDb-shaped catalogs and an end-to-end scaling benchmark of the pipeline
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from cf_benchmark import timed
+
+BENCHMARK_FILE = 'catalog_benchmark.jsonl'
+# Per-size working files, named like the real pipeline's
+RAW_CSV = 'tmdb_enhanced_dataset.csv'
+PROCESSED_CSV = 'processed_tmdb_enhanced_dataset.csv'
+STORE_DIR = 'store'
+DEFAULT_SIZES = (20_000, 100_000, 1_000_000, 5_000_000)
+# Rows generated and written per CSV chunk, so generation never holds the whole catalog
+GENERATE_CHUNK = 100_000
+# A size is skipped when its peak memory or disk use, extrapolated from the sizes already
+# run and padded by this margin, would not fit in what the box has free (--force runs it anyway)
+HEADROOM = 1.2
+
+GENRES = ('Action', 'Adventure', 'Animation', 'Comedy', 'Crime', 'Documentary', 'Drama', 'Family', 'Fantasy',
+          'History', 'Horror', 'Music', 'Mystery', 'Romance', 'Science Fiction', 'TV Movie', 'Thriller', 'War',
+          'Western')
+PROVIDERS = ('Netflix', 'Amazon Prime Video', 'Disney Plus', 'Hulu', 'Max', 'Apple TV Plus', 'Paramount Plus',
+             'Peacock', 'Tubi', 'Google Play Movies', 'YouTube', 'Fandango At Home')
+LANGUAGES = ('en', 'fr', 'es', 'ja', 'de', 'ko', 'it', 'hi', 'zh', 'ru', 'pt', 'sv', 'da', 'tr', 'nl', 'pl', 'th',
+             'fa', 'ar', 'no')
+COUNTRIES = ('United States of America', 'United Kingdom', 'France', 'Japan', 'Germany', 'Canada', 'India',
+             'South Korea', 'Italy', 'Spain')
+# Overview vocabulary size and topic count; a movie's overview mixes words of its topic with common words
+VOCABULARY = 30_000
+TOPICS = 200
+OVERVIEW_WORDS = (15, 60)
+_ONSETS = ('b', 'c', 'd', 'f', 'g', 'h', 'k', 'l', 'm', 'n', 'p', 'r', 's', 't', 'v', 'w', 'br', 'ch', 'cl', 'dr',
+           'gr', 'sh', 'st', 'tr')
+_NUCLEI = ('a', 'e', 'i', 'o', 'u', 'ai', 'ea', 'ou')
+
+
+def zipf_weights(n: int, exponent: float = 1.0) -> np.ndarray:
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+def make_words(n: int, seed: int) -> np.ndarray:
+    """n distinct pronounceable lowercase words of two to four syllables."""
+    rng = np.random.default_rng(seed)
+    syllables = np.array([onset + nucleus for onset in _ONSETS for nucleus in _NUCLEI])
+    words: Dict[str, None] = {}
+    while len(words) < n:
+        picks = rng.integers(0, len(syllables), (n, 4))
+        lengths = rng.integers(2, 5, n)
+        for row, length in zip(picks, lengths):
+            words.setdefault(''.join(syllables[row[:length]]), None)
+    return np.array(list(words)[:n])
+
+
+class CatalogGenerator:
+    """Deterministic synthetic catalog with the columns fetch_tmdb_data_enhanced.py writes.
+
+    Popularity of words, actors and directors follows Zipf-like curves, overviews
+    share words within topics (so TF-IDF neighbours are meaningful), and list
+    columns hold Python lists, written to CSV the way the fetcher writes them.
+    Chunks are independent given their start row, so any size can be streamed.
+    """
+
+    def __init__(self, rows: int, seed: int = 0):
+        self.rows = rows
+        self.seed = seed
+        # Object arrays: indexing them copies references, not fixed-width copies of every word
+        self.words = make_words(VOCABULARY, seed).astype(object)
+        self.title_words = np.char.capitalize(self.words[:3000].astype(str)).astype(object)
+        self.word_weights = zipf_weights(VOCABULARY)
+        people = make_words(4000, seed + 1)
+        self.first_names = np.char.capitalize(people[:2000]).astype(object)
+        self.last_names = np.char.capitalize(people[2000:]).astype(object)
+        self.n_actors = max(2000, rows // 4)
+        self.n_directors = max(500, rows // 20)
+
+    def _person(self, index: np.ndarray) -> List[str]:
+        first = self.first_names[index % len(self.first_names)]
+        last = self.last_names[(index // len(self.first_names)) % len(self.last_names)]
+        return [f"{a} {b}" for a, b in zip(first.tolist(), last.tolist())]
+
+    def chunk(self, start: int, rows: int) -> pd.DataFrame:
+        rng = np.random.default_rng([self.seed, start])
+        ids = np.arange(start, start + rows, dtype=np.int64) + 1
+
+        # Overviews: half the words from the movie's topic band, half from the whole vocabulary
+        lengths = rng.integers(*OVERVIEW_WORDS, rows)
+        word_ids = rng.choice(VOCABULARY, lengths.sum(), p=self.word_weights)
+        topics = np.repeat(rng.integers(0, TOPICS, rows), lengths)
+        band = VOCABULARY // TOPICS
+        in_topic = rng.random(len(word_ids)) < 0.5
+        word_ids[in_topic] = topics[in_topic] * band + word_ids[in_topic] % band
+        words = self.words[word_ids].tolist()
+        ends = np.cumsum(lengths)
+        overviews = [' '.join(words[end - length:end]).capitalize() + '.' for end, length in zip(ends, lengths)]
+        missing = rng.random(rows) < 0.005
+        overview_col = np.array(overviews, dtype=object)
+        overview_col[missing] = None
+
+        title_words = self.title_words[rng.choice(3000, (rows, 3), p=zipf_weights(3000, 0.6))]
+        title_lengths = rng.integers(1, 4, rows)
+        sequels = np.where(rng.random(rows) < 0.05, rng.integers(2, 5, rows), 0)
+        titles = [' '.join(row[:length]) + (f" {sequel}" if sequel else '')
+                  for row, length, sequel in zip(title_words.tolist(), title_lengths, sequels)]
+
+        genre_counts = rng.integers(1, 4, rows)
+        genre_picks = rng.choice(len(GENRES), (rows, 3), p=zipf_weights(len(GENRES), 0.7))
+        genres = [sorted({GENRES[g] for g in row[:count]}, key=GENRES.index)
+                  for row, count in zip(genre_picks.tolist(), genre_counts)]
+
+        actor_weights = zipf_weights(self.n_actors, 0.9)
+        cast_counts = rng.choice(6, rows, p=(0.03, 0.03, 0.04, 0.05, 0.05, 0.8))
+        cast_names = self._person(rng.choice(self.n_actors, rows * 5, p=actor_weights))
+        cast = [cast_names[5 * i:5 * i + count] for i, count in enumerate(cast_counts)]
+        directors = self._person(rng.choice(self.n_directors, rows, p=zipf_weights(self.n_directors, 0.8)))
+
+        provider_counts = rng.choice(4, rows, p=(0.4, 0.3, 0.2, 0.1))
+        provider_picks = rng.choice(len(PROVIDERS), (rows, 3), p=zipf_weights(len(PROVIDERS), 0.8))
+        providers = [sorted({PROVIDERS[p] for p in row[:count]})
+                     for row, count in zip(provider_picks.tolist(), provider_counts)]
+        countries = [[COUNTRIES[c]] for c in rng.choice(len(COUNTRIES), rows, p=zipf_weights(len(COUNTRIES)))]
+
+        years = np.clip(2025 - rng.exponential(18, rows).astype(np.int64), 1900, 2025)
+        months, days = rng.integers(1, 13, rows), rng.integers(1, 29, rows)
+        votes = rng.lognormal(4, 2, rows).astype(np.int64)
+        rating = np.where(votes > 0, np.clip(rng.normal(6.3, 1.1, rows), 0, 10).round(1), 0.0)
+        revenue = np.where(rng.random(rows) < 0.3, rng.lognormal(16, 2, rows), 0).astype(np.int64)
+        budget = np.where(rng.random(rows) < 0.3, rng.lognormal(15.5, 1.5, rows), 0).astype(np.int64)
+        images = rng.integers(0, 2 ** 62, (rows, 2))
+        return pd.DataFrame({
+            'id': ids,
+            'title': titles,
+            'original_title': titles,
+            'overview': overview_col,
+            'genres': genres,
+            'rating': rating,
+            'vote_count': votes,
+            'popularity': rng.lognormal(1.5, 1.2, rows).round(3),
+            'release_date': [f"{y}-{m:02d}-{d:02d}" for y, m, d in zip(years.tolist(), months.tolist(), days.tolist())],
+            'release_year': years,
+            'revenue': revenue,
+            'budget': budget,
+            'runtime': np.clip(rng.normal(100, 20, rows), 0, None).astype(np.int64),
+            'cast': cast,
+            'director': directors,
+            'poster_path': [f"/{a:016x}.jpg" for a in images[:, 0].tolist()],
+            'backdrop_path': [f"/{b:016x}.jpg" for b in images[:, 1].tolist()],
+            'streaming_on': providers,
+            'original_language': np.array(LANGUAGES)[rng.choice(len(LANGUAGES), rows, p=zipf_weights(len(LANGUAGES), 1.5))],
+            'production_countries': countries,
+            'adult': False,
+            'video': False,
+        })
+
+    def write_csv(self, path: str, chunk_rows: int = GENERATE_CHUNK):
+        """Write the raw catalog as the fetcher's CSV, chunk by chunk."""
+        for start in range(0, self.rows, chunk_rows):
+            frame = self.chunk(start, min(chunk_rows, self.rows - start))
+            frame.to_csv(path, mode='w' if start == 0 else 'a', header=start == 0, index=False)
+
+
+def peak_rss_mb() -> int:
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+
+
+def directory_mb(path: str) -> float:
+    total = sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+    return round(total / 2 ** 20, 1)
+
+
+def available_mb(path: str) -> Dict[str, int]:
+    """Free memory (MemAvailable) and free disk space under path, in MB."""
+    memory = None
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    memory = int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    if memory is None:
+        memory = os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') // 2 ** 20
+    return {'memory_mb': memory, 'disk_mb': shutil.disk_usage(path).free // 2 ** 20}
+
+
+def generate_stage(rows: int, workdir: str, seed: int) -> Dict:
+    """Write the raw synthetic catalog where the processing script expects the fetch."""
+    raw_path = os.path.join(workdir, RAW_CSV)
+    started = time.perf_counter()
+    CatalogGenerator(rows, seed).write_csv(raw_path)
+    return {'generate_s': round(time.perf_counter() - started, 2),
+            'raw_csv_mb': round(os.path.getsize(raw_path) / 2 ** 20, 1)}
+
+
+def build_stage(workdir: str) -> Dict:
+    """Process the raw catalog, vectorize it and write the store, recording peak RSS after each step."""
+    import gc
+    import catalog
+    import catalog_store
+    from data_processing_enhanced import process_movies
+
+    raw_path = os.path.join(workdir, RAW_CSV)
+    processed_path = os.path.join(workdir, PROCESSED_CSV)
+    store_dir = os.path.join(workdir, STORE_DIR)
+    result = {}
+
+    # The processing script's work: read the fetch, clean, tag, write the processed CSV
+    started = time.perf_counter()
+    processed = process_movies(pd.read_csv(raw_path))
+    processed.to_csv(processed_path, index=False)
+    result['processing_s'] = round(time.perf_counter() - started, 2)
+    result['processed_rows'] = len(processed)
+    result['processed_csv_mb'] = round(os.path.getsize(processed_path) / 2 ** 20, 1)
+    result['processing_peak_rss_mb'] = peak_rss_mb()
+    del processed
+    gc.collect()
+
+    # What catalog_store.load_store does on a cache miss
+    started = time.perf_counter()
+    movies_df = catalog.read_movies(processed_path)
+    result['parse_s'] = round(time.perf_counter() - started, 2)
+    result['parse_peak_rss_mb'] = peak_rss_mb()
+    started = time.perf_counter()
+    tfidf, vectors = catalog.build_vectors(movies_df)
+    result['vectorize_s'] = round(time.perf_counter() - started, 2)
+    result['features'] = int(vectors.shape[1])
+    result['vector_nnz'] = int(vectors.nnz)
+    result['vectorize_peak_rss_mb'] = peak_rss_mb()
+    started = time.perf_counter()
+    catalog_store.write_store(movies_df, tfidf, vectors, store_dir)
+    result['store_write_s'] = round(time.perf_counter() - started, 2)
+    result['artifact_mb'] = directory_mb(store_dir)
+    result['build_peak_rss_mb'] = peak_rss_mb()
+    return result
+
+
+def serve_stage(workdir: str, queries: int, seed: int) -> Dict:
+    """Open the store in a fresh process, build the serving indexes and time the hot paths."""
+    started = time.perf_counter()
+    import catalog
+    import catalog_store
+    from model_registry import ModelBundle
+    from recommender import diverse_recommendations, recommendation_filters
+    imports_s = time.perf_counter() - started
+
+    processed_path = os.path.join(workdir, PROCESSED_CSV)
+    started = time.perf_counter()
+    movies, vectors, details = catalog_store.open_store(os.path.join(workdir, STORE_DIR))
+    load_s = time.perf_counter() - started
+    started = time.perf_counter()
+    bundle = ModelBundle('benchmark', processed_path, movies, vectors, details)
+    index_s = time.perf_counter() - started
+    rss_loaded = peak_rss_mb()
+
+    rng = np.random.default_rng(seed)
+    n = len(movies)
+    # Seeds and queries lean towards popular movies, like real traffic
+    popular = np.argsort(-movies['popularity'].to_numpy())[:max(1000, n // 100)]
+    seeds = rng.choice(popular, queries)
+    genre_names = details.lists['genres'].name_list()
+    filters = [recommendation_filters([rng.choice(genre_names)], (int(low), int(low) + 20), float(rating))
+               for low, rating in zip(rng.integers(1950, 2005, queries), rng.choice([0, 5, 7], queries))]
+    titles = movies['title'].to_numpy()[rng.choice(popular, queries)]
+    searches = []
+    for title in titles.tolist():
+        query = title[:int(rng.integers(3, max(4, len(title) + 1)))]
+        if len(query) > 4 and rng.random() < 0.3:
+            cut = int(rng.integers(1, len(query) - 1))
+            query = query[:cut] + query[cut + 1:]
+        searches.append((query,))
+
+    genre_lists = details.lists['genres']
+    return {
+        'imports_s': round(imports_s, 2),
+        'load_s': round(load_s, 3),
+        'index_build_s': round(index_s, 2),
+        'loaded_rss_mb': rss_loaded,
+        'recommend': timed([(int(pos),) for pos in seeds], lambda pos: diverse_recommendations(
+            bundle.vectors, bundle.genre_bitmap, pos, 10)),
+        'recommend_filtered': timed(list(zip(seeds.tolist(), filters)), lambda pos, f: diverse_recommendations(
+            bundle.vectors, bundle.genre_bitmap, pos, 10, allowed=bundle.filter_index.mask(f))),
+        'filter': timed([(f,) for f in filters], lambda f: catalog.filter_movies(
+            bundle.movies, f[0], f[1], f[2], sort_by='Rating', genre_lists=genre_lists)[:20]),
+        'search': timed(searches, lambda q: bundle.search_index.search(q, limit=10)),
+        'serve_peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def _child(stage: str, rows: int, workdir: str, queries: int, seed: int):
+    if stage == 'generate':
+        result = generate_stage(rows, workdir, seed)
+    elif stage == 'build':
+        result = build_stage(workdir)
+    else:
+        result = serve_stage(workdir, queries, seed)
+    print(json.dumps(result))
+
+
+def run_stage(stage: str, rows: int, workdir: str, queries: int, seed: int) -> Dict:
+    """Run one stage in a fresh interpreter, so its peak RSS and load time are its own."""
+    command = [sys.executable, os.path.abspath(__file__), '--child', stage, '--sizes', str(rows),
+               '--workdir', workdir, '--queries', str(queries), '--seed', str(seed)]
+    result = subprocess.run(command, capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else
+                           f"exit status {result.returncode}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def estimate(rows: int, completed: List[Dict], field) -> float:
+    """field(entry) at rows, extrapolated linearly from the last two completed sizes (or scaled from one)."""
+    last = completed[-1]
+    if len(completed) == 1 or completed[-2]['rows'] == last['rows']:
+        return field(last) * rows / last['rows']
+    before = completed[-2]
+    slope = (field(last) - field(before)) / (last['rows'] - before['rows'])
+    return field(last) + slope * (rows - last['rows'])
+
+
+def skip_reason(rows: int, completed: List[Dict], free: Dict[str, int]) -> Optional[str]:
+    """Why rows shouldn't be attempted on this box, judged from the sizes completed so far."""
+    if not completed:
+        return None
+    memory = HEADROOM * estimate(rows, completed, lambda e: max(e['build_peak_rss_mb'], e['serve_peak_rss_mb']))
+    disk = HEADROOM * estimate(rows, completed, lambda e: e['disk_mb'])
+    if memory > free['memory_mb']:
+        return f"needs about {memory:,.0f} MB of memory, {free['memory_mb']:,} MB available"
+    if disk > free['disk_mb']:
+        return f"needs about {disk:,.0f} MB of disk, {free['disk_mb']:,} MB free"
+    return None
+
+
+def run(sizes: List[int], queries: int, seed: int, workdir: Optional[str], force: bool) -> Dict:
+    import sklearn
+    root = tempfile.mkdtemp(prefix='catalog-benchmark-', dir=workdir)
+    report = {
+        'timestamp': time.time(),
+        'machine': {'cpus': os.cpu_count(), 'platform': platform.platform(), 'python': platform.python_version(),
+                    'numpy': np.__version__, 'pandas': pd.__version__, 'sklearn': sklearn.__version__,
+                    **available_mb(root)},
+        'queries': queries,
+        'seed': seed,
+        'sizes': [],
+    }
+    completed: List[Dict] = []
+    try:
+        for rows in sorted(sizes):
+            entry = {'rows': rows}
+            reason = None if force else skip_reason(rows, completed, available_mb(root))
+            if reason:
+                entry['skipped'] = reason
+                report['sizes'].append(entry)
+                print(f"{rows:>10,} rows: skipped ({reason})", flush=True)
+                continue
+            directory = os.path.join(root, str(rows))
+            os.makedirs(directory)
+            try:
+                entry.update(run_stage('generate', rows, directory, queries, seed))
+                entry.update(run_stage('build', rows, directory, queries, seed))
+                entry['disk_mb'] = directory_mb(directory)
+                entry.update(run_stage('serve', rows, directory, queries, seed))
+            except RuntimeError as e:
+                entry['error'] = str(e)
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+            report['sizes'].append(entry)
+            print_entry(entry)
+            if 'error' not in entry:
+                completed.append(entry)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return report
+
+
+def print_entry(entry: Dict):
+    if 'error' in entry:
+        print(f"{entry['rows']:>10,} rows: failed ({entry['error']})", flush=True)
+        return
+    print(f"{entry['rows']:>10,} rows: processing {entry['processing_s']}s, parse {entry['parse_s']}s, "
+          f"vectorize {entry['vectorize_s']}s, store write {entry['store_write_s']}s, "
+          f"artifact {entry['artifact_mb']:,} MB, peak RSS {entry['build_peak_rss_mb']:,} MB", flush=True)
+    print(f"{'':>16}load {entry['load_s']}s, index build {entry['index_build_s']}s, "
+          f"serving peak RSS {entry['serve_peak_rss_mb']:,} MB", flush=True)
+    for name in ('recommend', 'recommend_filtered', 'filter', 'search'):
+        r = entry[name]
+        print(f"{'':>16}{name + ':':<20}p50 {r['p50_ms']} ms | p95 {r['p95_ms']} ms | p99 {r['p99_ms']} ms",
+              flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the catalog pipeline on synthetic TMDb-shaped catalogs")
+    parser.add_argument('--sizes', default=','.join(str(n) for n in DEFAULT_SIZES),
+                        help="Comma-separated catalog sizes (rows)")
+    parser.add_argument('--queries', type=int, default=500, help="Timed calls per latency measurement")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workdir', help="Where to write the catalogs (default: the system temp directory)")
+    parser.add_argument('--force', action='store_true', help="Run sizes even if they look too big for this box")
+    parser.add_argument('--output', default=BENCHMARK_FILE, help="JSONL file the run's report is appended to")
+    parser.add_argument('--json', help="Also write the report to this file")
+    parser.add_argument('--child', choices=('generate', 'build', 'serve'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(',')]
+    if args.child:
+        _child(args.child, sizes[0], args.workdir, args.queries, args.seed)
+        return
+
+    report = run(sizes, args.queries, args.seed, args.workdir, args.force)
+    with open(args.output, 'a') as f:
+        f.write(json.dumps(report) + "\n")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    print(f"Report appended to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
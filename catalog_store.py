@@ -0,0 +1,373 @@
+# catalog_store.py - Read-only, memory-mapped catalog and TF-IDF store shared by worker processes
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import catalog
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+    from scipy import sparse
+
+STORE_ROOT = 'catalog_store'
+# Bump when the on-disk layout changes so old stores are rebuilt instead of misread
+STORE_FORMAT = 2
+
+MANIFEST_FILE = 'manifest.json'
+TEXT_FILE = 'text.arrow'
+VECTORIZER_FILE = 'tfidf.pkl'
+CSR_PARTS = ('data', 'indices', 'indptr')
+# Short text columns with many repeats, stored as int codes (pandas Categorical at runtime)
+CATEGORY_COLUMNS = ('director', 'original_language')
+# Long text kept out of memory and read per row when a card or API result shows it
+DEFERRED_TEXT_COLUMNS = ('overview',)
+# Only used to fit the TF-IDF model, never served
+BUILD_ONLY_COLUMNS = ('enhanced_tags', 'tags')
+# Float columns whose magnitude stays below this are stored as float32 without losing
+# displayed precision; larger ones (money stored as float) keep float64
+FLOAT32_LIMIT = 2 ** 24
+
+
+def store_key(source_path: str) -> str:
+    """Version of a dataset file: changes whenever the file is rewritten."""
+    stat = os.stat(source_path)
+    ident = f"{os.path.abspath(source_path)}|{stat.st_size}|{stat.st_mtime_ns}|{STORE_FORMAT}"
+    return hashlib.sha1(ident.encode()).hexdigest()[:16]
+
+
+def _column_kind(name: str, column: pd.Series) -> Optional[str]:
+    if name in BUILD_ONLY_COLUMNS:
+        return None
+    if name in catalog.LIST_COLUMNS:
+        return 'list'
+    if name in CATEGORY_COLUMNS:
+        return 'category'
+    if name in DEFERRED_TEXT_COLUMNS:
+        return 'deferred'
+    if isinstance(column.dtype, np.dtype) and column.dtype.kind in 'biuf':
+        return 'array'
+    return 'text'
+
+
+def _narrow(values: np.ndarray) -> np.ndarray:
+    """int64 -> int32 and float64 -> float32 where every value still fits."""
+    if not len(values):
+        return values
+    if values.dtype.kind in 'iu':
+        info = np.iinfo(np.int32)
+        if values.dtype.itemsize > 4 and info.min <= values.min() and values.max() <= info.max:
+            return values.astype(np.int32)
+    elif values.dtype.kind == 'f' and values.dtype.itemsize > 4:
+        finite = values[np.isfinite(values)]
+        if not len(finite) or np.abs(finite).max() < FLOAT32_LIMIT:
+            return values.astype(np.float32)
+    return values
+
+
+def _code_dtype(n_names: int) -> np.dtype:
+    return np.dtype(np.int16 if n_names <= np.iinfo(np.int16).max else np.int32)
+
+
+def _write_strings(prefix: str, strings: Sequence[str]):
+    """Strings back to back as UTF-8 in prefix.bin, with int64 byte offsets in prefix_offsets.npy."""
+    encoded = [value.encode('utf-8') for value in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    with open(f"{prefix}.bin", 'wb') as f:
+        f.write(b''.join(encoded))
+    np.save(f"{prefix}_offsets.npy", offsets)
+
+
+def _write_list_column(prefix: str, column: pd.Series):
+    rows = [[str(v) for v in x] if isinstance(x, list) else [] for x in column.tolist()]
+    names = sorted({value for row in rows for value in row})
+    code_of = {name: code for code, name in enumerate(names)}
+    lengths = np.fromiter((len(row) for row in rows), dtype=np.int64, count=len(rows))
+    offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    codes = np.fromiter((code_of[value] for row in rows for value in row), dtype=_code_dtype(len(names)),
+                        count=int(offsets[-1]))
+    _write_strings(f"{prefix}_names", names)
+    np.save(f"{prefix}_codes.npy", codes)
+    np.save(f"{prefix}_offsets.npy", _narrow(offsets))
+
+
+def _write_category_column(prefix: str, column: pd.Series):
+    values = [None if pd.isna(x) else str(x) for x in column.tolist()]
+    names = sorted({value for value in values if value is not None})
+    code_of = {name: code for code, name in enumerate(names)}
+    codes = np.array([-1 if value is None else code_of[value] for value in values], dtype=_code_dtype(len(names)))
+    _write_strings(f"{prefix}_names", names)
+    np.save(f"{prefix}_codes.npy", codes)
+
+
+def write_store(movies_df: pd.DataFrame, tfidf, vectors, directory: str):
+    """Write the catalog and model as files that open_store() maps without copying.
+
+    Numeric and boolean columns become one narrowed .npy each. Short text shares an
+    uncompressed Arrow IPC file, repetitive text (director, language) is stored as
+    codes into a name table, list columns as codes plus CSR-style row offsets, and
+    overviews as one UTF-8 file read per row. The CSR vectors are stored as their
+    three arrays; columns only used to fit the model are dropped.
+    """
+    # pyarrow and scipy are imported on first use: a process serving degraded mode
+    # (or only checking store keys) never pays for them
+    import pyarrow as pa
+    from scipy import sparse
+
+    os.makedirs(directory, exist_ok=True)
+    columns = []
+    text_fields = {}
+    for name in movies_df.columns:
+        column = movies_df[name]
+        kind = _column_kind(name, column)
+        if kind is None:
+            continue
+        prefix = os.path.join(directory, f"col_{len(columns)}")
+        if kind == 'array':
+            np.save(f"{prefix}.npy", _narrow(column.to_numpy()))
+        elif kind == 'list':
+            _write_list_column(prefix, column)
+        elif kind == 'category':
+            _write_category_column(prefix, column)
+        elif kind == 'deferred':
+            _write_strings(prefix, ['' if pd.isna(x) else str(x) for x in column.tolist()])
+        else:
+            text_fields[name] = pa.array(
+                [None if pd.isna(x) else str(x) for x in column.tolist()], type=pa.string())
+        columns.append([name, kind])
+    table = pa.table(text_fields) if text_fields else pa.table({'_': pa.nulls(len(movies_df))})
+    with pa.OSFile(os.path.join(directory, TEXT_FILE), 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+    # Canonical CSR so nothing downstream needs to sort or dedupe the read-only arrays
+    csr = sparse.csr_matrix(vectors, copy=True)
+    csr.sum_duplicates()
+    csr.sort_indices()
+    for part in CSR_PARTS:
+        np.save(os.path.join(directory, f"tfidf_{part}.npy"), getattr(csr, part))
+    with open(os.path.join(directory, VECTORIZER_FILE), 'wb') as f:
+        pickle.dump(tfidf, f)
+
+    # The manifest is written last: a directory without one is incomplete
+    with open(os.path.join(directory, MANIFEST_FILE), 'w') as f:
+        json.dump({'format': STORE_FORMAT, 'rows': len(movies_df), 'columns': columns,
+                   'shape': list(csr.shape), 'nnz': int(csr.nnz)}, f)
+
+
+class TextColumn:
+    """Strings stored back to back as UTF-8 in one memory-mapped file.
+
+    Nothing is decoded, or even paged in, until a row is read, so long text such as
+    overviews costs no resident memory for movies that are never shown.
+    """
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+
+    @classmethod
+    def open(cls, prefix: str) -> "TextColumn":
+        offsets = np.load(f"{prefix}_offsets.npy", mmap_mode='r')
+        # np.memmap refuses empty files
+        blob = np.memmap(f"{prefix}.bin", dtype=np.uint8, mode='r') if offsets[-1] else np.empty(0, np.uint8)
+        return cls(blob, offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, pos: int) -> str:
+        return self.blob[self.offsets[pos]:self.offsets[pos + 1]].tobytes().decode('utf-8')
+
+    def take(self, positions: Iterable[int]) -> List[str]:
+        return [self[int(pos)] for pos in positions]
+
+    def to_arrow(self) -> "pa.LargeStringArray":
+        """Zero-copy Arrow view (for vectorized string kernels and pandas string arrays)."""
+        import pyarrow as pa
+        return pa.LargeStringArray.from_buffers(len(self), pa.py_buffer(self.offsets), pa.py_buffer(self.blob))
+
+    def tolist(self) -> List[str]:
+        return self.to_arrow().to_pylist()
+
+
+class ListColumn:
+    """A list-of-strings column as int codes into a name table, with CSR-style row offsets.
+
+    Row i holds names[codes[offsets[i]:offsets[i + 1]]]. Codes, offsets and names are
+    all memory-mapped, so filters run over small integer arrays shared by every worker
+    and Python lists are only built for the rows being displayed.
+    """
+
+    def __init__(self, names: TextColumn, codes: np.ndarray, offsets: np.ndarray):
+        self.names = names
+        self.codes = codes
+        self.offsets = offsets
+
+    @classmethod
+    def open(cls, prefix: str) -> "ListColumn":
+        return cls(TextColumn.open(f"{prefix}_names"), np.load(f"{prefix}_codes.npy", mmap_mode='r'),
+                   np.load(f"{prefix}_offsets.npy", mmap_mode='r'))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, pos: int) -> List[str]:
+        return [self.names[code] for code in self.codes[self.offsets[pos]:self.offsets[pos + 1]]]
+
+    def take(self, positions: Iterable[int]) -> List[List[str]]:
+        return [self[int(pos)] for pos in positions]
+
+    def name_list(self) -> List[str]:
+        """Every distinct value, sorted (a value's code is its index here)."""
+        return self.names.tolist()
+
+    def codes_of(self, values: Iterable[str]) -> np.ndarray:
+        """Codes of the given values; values not in the column are dropped."""
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        found = pc.index_in(pa.array(list(values), type=pa.large_string()), value_set=self.names.to_arrow())
+        return found.drop_null().to_numpy().astype(np.int64)
+
+    def codes_matching(self, substring: str, ignore_case: bool = True) -> np.ndarray:
+        """Codes of the values containing substring."""
+        import pyarrow.compute as pc
+        hits = pc.match_substring(self.names.to_arrow(), substring, ignore_case=ignore_case)
+        return np.flatnonzero(hits.to_numpy(zero_copy_only=False))
+
+    def rows_containing(self, codes: np.ndarray) -> np.ndarray:
+        """Boolean row mask: rows holding at least one of codes."""
+        mask = np.zeros(len(self), dtype=bool)
+        if len(codes):
+            hits = np.flatnonzero(np.isin(self.codes, codes))
+            mask[np.searchsorted(self.offsets, hits, side='right') - 1] = True
+        return mask
+
+    def bitmap(self) -> np.ndarray:
+        """Boolean rows x names matrix (column j is names[j])."""
+        bitmap = np.zeros((len(self), len(self.names)), dtype=bool)
+        rows = np.repeat(np.arange(len(self)), np.diff(self.offsets))
+        bitmap[rows, self.codes] = True
+        return bitmap
+
+
+class CatalogDetails:
+    """The list and long-text columns of a store, kept out of the movies DataFrame.
+
+    The DataFrame returned with it has a RangeIndex, so any slice of it (a page of
+    cards, an API response) keeps its row positions as index labels; expand() adds
+    the detail columns back for just those rows.
+    """
+
+    def __init__(self, lists: Dict[str, ListColumn], texts: Dict[str, TextColumn]):
+        self.lists = lists
+        self.texts = texts
+
+    def expand(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """Copy of a slice of the movies frame with its list and text columns filled in."""
+        positions = frame.index.to_numpy()
+        expanded = frame.copy()
+        for name, column in self.lists.items():
+            expanded[name] = pd.Series(column.take(positions), index=frame.index, dtype=object)
+        for name, column in self.texts.items():
+            expanded[name] = column.take(positions)
+        return expanded
+
+
+def open_store(directory: str) -> Tuple[pd.DataFrame, "sparse.csr_matrix", CatalogDetails]:
+    """Map a store written by write_store(); returns (movies_df, vectors, details).
+
+    Numeric columns, text columns, category codes, list columns and the TF-IDF arrays
+    are views of read-only file mappings, so every process opening the same store
+    shares one copy in the page cache. List and deferred text columns are not in
+    movies_df; they live in details, read per row or filtered as code arrays.
+    """
+    import pyarrow as pa
+    from scipy import sparse
+
+    with open(os.path.join(directory, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    table = pa.ipc.open_file(pa.memory_map(os.path.join(directory, TEXT_FILE))).read_all()
+    data = {}
+    lists = {}
+    texts = {}
+    for i, (name, kind) in enumerate(manifest['columns']):
+        prefix = os.path.join(directory, f"col_{i}")
+        if kind == 'array':
+            data[name] = np.load(f"{prefix}.npy", mmap_mode='r')
+        elif kind == 'list':
+            lists[name] = ListColumn.open(prefix)
+        elif kind == 'deferred':
+            texts[name] = TextColumn.open(prefix)
+        elif kind == 'category':
+            names = TextColumn.open(f"{prefix}_names")
+            categories = pd.Index(pd.arrays.ArrowStringArray(names.to_arrow()))
+            data[name] = pd.Categorical.from_codes(np.load(f"{prefix}_codes.npy", mmap_mode='r'), categories=categories)
+        else:
+            data[name] = pd.arrays.ArrowStringArray(table.column(name))
+    # copy=False keeps one block per column instead of consolidating the mapped arrays
+    movies_df = pd.DataFrame(data, copy=False)
+
+    parts = [np.load(os.path.join(directory, f"tfidf_{part}.npy"), mmap_mode='r') for part in CSR_PARTS]
+    vectors = sparse.csr_matrix(tuple(parts), shape=tuple(manifest['shape']), copy=False)
+    vectors.has_sorted_indices = True
+    vectors.has_canonical_format = True
+    return movies_df, vectors, CatalogDetails(lists, texts)
+
+
+def load_vectorizer(directory: str):
+    """The fitted TfidfVectorizer of a store, for transforming new text (imports scikit-learn)."""
+    with open(os.path.join(directory, VECTORIZER_FILE), 'rb') as f:
+        return pickle.load(f)
+
+
+def store_directory(source_path: str, root: str = STORE_ROOT) -> str:
+    """Directory of the store for the current version of a dataset file."""
+    return os.path.join(root, store_key(source_path))
+
+
+def load_store(source_path: str, root: str = STORE_ROOT) -> Tuple[pd.DataFrame, "sparse.csr_matrix", CatalogDetails]:
+    """Open the store for a dataset file, building it first if it is missing or stale.
+
+    Builds go to a temporary directory that is renamed into place, so concurrent
+    workers never see a half-written store; if two build at once, the first rename
+    wins and the other's copy is discarded.
+    """
+    directory = store_directory(source_path, root)
+    if not os.path.exists(os.path.join(directory, MANIFEST_FILE)):
+        movies_df = catalog.read_movies(source_path)
+        tfidf, vectors = catalog.build_vectors(movies_df)
+        os.makedirs(root, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix='.building-', dir=root)
+        try:
+            write_store(movies_df, tfidf, vectors, staging)
+            os.rename(staging, directory)
+        except OSError:
+            if not os.path.exists(os.path.join(directory, MANIFEST_FILE)):
+                raise
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+    return open_store(directory)
+
+
+def prune_stores(keep: int = 2, root: str = STORE_ROOT):
+    """Delete all but the newest `keep` stores under root.
+
+    Processes still mapping a deleted store keep their pages until they unmap it
+    (POSIX unlink semantics); where the OS refuses, the store is left for next time.
+    """
+    try:
+        entries = [os.path.join(root, name) for name in os.listdir(root) if not name.startswith('.')]
+    except FileNotFoundError:
+        return
+    stores = [path for path in entries if os.path.exists(os.path.join(path, MANIFEST_FILE))]
+    stores.sort(key=lambda path: os.path.getmtime(os.path.join(path, MANIFEST_FILE)), reverse=True)
+    for path in stores[keep:]:
+        shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,112 @@
+# cf_benchmark.py - Build time, query latency and update latency of the item-item CF engine on synthetic ratings
+import argparse
+import json
+import resource
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from collaborative import DEFAULT_NEIGHBORS, DEFAULT_SHRINKAGE, ItemItemCF
+from load_test import percentile
+
+# Taste clusters of the synthetic catalog; a user rates movies of their own cluster higher.
+CLUSTERS = 50
+
+
+def synthetic_ratings(n_users: int, n_items: int, per_user: int, seed: int = 0
+                      ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(user, item, rating) arrays, one rating per user and item, on the 1-10 scale.
+
+    Movies are picked with Zipf-like popularity, so a few are rated by a large share
+    of users and most by a handful. A rating combines the movie's quality, the user's
+    leniency and whether the movie is in the user's taste cluster.
+    """
+    rng = np.random.default_rng(seed)
+    popularity = 1.0 / np.arange(1, n_items + 1) ** 0.8
+    popularity = rng.permutation(popularity / popularity.sum())
+    per = rng.poisson(per_user, n_users).clip(1, n_items)
+    users = np.repeat(np.arange(n_users, dtype=np.int32), per)
+    items = rng.choice(n_items, len(users), p=popularity).astype(np.int32)
+    # Drop repeat picks of the same movie by the same user
+    _, first = np.unique(users.astype(np.int64) * n_items + items, return_index=True)
+    users, items = users[first], items[first]
+
+    item_cluster = rng.integers(0, CLUSTERS, n_items)
+    user_cluster = rng.integers(0, CLUSTERS, n_users)
+    quality = rng.normal(0, 1, n_items)
+    leniency = rng.normal(0, 1, n_users)
+    match = item_cluster[items] == user_cluster[users]
+    scores = 5.5 + quality[items] + leniency[users] + 2.5 * match + rng.normal(0, 1, len(users))
+    return users, items, np.clip(np.round(scores), 1, 10).astype(np.float32)
+
+
+def timed(calls: List, fn) -> Dict:
+    """Latency percentiles (ms) of fn(*args) over calls."""
+    ms = []
+    for args in calls:
+        started = time.perf_counter()
+        fn(*args)
+        ms.append((time.perf_counter() - started) * 1000)
+    ms.sort()
+    return {'calls': len(ms), 'p50_ms': round(percentile(ms, 50), 3), 'p95_ms': round(percentile(ms, 95), 3),
+            'p99_ms': round(percentile(ms, 99), 3), 'max_ms': round(ms[-1], 3) if ms else 0.0}
+
+
+def run(n_users: int, n_items: int, per_user: int, k: int, shrinkage: float, queries: int, seed: int) -> Dict:
+    started = time.perf_counter()
+    users, items, ratings = synthetic_ratings(n_users, n_items, per_user, seed)
+    generate_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    cf = ItemItemCF.build([f"user{u}" for u in range(n_users)], users, items, ratings, n_items, k, shrinkage)
+    build_s = time.perf_counter() - started
+
+    rng = np.random.default_rng(seed + 1)
+    sample_users = rng.integers(0, n_users, queries)
+    profiles = [cf.user_ratings(f"user{u}") for u in sample_users]
+    results = {
+        'users': n_users, 'items': n_items, 'ratings': int(len(ratings)), 'k': k, 'shrinkage': shrinkage,
+        'generate_s': round(generate_s, 2),
+        'build_s': round(build_s, 2),
+        'items_with_neighbors': int((cf.neighbors[:, 0] >= 0).sum()),
+        'neighbors': timed([(int(i),) for i in rng.integers(0, n_items, queries)], cf.item_neighbors),
+        'recommend': timed([(profile, 10) for profile in profiles], cf.recommend),
+        # New ratings by existing users, then by users the build never saw
+        'update': timed([(f"user{u}", int(i), float(r)) for u, i, r in zip(
+            sample_users, rng.choice(n_items, queries), rng.integers(1, 11, queries))], cf.update),
+        'update_new_user': timed([(f"new{j}", int(i), float(r)) for j, (i, r) in enumerate(zip(
+            rng.choice(n_items, queries), rng.integers(1, 11, queries)))], cf.update),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024),
+    }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark item-item CF on synthetic ratings")
+    parser.add_argument('--users', type=int, default=1_000_000)
+    parser.add_argument('--items', type=int, default=100_000)
+    parser.add_argument('--ratings-per-user', type=int, default=10)
+    parser.add_argument('--k', type=int, default=DEFAULT_NEIGHBORS)
+    parser.add_argument('--shrinkage', type=float, default=DEFAULT_SHRINKAGE)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help="Also write the results to this file")
+    args = parser.parse_args()
+
+    results = run(args.users, args.items, args.ratings_per_user, args.k, args.shrinkage, args.queries, args.seed)
+    print(f"{results['ratings']:,} ratings by {results['users']:,} users of {results['items']:,} movies "
+          f"(generated in {results['generate_s']}s)")
+    print(f"  build:     {results['build_s']}s, {results['items_with_neighbors']:,} movies with neighbours, "
+          f"peak RSS {results['peak_rss_mb']:,} MB")
+    for name in ('neighbors', 'recommend', 'update', 'update_new_user'):
+        r = results[name]
+        print(f"  {name + ':':<17}p50 {r['p50_ms']} ms | p95 {r['p95_ms']} ms | p99 {r['p99_ms']} ms | "
+              f"max {r['max_ms']} ms")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
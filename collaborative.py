@@ -0,0 +1,438 @@
+# collaborative.py - Item-item collaborative filtering over explicit user ratings
+import queue
+import threading
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+# Neighbours kept per movie.
+DEFAULT_NEIGHBORS = 50
+# Shrinkage: a similarity backed by n co-ratings is scaled by n / (n + SHRINKAGE).
+DEFAULT_SHRINKAGE = 10.0
+# Movies whose similarity rows are computed per sparse product, and the co-rating pairs
+# (an upper bound on the product's entries) one block may cover; together they bound peak memory.
+DEFAULT_BLOCK_SIZE = 2048
+DEFAULT_BLOCK_PAIRS = 16_000_000
+# Pair statistics deltas (and ratings of updated users) held between builds; reaching it
+# triggers a rebuild. At about 20 bytes per pair this bounds the deltas to ~40 MB.
+DEFAULT_MAX_DELTAS = 2_000_000
+
+
+def ratings_arrays(rows: Iterable[Tuple[str, int, float]], position_by_id: Mapping[int, int]
+                   ) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]:
+    """(user ids, user index, item position, rating) arrays from (user_id, movie_id, rating) rows.
+
+    Items are catalog row positions; ratings of movies not in the catalog are dropped.
+    """
+    user_index: Dict[str, int] = {}
+    users, items, ratings = [], [], []
+    for user_id, movie_id, rating in rows:
+        pos = position_by_id.get(int(movie_id))
+        if pos is None:
+            continue
+        users.append(user_index.setdefault(user_id, len(user_index)))
+        items.append(pos)
+        ratings.append(rating)
+    return (list(user_index), np.asarray(users, dtype=np.int32), np.asarray(items, dtype=np.int32),
+            np.asarray(ratings, dtype=np.float32))
+
+
+def item_blocks(pairs: np.ndarray, max_items: int, max_pairs: int) -> List[Tuple[int, int]]:
+    """Consecutive (start, stop) item ranges with at most max_items items and, where one
+    item alone doesn't exceed it, at most max_pairs summed pairs."""
+    blocks, start, total = [], 0, 0
+    for item, count in enumerate(pairs.tolist()):
+        if item > start and (item - start >= max_items or total + count > max_pairs):
+            blocks.append((start, item))
+            start, total = item, 0
+        total += count
+    if start < len(pairs):
+        blocks.append((start, len(pairs)))
+    return blocks
+
+
+def top_k_per_row(rows: np.ndarray, cols: np.ndarray, values: np.ndarray, n_rows: int, k: int
+                  ) -> Tuple[np.ndarray, np.ndarray]:
+    """Best k (col, value) entries of each row of a COO matrix, highest first (ties: lower col).
+
+    Returns (n_rows, k) index and value arrays padded with -1 / -inf.
+    """
+    indices = np.full((n_rows, k), -1, dtype=np.int32)
+    top = np.full((n_rows, k), -np.inf, dtype=np.float32)
+    order = np.lexsort((cols, -values, rows))
+    rows, cols, values = rows[order], cols[order], values[order]
+    rank = np.arange(len(rows)) - np.searchsorted(rows, rows)
+    keep = rank < k
+    indices[rows[keep], rank[keep]] = cols[keep]
+    top[rows[keep], rank[keep]] = values[keep]
+    return indices, top
+
+
+class ItemItemCF:
+    """Mean-centered item-item cosine neighbours with shrinkage, updated as ratings arrive.
+
+    Each user's ratings are centered on that user's mean (adjusted cosine), so a
+    harsh and a generous rater agree when they rank movies alike. The similarity of
+    two movies is
+        dot(i, j) / (|i| |j|) * n_ij / (n_ij + shrinkage)
+    where n_ij is the number of users who rated both, so pairs backed by a handful
+    of co-ratings don't crowd out well-supported ones. Only the top `k` positive
+    neighbours of each movie are kept.
+
+    build() computes every list in blocks of movies with sparse products. update()
+    then folds in one new rating without a rebuild, in time linear in the user's
+    ratings. It updates the dot products and co-rating counts of the pairs the rated
+    movie forms with the user's other movies, as deltas on top of the frozen build,
+    and the norms of all the user's movies. It recomputes the rated movie's
+    similarity to each of those movies and offers it to both neighbour lists, and
+    rescales the lists of the user's movies whose norms moved. The smaller shifts
+    the user's new mean causes in their other pairs (and the norm change seen from
+    other movies' lists) wait for the next build. The deltas are kept in sorted
+    arrays; once max_deltas of them pile up, the model rebuilds itself from its
+    current ratings.
+
+    on_rating() only queues the rating: a background thread applies it, so a save
+    never waits on an update or a rebuild. wait() blocks until the queue is drained.
+    """
+
+    def __init__(self, n_items: int, k: int = DEFAULT_NEIGHBORS, shrinkage: float = DEFAULT_SHRINKAGE,
+                 max_deltas: int = DEFAULT_MAX_DELTAS):
+        # scipy is imported on first use: importing this module (as the app does at
+        # startup) doesn't pay for it until a model is built
+        from scipy import sparse
+
+        self.n_items = n_items
+        self.k = k
+        self.shrinkage = shrinkage
+        self.max_deltas = max_deltas
+        self.block_size = DEFAULT_BLOCK_SIZE
+        self.block_pairs = DEFAULT_BLOCK_PAIRS
+        self.user_ids: List[str] = []
+        self.user_index: Dict[str, int] = {}
+        # Frozen at build time: raw ratings by user, and mean-centered ratings by item
+        self._by_user = sparse.csr_matrix((0, n_items), dtype=np.float32)
+        self._by_item = sparse.csr_matrix((n_items, 0), dtype=np.float32)
+        self._sq_norms = np.zeros(n_items, dtype=np.float64)
+        self.neighbors = np.full((n_items, k), -1, dtype=np.int32)
+        self.similarities = np.full((n_items, k), -np.inf, dtype=np.float32)
+        # Changes since build(): ratings of updated users, and pair statistics deltas
+        # keyed low * n_items + high, sorted by key
+        self._ratings_since: Dict[int, Dict[int, float]] = {}
+        self._ratings_since_count = 0
+        self._delta_keys = np.empty(0, dtype=np.int64)
+        self._delta_dots = np.empty(0, dtype=np.float64)
+        self._delta_counts = np.empty(0, dtype=np.int32)
+        # Catalog positions by movie id, for on_rating()
+        self.position_by_id: Mapping[int, int] = {}
+        self._lock = threading.Lock()
+        self.updates = 0
+        self.rebuilds = 0
+        self.last_error: Optional[str] = None
+        self._queue: "queue.Queue" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+
+    @classmethod
+    def build(cls, user_ids: List[str], users: np.ndarray, items: np.ndarray, ratings: np.ndarray, n_items: int,
+              k: int = DEFAULT_NEIGHBORS, shrinkage: float = DEFAULT_SHRINKAGE,
+              block_size: int = DEFAULT_BLOCK_SIZE, block_pairs: int = DEFAULT_BLOCK_PAIRS,
+              max_deltas: int = DEFAULT_MAX_DELTAS) -> "ItemItemCF":
+        """Neighbour lists for every movie from (user index, item, rating) triples (one per user and item)."""
+        from scipy import sparse
+
+        cf = cls(n_items, k, shrinkage, max_deltas)
+        cf.block_size, cf.block_pairs = block_size, block_pairs
+        cf.user_ids = list(user_ids)
+        cf.user_index = {user_id: i for i, user_id in enumerate(cf.user_ids)}
+        n_users = len(cf.user_ids)
+        users = np.asarray(users, dtype=np.int32)
+        items = np.asarray(items, dtype=np.int32)
+        ratings = np.asarray(ratings, dtype=np.float32)
+
+        cf._by_user = sparse.csr_matrix((ratings, (users, items)), shape=(n_users, n_items), dtype=np.float32)
+        counts = np.bincount(users, minlength=n_users)
+        means = np.bincount(users, weights=ratings, minlength=n_users) / np.maximum(counts, 1)
+        centered = (ratings - means[users]).astype(np.float32)
+        cf._by_item = sparse.csr_matrix((centered, (items, users)), shape=(n_items, n_users), dtype=np.float32)
+        cf._sq_norms = np.bincount(items, weights=centered.astype(np.float64) ** 2, minlength=n_items)
+        rated = sparse.csr_matrix((np.ones(len(items), dtype=np.float32), (items, users)), shape=(n_items, n_users))
+
+        by_item_t = cf._by_item.T.tocsr()
+        rated_t = rated.T.tocsr()
+        norms = np.sqrt(cf._sq_norms).astype(np.float32)
+        # Each rating of a movie pairs it with every other movie of that rater
+        pairs = np.bincount(items, weights=counts[users], minlength=n_items).astype(np.int64)
+        for start, stop in item_blocks(pairs, block_size, block_pairs):
+            dots = (cf._by_item[start:stop] @ by_item_t).tocoo()
+            together = (rated[start:stop] @ rated_t).tocoo()
+            # A dot product that sums to zero is dropped by the product; the count never is
+            rows, cols = together.row.astype(np.int64), together.col.astype(np.int64)
+            dot_values = np.zeros(len(rows), dtype=np.float32)
+            dot_keys = dots.row.astype(np.int64) * n_items + dots.col
+            keys = rows * n_items + cols
+            order = np.argsort(dot_keys)
+            found = np.searchsorted(dot_keys[order], keys)
+            found = np.minimum(found, max(len(dot_keys) - 1, 0))
+            if len(dot_keys):
+                hit = dot_keys[order][found] == keys
+                dot_values[hit] = dots.data[order][found[hit]]
+            sims = cf._similarity(dot_values, together.data, norms[rows + start], norms[cols])
+            keep = (sims > 0) & (rows + start != cols)
+            indices, values = top_k_per_row(rows[keep], cols[keep], sims[keep], stop - start, k)
+            cf.neighbors[start:stop], cf.similarities[start:stop] = indices, values
+        return cf
+
+    @classmethod
+    def from_store(cls, store, position_by_id: Mapping[int, int], **options) -> "ItemItemCF":
+        """Build from every rating in a user store (anything with rating_rows())."""
+        user_ids, users, items, ratings = ratings_arrays(store.rating_rows(), position_by_id)
+        cf = cls.build(user_ids, users, items, ratings, len(position_by_id), **options)
+        cf.position_by_id = position_by_id
+        return cf
+
+    def _similarity(self, dots, counts, norm_a, norm_b) -> np.ndarray:
+        dots, counts = np.asarray(dots, dtype=np.float32), np.asarray(counts, dtype=np.float32)
+        denominator = np.asarray(norm_a, dtype=np.float32) * np.asarray(norm_b, dtype=np.float32)
+        cosine = np.divide(dots, denominator, out=np.zeros_like(dots), where=denominator > 0)
+        return cosine * counts / (counts + self.shrinkage)
+
+    # --- Queries ---
+    def item_neighbors(self, item: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(items, similarities) of one movie's neighbours, most similar first."""
+        keep = self.neighbors[item] >= 0
+        return self.neighbors[item][keep], self.similarities[item][keep]
+
+    def predict(self, user_ratings: Mapping[int, float]) -> Tuple[np.ndarray, np.ndarray]:
+        """Predicted ratings for every movie from a user's ratings ({item: rating}), and their support.
+
+        A movie's prediction is the user's mean plus the similarity-weighted average of
+        the user's centered ratings over its rated neighbours. Support is the summed
+        similarity behind it; movies with no rated neighbour get support 0 (and the mean).
+        """
+        mean = float(np.mean(list(user_ratings.values()))) if user_ratings else 0.0
+        predicted = np.full(self.n_items, mean, dtype=np.float32)
+        support = np.zeros(self.n_items, dtype=np.float32)
+        if not user_ratings:
+            return predicted, support
+        rated = np.fromiter(user_ratings.keys(), dtype=np.int64, count=len(user_ratings))
+        centered = np.fromiter(user_ratings.values(), dtype=np.float32, count=len(user_ratings)) - mean
+        neighbors, sims = self.neighbors[rated], self.similarities[rated]
+        valid = neighbors >= 0
+        targets = neighbors[valid]
+        weights = sims[valid]
+        numerator = np.bincount(targets, weights=(weights * np.repeat(centered, valid.sum(axis=1))),
+                                minlength=self.n_items)
+        support = np.bincount(targets, weights=weights, minlength=self.n_items).astype(np.float32)
+        has = support > 0
+        predicted[has] += (numerator[has] / support[has]).astype(np.float32)
+        return predicted, support
+
+    def recommend(self, user_ratings: Mapping[int, float], k: int = 10, min_support: float = 0.0
+                  ) -> Tuple[np.ndarray, np.ndarray]:
+        """(items, predicted ratings) of the k best unrated movies with support above min_support."""
+        predicted, support = self.predict(user_ratings)
+        eligible = support > min_support
+        eligible[list(user_ratings)] = False
+        candidates = np.flatnonzero(eligible)
+        order = np.lexsort((candidates, -predicted[candidates]))[:k]
+        return candidates[order], predicted[candidates[order]]
+
+    def user_ratings(self, user_id: str) -> Dict[int, float]:
+        """{item: rating} as currently known for user_id."""
+        u = self.user_index.get(user_id)
+        if u is None:
+            return {}
+        if u in self._ratings_since:
+            return dict(self._ratings_since[u])
+        if u >= self._by_user.shape[0]:
+            return {}
+        row = self._by_user[u]
+        return dict(zip(row.indices.tolist(), row.data.tolist()))
+
+    # --- Incremental updates ---
+    def on_rating(self, user_id: str, movie_id: int, rating: Optional[float]):
+        """Rating listener: queue a saved rating for the background thread to fold in."""
+        pos = self.position_by_id.get(int(movie_id))
+        if pos is None:
+            return
+        with self._worker_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='cf-updates', daemon=True)
+                self._worker.start()
+            self._queue.put((user_id, pos, rating))
+
+    def wait(self):
+        """Block until every rating queued by on_rating() has been folded in."""
+        self._queue.join()
+
+    def close(self):
+        """Stop the background thread once the queued ratings are applied."""
+        with self._worker_lock:
+            worker, self._worker = self._worker, None
+            if worker is not None:
+                self._queue.put(None)
+        if worker is not None:
+            worker.join()
+
+    def update(self, user_id: str, item: int, rating: Optional[float]):
+        """Fold one new, changed or (rating None) removed rating into the statistics and lists."""
+        with self._lock:
+            self._update(user_id, item, rating)
+            if len(self._delta_keys) + self._ratings_since_count > self.max_deltas:
+                self._rebuild()
+
+    def _run(self):
+        while True:
+            change = self._queue.get()
+            try:
+                if change is None:
+                    return
+                self.update(*change)
+            except Exception as e:
+                self.last_error = str(e)
+            finally:
+                self._queue.task_done()
+
+    def _update(self, user_id: str, item: int, rating: Optional[float]):
+        u = self.user_index.get(user_id)
+        if u is None:
+            u = self.user_index[user_id] = len(self.user_ids)
+            self.user_ids.append(user_id)
+        old = self.user_ratings(user_id)
+        new = dict(old)
+        if rating is None:
+            new.pop(item, None)
+        else:
+            new[item] = float(rating)
+        if new == old:
+            return
+        self._ratings_since_count += len(new) - len(self._ratings_since.get(u, ()))
+        self._ratings_since[u] = new
+        self.updates += 1
+
+        touched = np.array(sorted(set(old) | set(new)), dtype=np.int64)
+        x_old = self._centered(old, touched)
+        x_new = self._centered(new, touched)
+        in_old = np.isin(touched, list(old))
+        in_new = np.isin(touched, list(new))
+        old_norms = np.sqrt(np.maximum(self._sq_norms[touched], 0.0))
+        self._sq_norms[touched] += x_new.astype(np.float64) ** 2 - x_old.astype(np.float64) ** 2
+        # Each touched movie's own list shares its norm in every denominator
+        new_norms = np.sqrt(np.maximum(self._sq_norms[touched], 0.0))
+        scale = np.divide(old_norms, new_norms, out=np.zeros_like(new_norms), where=new_norms > 0)
+        with np.errstate(invalid='ignore'):
+            rescaled = self.similarities[touched] * scale[:, None].astype(np.float32)
+        keep = (self.neighbors[touched] >= 0) & (rescaled > 0)
+        self.neighbors[touched] = np.where(keep, self.neighbors[touched], -1)
+        self.similarities[touched] = np.where(keep, rescaled, -np.inf)
+
+        # Only the pairs of the rated movie with the user's other movies
+        at = int(np.searchsorted(touched, item))
+        others = np.delete(touched, at)
+        if not len(others):
+            return
+        dot_change = (x_new[at] * np.delete(x_new, at)).astype(np.float64) \
+            - (x_old[at] * np.delete(x_old, at)).astype(np.float64)
+        count_change = ((in_new[at] & np.delete(in_new, at)).astype(np.int32)
+                        - (in_old[at] & np.delete(in_old, at)).astype(np.int32))
+        self._add_deltas(self._pair_keys(item, others), dot_change, count_change)
+
+        self._offer(item, others, self._pair_similarities(item, others))
+
+    def _centered(self, ratings: Mapping[int, float], items: np.ndarray) -> np.ndarray:
+        values = np.zeros(len(items), dtype=np.float32)
+        if ratings:
+            mean = float(np.mean(list(ratings.values())))
+            for j, item in enumerate(items.tolist()):
+                if item in ratings:
+                    values[j] = ratings[item] - mean
+        return values
+
+    def _pair_keys(self, item: int, others: np.ndarray) -> np.ndarray:
+        return np.minimum(item, others) * self.n_items + np.maximum(item, others)
+
+    def _add_deltas(self, keys: np.ndarray, dots: np.ndarray, counts: np.ndarray):
+        """Add to the deltas of pairs keyed by keys (unique), inserting the pairs not seen yet."""
+        changed = (dots != 0) | (counts != 0)
+        keys, dots, counts = keys[changed], dots[changed], counts[changed]
+        found = np.searchsorted(self._delta_keys, keys)
+        hit = found < len(self._delta_keys)
+        hit[hit] = self._delta_keys[found[hit]] == keys[hit]
+        self._delta_dots[found[hit]] += dots[hit]
+        self._delta_counts[found[hit]] += counts[hit]
+        new = ~hit
+        if new.any():
+            self._delta_keys = np.insert(self._delta_keys, found[new], keys[new])
+            self._delta_dots = np.insert(self._delta_dots, found[new], dots[new])
+            self._delta_counts = np.insert(self._delta_counts, found[new], counts[new])
+
+    def _deltas(self, keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(dot, count) deltas of the pairs keyed by keys; zero for pairs without one."""
+        dots = np.zeros(len(keys), dtype=np.float64)
+        counts = np.zeros(len(keys), dtype=np.int64)
+        if len(self._delta_keys):
+            found = np.minimum(np.searchsorted(self._delta_keys, keys), len(self._delta_keys) - 1)
+            hit = self._delta_keys[found] == keys
+            dots[hit] = self._delta_dots[found[hit]]
+            counts[hit] = self._delta_counts[found[hit]]
+        return dots, counts
+
+    def _pair_similarities(self, item: int, others: np.ndarray) -> np.ndarray:
+        """Current similarity of item to each of others: the build's statistics plus the deltas."""
+        n_users = self._by_item.shape[1]
+        start, stop = self._by_item.indptr[item], self._by_item.indptr[item + 1]
+        item_values = np.zeros(n_users, dtype=np.float32)
+        item_rated = np.zeros(n_users, dtype=bool)
+        item_values[self._by_item.indices[start:stop]] = self._by_item.data[start:stop]
+        item_rated[self._by_item.indices[start:stop]] = True
+        rows = self._by_item[others]
+        row_of = np.repeat(np.arange(len(others)), np.diff(rows.indptr))
+        dot_deltas, count_deltas = self._deltas(self._pair_keys(item, others))
+        dots = np.bincount(row_of, weights=item_values[rows.indices] * rows.data, minlength=len(others)) + dot_deltas
+        counts = np.bincount(row_of, weights=item_rated[rows.indices], minlength=len(others)) + count_deltas
+        norms = np.sqrt(np.maximum(self._sq_norms, 0.0))
+        return self._similarity(dots, counts, np.full(len(others), norms[item]), norms[others])
+
+    def _rebuild(self):
+        """Rebuild from the current ratings (the build's plus the updated users'), dropping the deltas."""
+        ratings = self._by_user.tocoo()
+        keep = ~np.isin(ratings.row, list(self._ratings_since))
+        users = [ratings.row[keep].astype(np.int32)]
+        items = [ratings.col[keep].astype(np.int32)]
+        values = [ratings.data[keep]]
+        for u, user_ratings in self._ratings_since.items():
+            users.append(np.full(len(user_ratings), u, dtype=np.int32))
+            items.append(np.fromiter(user_ratings.keys(), dtype=np.int32, count=len(user_ratings)))
+            values.append(np.fromiter(user_ratings.values(), dtype=np.float32, count=len(user_ratings)))
+        fresh = ItemItemCF.build(self.user_ids, np.concatenate(users), np.concatenate(items),
+                                 np.concatenate(values), self.n_items, self.k, self.shrinkage,
+                                 self.block_size, self.block_pairs)
+        self._by_user, self._by_item, self._sq_norms = fresh._by_user, fresh._by_item, fresh._sq_norms
+        self.neighbors, self.similarities = fresh.neighbors, fresh.similarities
+        self._ratings_since, self._ratings_since_count = {}, 0
+        self._delta_keys, self._delta_dots, self._delta_counts = \
+            fresh._delta_keys, fresh._delta_dots, fresh._delta_counts
+        self.rebuilds += 1
+
+    def _offer(self, item: int, others: np.ndarray, sims: np.ndarray):
+        """Put each of others in item's neighbour list, and item in each of theirs, with similarities
+        sims (taking a pair out where its similarity is no longer positive)."""
+        sims = np.asarray(sims, dtype=np.float32)
+        row, values = self.neighbors[item], self.similarities[item]
+        kept = (row >= 0) & ~np.isin(row, others)
+        cols = np.concatenate([row[kept], others])
+        candidates = np.concatenate([values[kept], sims])
+        positive = candidates > 0
+        indices, top = top_k_per_row(np.zeros(int(positive.sum()), dtype=np.int64), cols[positive],
+                                     candidates[positive], 1, self.k)
+        self.neighbors[item], self.similarities[item] = indices[0], top[0]
+
+        # Each of their lists is already sorted: drop item, append it at its new similarity, re-sort the row
+        rows = np.concatenate([self.neighbors[others], np.full((len(others), 1), item, dtype=np.int32)], axis=1)
+        values = np.concatenate([self.similarities[others], sims[:, None]], axis=1)
+        values[:, :-1][rows[:, :-1] == item] = -np.inf
+        values[~(values > 0)] = -np.inf
+        rows[np.isneginf(values)] = -1
+        order = np.argsort(-values, axis=1, kind='stable')[:, :self.k]
+        self.neighbors[others] = np.take_along_axis(rows, order, axis=1)
+        self.similarities[others] = np.take_along_axis(values, order, axis=1)
@@ -0,0 +1,373 @@
+# event_log.py - Append-only log of implicit feedback (card views, picks, searches, page views) with compaction
+import argparse
+import atexit
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+import file_lock
+from user_store import user_key
+
+EVENT_DIR = 'event_log'
+SEGMENT_DIR = 'segments'
+COUNTER_DIR = 'counters'
+# Names the counter generation readers should map
+CURRENT_FILE = 'CURRENT'
+COMPACT_LOCK = 'compact.lock'
+# Event kinds, in counter column order:
+#   view   - a movie card was shown
+#   select - a movie was picked as the seed of a recommendation
+#   search - a search query was typed (detail holds the query)
+#   page   - a view of the app was opened (detail holds its name)
+KINDS = ('view', 'select', 'search', 'page')
+# Seconds between buffer flushes, and buffered events that trigger one sooner
+FLUSH_INTERVAL = 2.0
+FLUSH_AT = 500
+# Events kept in memory while the disk falls behind; beyond this new events are dropped
+MAX_BUFFERED = 50_000
+# A segment is sealed (and becomes eligible for compaction) at this size or at flush after this age
+SEGMENT_BYTES = 4 * 1024 * 1024
+SEGMENT_SECONDS = 60.0
+# Seconds between compactions attempted by a running log
+COMPACT_INTERVAL = 300.0
+
+
+class EventLog:
+    """Non-blocking event recorder: a memory buffer flushed to rotating JSONL segments.
+
+    log() only appends to a list under a lock; it never touches the disk, so a
+    session logging card views doesn't wait on I/O. A background thread writes the
+    buffer to this process's open segment every flush_interval seconds (sooner once
+    FLUSH_AT events wait) and at exit. Segments are not fsynced: losing the last
+    seconds of views in a crash is acceptable for ranking signals, unlike ratings.
+
+    The open segment (<pid>-<run>.<seq>.open) is locked by its process; the random
+    run id keeps a restarted process that reuses a pid from reusing segment names. It is sealed by
+    renaming it to .jsonl once it reaches segment_bytes or segment_seconds. Only
+    sealed segments are compacted; one whose process died unflushed is sealed by the
+    next compaction. The thread also runs compact() every compact_interval seconds.
+    Only one process on the box compacts at a time; the others skip their turn.
+    """
+
+    def __init__(self, directory: str = EVENT_DIR, flush_interval: float = FLUSH_INTERVAL,
+                 segment_bytes: int = SEGMENT_BYTES, segment_seconds: float = SEGMENT_SECONDS,
+                 max_buffered: int = MAX_BUFFERED, compact_interval: Optional[float] = COMPACT_INTERVAL):
+        self.directory = directory
+        self.segment_dir = os.path.join(directory, SEGMENT_DIR)
+        self.flush_interval = flush_interval
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.max_buffered = max_buffered
+        self.compact_interval = compact_interval
+        self.logged = 0
+        self.dropped = 0
+        self.last_error: Optional[str] = None
+        self._buffer: List[List] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._run_id = uuid.uuid4().hex[:12]
+        self._sequence = 0
+        self._segment: Optional[Tuple[str, object, float]] = None
+        self._last_compact = time.monotonic()
+        os.makedirs(self.segment_dir, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name='event-log-flush', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def log(self, user_id: str, kind: str, movie_id: Optional[int] = None, detail: Optional[str] = None) -> bool:
+        """Buffer one event; returns False if it was dropped because the buffer is full."""
+        if kind not in KINDS:
+            raise ValueError(f"Unknown event kind: {kind}")
+        event = [round(time.time(), 3), user_id, kind, None if movie_id is None else int(movie_id), detail]
+        with self._lock:
+            if self._closed or len(self._buffer) >= self.max_buffered:
+                self.dropped += 1
+                return False
+            self._buffer.append(event)
+            self.logged += 1
+            if len(self._buffer) >= FLUSH_AT:
+                self._wake.set()
+        return True
+
+    def flush(self) -> int:
+        """Write buffered events to the open segment now; returns how many were written."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+            if batch:
+                if self._segment is None:
+                    self._segment = self._open_segment()
+                _, segment, _ = self._segment
+                segment.write(''.join(json.dumps(event, separators=(',', ':')) + "\n" for event in batch))
+                segment.flush()
+            if self._segment is not None:
+                path, segment, opened = self._segment
+                if segment.tell() >= self.segment_bytes or time.monotonic() - opened >= self.segment_seconds:
+                    self._seal()
+            return len(batch)
+
+    def close(self):
+        """Stop the flusher, write what is buffered and seal the open segment (idempotent; also run at exit)."""
+        if self._closed:
+            return
+        with self._lock:
+            self._closed = True
+        self._wake.set()
+        self._thread.join()
+        try:
+            self.flush()
+            with self._flush_lock:
+                self._seal()
+        except Exception as e:
+            self.last_error = str(e)
+
+    # --- Internals ---
+    def _open_segment(self) -> Tuple[str, object, float]:
+        self._sequence += 1
+        path = os.path.join(self.segment_dir, f"{os.getpid()}-{self._run_id}.{self._sequence}.open")
+        segment = open(path, 'a')
+        file_lock.lock(segment, blocking=False)
+        return path, segment, time.monotonic()
+
+    def _seal(self):
+        if self._segment is None:
+            return
+        path, segment, _ = self._segment
+        self._segment = None
+        os.replace(path, path[:-len('.open')] + '.jsonl')
+        segment.close()
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            if self._closed:
+                break
+            try:
+                self.flush()
+                if (self.compact_interval is not None
+                        and time.monotonic() - self._last_compact >= self.compact_interval):
+                    self._last_compact = time.monotonic()
+                    compact(self.directory)
+            except Exception as e:
+                self.last_error = str(e)
+
+
+class EventCounters:
+    """Per-user and per-movie event counts from the latest compaction, memory-mapped.
+
+    Movie counts are rows of item_counts (one column per kind in KINDS), looked up
+    by binary search in the sorted item_ids; user counts likewise, keyed by the
+    64-bit user_key of the user id. Every process maps the same read-only files.
+    """
+
+    def __init__(self, generation: str, item_ids: np.ndarray, item_counts: np.ndarray,
+                 user_keys: np.ndarray, user_counts: np.ndarray, manifest: Dict):
+        self.generation = generation
+        self.item_ids = item_ids
+        self.item_counts = item_counts
+        self.user_keys = user_keys
+        self.user_counts = user_counts
+        self.manifest = manifest
+
+    @classmethod
+    def open(cls, directory: str = EVENT_DIR) -> Optional["EventCounters"]:
+        """Map the current counters, or None if nothing has been compacted yet."""
+        generation = current_generation(directory)
+        if generation is None:
+            return None
+        path = os.path.join(directory, COUNTER_DIR, generation)
+        with open(os.path.join(path, 'manifest.json')) as f:
+            manifest = json.load(f)
+        load = lambda name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r')
+        return cls(generation, load('item_ids'), load('item_counts'), load('user_keys'), load('user_counts'), manifest)
+
+    @staticmethod
+    def _row(keys: np.ndarray, counts: np.ndarray, key) -> Dict[str, int]:
+        i = int(np.searchsorted(keys, key))
+        if i < len(keys) and keys[i] == key:
+            return dict(zip(KINDS, counts[i].tolist()))
+        return dict.fromkeys(KINDS, 0)
+
+    def item(self, movie_id: int) -> Dict[str, int]:
+        """{kind: count} for one movie."""
+        return self._row(self.item_ids, self.item_counts, np.int64(movie_id))
+
+    def user(self, user_id: str) -> Dict[str, int]:
+        """{kind: count} for one user."""
+        return self._row(self.user_keys, self.user_counts, np.uint64(user_key(user_id)))
+
+    def catalog_counts(self, kind: str, position_by_id: Mapping[int, int], n_items: int) -> np.ndarray:
+        """Counts of one kind for every catalog row (0 for movies without events)."""
+        counts = np.zeros(n_items, dtype=np.int64)
+        ids = np.fromiter(position_by_id.keys(), dtype=np.int64, count=len(position_by_id))
+        positions = np.fromiter(position_by_id.values(), dtype=np.int64, count=len(position_by_id))
+        found = np.minimum(np.searchsorted(self.item_ids, ids), max(len(self.item_ids) - 1, 0))
+        if len(self.item_ids):
+            hit = self.item_ids[found] == ids
+            counts[positions[hit]] = self.item_counts[found[hit], KINDS.index(kind)]
+        return counts
+
+
+def current_generation(directory: str = EVENT_DIR) -> Optional[str]:
+    try:
+        with open(os.path.join(directory, COUNTER_DIR, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _seal_orphans(segment_dir: str) -> int:
+    """Seal open segments nobody holds (their process died); returns how many."""
+    sealed = 0
+    for name in os.listdir(segment_dir):
+        if not name.endswith('.open'):
+            continue
+        path = os.path.join(segment_dir, name)
+        try:
+            segment = open(path, 'a')
+        except FileNotFoundError:
+            continue
+        if not file_lock.lock(segment, blocking=False):
+            segment.close()
+            continue
+        os.replace(path, path[:-len('.open')] + '.jsonl')
+        segment.close()
+        sealed += 1
+    return sealed
+
+
+def _read_segments(paths: List[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """(user keys, movie ids, kind codes, has movie) arrays of every event in the segments."""
+    kind_codes = {kind: i for i, kind in enumerate(KINDS)}
+    users, movies, kinds = [], [], []
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                try:
+                    _, user_id, kind, movie_id, _ = json.loads(line)
+                except ValueError:
+                    # A torn last line from a process that died mid-write
+                    continue
+                if kind not in kind_codes:
+                    continue
+                users.append(user_key(user_id))
+                movies.append(-1 if movie_id is None else movie_id)
+                kinds.append(kind_codes[kind])
+    movies = np.asarray(movies, dtype=np.int64)
+    return (np.asarray(users, dtype=np.uint64), movies, np.asarray(kinds, dtype=np.int64), movies >= 0)
+
+
+def _merge_counts(keys: np.ndarray, kinds: np.ndarray, old_keys: np.ndarray, old_counts: np.ndarray
+                  ) -> Tuple[np.ndarray, np.ndarray]:
+    """Sorted distinct keys and their per-kind counts: the old counters plus one per event."""
+    merged, inverse = np.unique(np.concatenate([old_keys, keys]), return_inverse=True)
+    counts = np.zeros((len(merged), len(KINDS)), dtype=np.int64)
+    counts[inverse[:len(old_keys)]] += old_counts
+    np.add.at(counts, (inverse[len(old_keys):], kinds), 1)
+    return merged, counts
+
+
+def compact(directory: str = EVENT_DIR) -> Optional[Dict]:
+    """Roll sealed segments into a new generation of counters; returns its manifest.
+
+    Returns None when another process is compacting or nothing new was sealed. The
+    new counters are written to their own directory and published by replacing
+    CURRENT, so readers see either the old or the new generation, never a mix. Each
+    manifest lists the segments it absorbed: a segment left behind by a crash after
+    publishing is deleted rather than counted twice.
+    """
+    segment_dir = os.path.join(directory, SEGMENT_DIR)
+    counter_dir = os.path.join(directory, COUNTER_DIR)
+    os.makedirs(segment_dir, exist_ok=True)
+    os.makedirs(counter_dir, exist_ok=True)
+    with open(os.path.join(directory, COMPACT_LOCK), 'a') as lock:
+        if not file_lock.lock(lock, blocking=False):
+            return None
+        previous = EventCounters.open(directory)
+        absorbed = set(previous.manifest['segments']) if previous is not None else set()
+        _seal_orphans(segment_dir)
+        names = []
+        for name in sorted(os.listdir(segment_dir)):
+            if not name.endswith('.jsonl'):
+                continue
+            if name in absorbed:
+                os.unlink(os.path.join(segment_dir, name))
+            else:
+                names.append(name)
+        if not names:
+            return None
+
+        users, movies, kinds, has_movie = _read_segments([os.path.join(segment_dir, name) for name in names])
+        if previous is not None:
+            old_items, old_item_counts = previous.item_ids, previous.item_counts
+            old_users, old_user_counts = previous.user_keys, previous.user_counts
+        else:
+            old_items, old_item_counts = np.empty(0, dtype=np.int64), np.empty((0, len(KINDS)), dtype=np.int64)
+            old_users, old_user_counts = np.empty(0, dtype=np.uint64), np.empty((0, len(KINDS)), dtype=np.int64)
+        item_ids, item_counts = _merge_counts(movies[has_movie], kinds[has_movie], old_items, old_item_counts)
+        user_keys, user_counts = _merge_counts(users, kinds, old_users, old_user_counts)
+
+        number = int(previous.generation) + 1 if previous is not None else 1
+        generation = f"{number:08d}"
+        path = os.path.join(counter_dir, generation)
+        os.makedirs(path, exist_ok=True)
+        for name, array in (('item_ids', item_ids), ('item_counts', item_counts),
+                            ('user_keys', user_keys), ('user_counts', user_counts)):
+            np.save(os.path.join(path, f"{name}.npy"), array)
+        manifest = {'generation': generation, 'segments': names, 'events': int(len(kinds)),
+                    'total_events': int(len(kinds)) + (previous.manifest['total_events'] if previous else 0),
+                    'items': int(len(item_ids)), 'users': int(len(user_keys)), 'compacted_at': time.time()}
+        with open(os.path.join(path, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f)
+        tmp = os.path.join(counter_dir, f"{CURRENT_FILE}.tmp")
+        with open(tmp, 'w') as f:
+            f.write(generation)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, os.path.join(counter_dir, CURRENT_FILE))
+
+        for name in names:
+            os.unlink(os.path.join(segment_dir, name))
+        # Processes mapping an older generation keep their pages until they reopen
+        for name in os.listdir(counter_dir):
+            if name.isdigit() and name != generation:
+                shutil.rmtree(os.path.join(counter_dir, name), ignore_errors=True)
+        return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the PopcornPicks implicit-event log")
+    parser.add_argument('--dir', default=EVENT_DIR)
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('compact', help="Roll sealed segments into the counters")
+    commands.add_parser('stats', help="Show the current counters")
+    args = parser.parse_args()
+
+    if args.command == 'compact':
+        manifest = compact(args.dir)
+        print("Nothing to compact." if manifest is None else
+              f"Generation {manifest['generation']}: {manifest['events']:,} new events from "
+              f"{len(manifest['segments'])} segments ({manifest['total_events']:,} in total)")
+    else:
+        counters = EventCounters.open(args.dir)
+        if counters is None:
+            print("No counters yet.")
+            return
+        print(f"Generation {counters.generation}: {counters.manifest['total_events']:,} events, "
+              f"{len(counters.item_ids):,} movies, {len(counters.user_keys):,} users")
+        totals = np.asarray(counters.user_counts).sum(axis=0)
+        for kind, total in zip(KINDS, totals.tolist()):
+            print(f"  {kind:<8}{total:>12,}")
+
+
+if __name__ == '__main__':
+    main()
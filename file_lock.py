@@ -0,0 +1,80 @@
+# file_lock.py - Advisory whole-file locks on POSIX (flock) and Windows (LockFileEx)
+from typing import Union
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: lock one byte far past any real data, so the (mandatory) range lock
+    # never blocks reads or writes of the file's contents
+    import ctypes
+    import msvcrt
+    from ctypes import wintypes
+
+    fcntl = None
+    _LOCKFILE_FAIL_IMMEDIATELY = 0x1
+    _LOCKFILE_EXCLUSIVE_LOCK = 0x2
+    _ERROR_LOCK_VIOLATION = 33
+    _ERROR_NOT_LOCKED = 158
+    _LOCK_OFFSET_HIGH = 0x7FFFFFFF
+
+    class _Overlapped(ctypes.Structure):
+        _fields_ = [('Internal', ctypes.c_void_p), ('InternalHigh', ctypes.c_void_p),
+                    ('Offset', wintypes.DWORD), ('OffsetHigh', wintypes.DWORD), ('hEvent', wintypes.HANDLE)]
+
+    _kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+    _kernel32.LockFileEx.argtypes = [wintypes.HANDLE, wintypes.DWORD, wintypes.DWORD, wintypes.DWORD,
+                                     wintypes.DWORD, ctypes.POINTER(_Overlapped)]
+    _kernel32.UnlockFileEx.argtypes = [wintypes.HANDLE, wintypes.DWORD, wintypes.DWORD, wintypes.DWORD,
+                                       ctypes.POINTER(_Overlapped)]
+
+    def _handle(fd: int):
+        return wintypes.HANDLE(msvcrt.get_osfhandle(fd))
+
+    def _unlock_range(fd: int) -> bool:
+        overlapped = _Overlapped(OffsetHigh=_LOCK_OFFSET_HIGH)
+        return bool(_kernel32.UnlockFileEx(_handle(fd), 0, 1, 0, ctypes.byref(overlapped)))
+
+FileLike = Union[int, object]
+
+
+def _fd(file: FileLike) -> int:
+    return file if isinstance(file, int) else file.fileno()
+
+
+def lock(file: FileLike, shared: bool = False, blocking: bool = True) -> bool:
+    """Lock an open file (object or descriptor) for this process.
+
+    Returns False when blocking is False and another process holds a conflicting
+    lock. Like flock, locking a file this process already locked converts the lock
+    (shared <-> exclusive). The lock is released by unlock() or when the file is
+    closed, including when the process dies.
+    """
+    fd = _fd(file)
+    if fcntl is not None:
+        flags = (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | (0 if blocking else fcntl.LOCK_NB)
+        try:
+            fcntl.flock(fd, flags)
+        except BlockingIOError:
+            return False
+        return True
+    # LockFileEx stacks rather than converts, so drop any lock held through this handle first
+    _unlock_range(fd)
+    flags = (0 if shared else _LOCKFILE_EXCLUSIVE_LOCK) | (0 if blocking else _LOCKFILE_FAIL_IMMEDIATELY)
+    overlapped = _Overlapped(OffsetHigh=_LOCK_OFFSET_HIGH)
+    if _kernel32.LockFileEx(_handle(fd), flags, 0, 1, 0, ctypes.byref(overlapped)):
+        return True
+    error = ctypes.get_last_error()
+    if error == _ERROR_LOCK_VIOLATION:
+        return False
+    raise ctypes.WinError(error)
+
+
+def unlock(file: FileLike):
+    """Release this process's lock on an open file (a no-op if it holds none)."""
+    fd = _fd(file)
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    elif not _unlock_range(fd):
+        error = ctypes.get_last_error()
+        if error != _ERROR_NOT_LOCKED:
+            raise ctypes.WinError(error)
@@ -0,0 +1,93 @@
+# hybrid.py - Blend content (TF-IDF profile) and collaborative (item-item) scores per user
+from typing import Iterable, Mapping, Optional, Tuple
+
+import numpy as np
+
+from collaborative import ItemItemCF
+from recommender import top_k_rows
+
+# Candidates each source contributes before blending.
+CANDIDATES_PER_SOURCE = 200
+# Below this many ratings a user gets content-only picks; item-item predictions from
+# one or two ratings are mostly noise.
+MIN_CF_RATINGS = 3
+# The collaborative weight grows as n / (n + CF_HALF_WEIGHT_RATINGS), capped at MAX_CF_WEIGHT.
+CF_HALF_WEIGHT_RATINGS = 20
+MAX_CF_WEIGHT = 0.7
+
+
+def cf_weight(n_ratings: int) -> float:
+    """Share of the blended score given to the collaborative signal for a user with n_ratings."""
+    if n_ratings < MIN_CF_RATINGS:
+        return 0.0
+    return MAX_CF_WEIGHT * n_ratings / (n_ratings + CF_HALF_WEIGHT_RATINGS)
+
+
+def _normalized(values: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    """Min-max scale values[valid] to [0, 1]; invalid entries and constant inputs give 0 / 1."""
+    out = np.zeros(len(values), dtype=np.float32)
+    if valid.any():
+        low, high = values[valid].min(), values[valid].max()
+        out[valid] = (values[valid] - low) / (high - low) if high > low else 1.0
+    return out
+
+
+def _best(positions: np.ndarray, scores: np.ndarray, n: int) -> np.ndarray:
+    """Up to n positions with the highest scores, unordered."""
+    if len(positions) > n:
+        positions = positions[np.argpartition(-scores, n)[:n]]
+    return positions
+
+
+def hybrid_scores(content: np.ndarray, predicted: np.ndarray, support: np.ndarray, weight: float) -> np.ndarray:
+    """Blended scores of a candidate set from its content scores and CF predictions.
+
+    Both signals are scaled to [0, 1] over the candidates. A candidate without CF
+    support (a movie nobody who rated the user's movies has rated) keeps its content
+    score alone, so new movies aren't penalised for having no ratings.
+    """
+    has_cf = support > 0
+    content_part = _normalized(content, np.isfinite(content))
+    cf_part = _normalized(predicted, has_cf)
+    weights = np.where(has_cf, weight, 0.0).astype(np.float32)
+    return (1 - weights) * content_part + weights * cf_part
+
+
+def hybrid_recommend(vectors, profile_vector: np.ndarray, ratings: Mapping[int, float],
+                     cf: Optional[ItemItemCF], k: int = 10, exclude: Iterable[int] = (),
+                     candidates_per_source: int = CANDIDATES_PER_SOURCE) -> Tuple[np.ndarray, np.ndarray, float]:
+    """Top-k (positions, blended scores) for a user, plus the CF weight used.
+
+    Content scores come from one sparse mat-vec with the user's TF-IDF profile and
+    CF predictions from the user's rated movies' neighbour lists. The best
+    candidates of each source are pooled and scored together in one pass. New
+    users (fewer than MIN_CF_RATINGS ratings) or no CF model give content-only
+    results. Rated movies and exclude (e.g. the watchlist) are skipped.
+    """
+    content = np.asarray(vectors.dot(profile_vector), dtype=np.float32).ravel()
+    skip = list(ratings) + [int(pos) for pos in exclude]
+    if skip:
+        content[skip] = -np.inf
+    weight = cf_weight(len(ratings)) if cf is not None else 0.0
+    if weight == 0.0:
+        if not profile_vector.any():
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), 0.0
+        indices, values = top_k_rows(content.reshape(1, -1), k)
+        keep = indices[0] >= 0
+        return indices[0][keep], values[0][keep], 0.0
+
+    predicted, support = cf.predict(ratings)
+    predicted[skip], support[skip] = -np.inf, 0.0
+    # Pools only need membership; the blend below orders them. Only movies near the
+    # user's rated ones have CF support, so rank those rather than the whole catalog.
+    supported = np.flatnonzero(support > 0)
+    pools = [_best(supported, predicted[supported], candidates_per_source)]
+    if profile_vector.any():
+        pools.append(_best(np.arange(len(content)), content, candidates_per_source))
+    candidates = np.unique(np.concatenate(pools))
+    candidates = candidates[np.isfinite(content[candidates])]
+    if len(candidates) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), weight
+    scores = hybrid_scores(content[candidates], predicted[candidates], support[candidates], weight)
+    order = np.lexsort((candidates, -scores))[:k]
+    return candidates[order], scores[order], weight
@@ -0,0 +1,130 @@
+# load_test.py - Closed-loop load test for api_server.py (latency percentiles and throughput)
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+from typing import Dict, List
+from urllib.parse import quote, urlsplit
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def fetch_json(conn: http.client.HTTPConnection, path: str) -> Dict:
+    conn.request('GET', path)
+    response = conn.getresponse()
+    body = response.read()
+    if response.status != 200:
+        raise RuntimeError(f"{path} -> HTTP {response.status}: {body[:200]!r}")
+    return json.loads(body)
+
+
+def build_paths(host: str, port: int, endpoint: str, count: int, seed: int) -> List[str]:
+    """Request paths for the chosen endpoint mix, seeded from the service's own catalog."""
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    sample = fetch_json(conn, '/filter?limit=100&sort=Popularity')['results']
+    conn.close()
+    if not sample:
+        raise SystemExit("The service returned no movies to seed the load test with.")
+    rng = random.Random(seed)
+    ids = [movie['id'] for movie in sample]
+    titles = [movie['title'] for movie in sample]
+    genres = sorted({g for movie in sample for g in (movie.get('genres') or [])})
+    makers = {
+        'recommend': lambda: f"/recommend?id={rng.choice(ids)}&k={rng.choice([5, 10, 20])}",
+        'search': lambda: f"/search?q={quote(rng.choice(titles)[:rng.randint(3, 8)])}&limit=10",
+        'filter': lambda: (f"/filter?genres={quote(rng.choice(genres))}&min_rating={rng.choice([0, 5, 7])}"
+                           f"&sort=Rating&limit=20") if genres else "/filter?limit=20",
+    }
+    kinds = list(makers) if endpoint == 'mix' else [endpoint]
+    return [makers[rng.choice(kinds)]() for _ in range(count)]
+
+
+def run(url: str, endpoint: str, concurrency: int, requests: int, warmup: int, seed: int) -> Dict:
+    parts = urlsplit(url)
+    host, port = parts.hostname or 'localhost', parts.port or 80
+    paths = build_paths(host, port, endpoint, requests + warmup, seed)
+    latencies: List[float] = []
+    errors: List[str] = []
+    lock = threading.Lock()
+    cursor = iter(range(len(paths)))
+
+    def worker():
+        conn = http.client.HTTPConnection(host, port, timeout=30)
+        while True:
+            with lock:
+                i = next(cursor, None)
+            if i is None:
+                break
+            started = time.perf_counter()
+            try:
+                fetch_json(conn, paths[i])
+            except Exception as e:
+                conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=30)
+                with lock:
+                    errors.append(str(e))
+                continue
+            elapsed = time.perf_counter() - started
+            if i >= warmup:
+                with lock:
+                    latencies.append(elapsed)
+        conn.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    ms = [v * 1000 for v in latencies]
+    return {
+        'url': url,
+        'endpoint': endpoint,
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'wall_seconds': round(wall, 3),
+        'rps': round(len(latencies) / wall, 1) if wall else 0.0,
+        'p50_ms': round(percentile(ms, 50), 3),
+        'p90_ms': round(percentile(ms, 90), 3),
+        'p99_ms': round(percentile(ms, 99), 3),
+        'max_ms': round(ms[-1], 3) if ms else 0.0,
+        'sample_errors': errors[:5],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the PopcornPicks JSON service")
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--endpoint', choices=['recommend', 'search', 'filter', 'mix'], default='mix')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--warmup', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help="Also write the results to this file")
+    args = parser.parse_args()
+
+    results = run(args.url, args.endpoint, args.concurrency, args.requests, args.warmup, args.seed)
+    print(f"{results['requests']:,} requests ({results['errors']} errors) in {results['wall_seconds']}s "
+          f"with {results['concurrency']} clients")
+    print(f"  throughput: {results['rps']:,} req/s")
+    print(f"  latency:    p50 {results['p50_ms']} ms | p90 {results['p90_ms']} ms | "
+          f"p99 {results['p99_ms']} ms | max {results['max_ms']} ms")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
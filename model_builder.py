@@ -1,5 +1,6 @@
 # model_builder.py
 import pandas as pd
+import numpy as np
 from sklearn.feature_extraction.text import CountVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 import pickle
@@ -48,6 +49,8 @@ with open(movies_df_filename, 'wb') as f:
 # Save the similarity matrix
 with open(similarity_matrix_filename, 'wb') as f:
     pickle.dump(similarity_matrix, f)
+# Also as .npy, which app.py memory-maps instead of unpickling a private copy per process
+np.save('tmdb_similarity.npy', similarity_matrix)
 
 print("\nModel building complete!")
 print("The application is now ready for the final step: building the UI.")
\ No newline at end of file
@@ -0,0 +1,212 @@
+# model_registry.py - Versioned model bundles with background hot reload
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+import catalog_store
+from recommender import FilterIndex
+from search_index import TitleSearchIndex
+from startup_profile import PROFILE
+
+# Written by data_processing_enhanced.py once every artifact of a refresh is in place
+MANIFEST_FILE = 'model_manifest.json'
+# Seconds between manifest checks by the watcher thread
+POLL_INTERVAL = 10.0
+
+
+def write_manifest(dataset_path: str, manifest_path: str = MANIFEST_FILE) -> Dict:
+    """Publish dataset_path as the current artifact set (atomic rename, so readers never see half a file)."""
+    manifest = {
+        'version': catalog_store.store_key(dataset_path),
+        'dataset': dataset_path,
+        'store': catalog_store.store_directory(dataset_path),
+        'created_at': time.time(),
+    }
+    tmp = f"{manifest_path}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, manifest_path)
+    return manifest
+
+
+def read_manifest(manifest_path: str = MANIFEST_FILE) -> Optional[Dict]:
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class ModelBundle:
+    """One artifact version: catalog, TF-IDF vectors and every index derived from them.
+
+    A bundle is fully built before it is served and never changes afterwards, so a
+    request that picked it up can finish on it while a newer one is swapped in.
+    Per-version objects owned by callers (profile stores, ...) hang off resource()
+    and are finalized by close() when the bundle is retired. List and long-text
+    columns live in `details` (see catalog_store.CatalogDetails), not in `movies`.
+    """
+
+    def __init__(self, version: str, dataset_path: str, movies, vectors, details: catalog_store.CatalogDetails):
+        self.version = version
+        self.dataset_path = dataset_path
+        self.movies = movies
+        self.vectors = vectors
+        self.details = details
+        popularity = movies['popularity'] if 'popularity' in movies.columns else None
+        self.search_index = TitleSearchIndex(movies['title'].astype(str).tolist(), popularity)
+        self.filter_index = FilterIndex.from_catalog(movies, details)
+        self.genre_bitmap: np.ndarray = self.filter_index.genre_bitmap
+        self.position_by_id = {int(movie_id): pos for pos, movie_id in enumerate(movies['id'].tolist())}
+        self.loaded_at = time.time()
+        self._resources: Dict[str, object] = {}
+        self._finalizers: List[Callable[[], None]] = []
+        # Reentrant: resource factories register finalizers while resource() holds it
+        self._lock = threading.RLock()
+
+    @classmethod
+    def load(cls, dataset_path: str) -> "ModelBundle":
+        """Map the catalog store for a dataset file (building it if needed) and derive the indexes."""
+        with PROFILE.phase('artifact_load'):
+            movies, vectors, details = catalog_store.load_store(dataset_path)
+        with PROFILE.phase('index_warm'):
+            return cls(catalog_store.store_key(dataset_path), dataset_path, movies, vectors, details)
+
+    def resource(self, name: str, factory: Callable[["ModelBundle"], object]) -> object:
+        """Per-version object created once by factory(bundle)."""
+        with self._lock:
+            if name not in self._resources:
+                self._resources[name] = factory(self)
+            return self._resources[name]
+
+    def add_finalizer(self, finalizer: Callable[[], None]):
+        """Run finalizer when the bundle is retired (e.g. to unregister a listener)."""
+        with self._lock:
+            self._finalizers.append(finalizer)
+
+    def close(self):
+        """Run finalizers and drop resources; memory is freed once in-flight requests let go."""
+        with self._lock:
+            finalizers, self._finalizers = self._finalizers, []
+            self._resources.clear()
+        for finalizer in finalizers:
+            finalizer()
+
+
+class ModelRegistry:
+    """The bundle new requests are served from, hot-reloaded when the manifest changes.
+
+    A watcher thread polls MANIFEST_FILE; a new version is loaded in the background
+    and swapped in with one reference assignment. Requests read `current` once and
+    keep that bundle for their whole run, so nothing ever sees a mix of versions.
+    """
+
+    def __init__(self, manifest_path: str = MANIFEST_FILE, poll_interval: float = POLL_INTERVAL,
+                 loader: Callable[[str], ModelBundle] = ModelBundle.load):
+        self.manifest_path = manifest_path
+        self.poll_interval = poll_interval
+        self.loader = loader
+        self.current: Optional[ModelBundle] = None
+        self.swaps = 0
+        self.last_error: Optional[str] = None
+        self._reloading: Optional[str] = None
+        # Last manifest version acted on (a dataset rewritten after its manifest loads
+        # under a different store key, which must not retrigger the same reload)
+        self._manifest_version: Optional[str] = None
+        self._listeners: List[Callable[[Optional[ModelBundle], ModelBundle], None]] = []
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def add_swap_listener(self, listener: Callable[[Optional[ModelBundle], ModelBundle], None]):
+        """Call listener(old, new) after each swap."""
+        self._listeners.append(listener)
+
+    def load(self, dataset_path: str) -> ModelBundle:
+        """Blocking first load; concurrent callers wait for one load instead of each doing it."""
+        with self._load_lock:
+            if self.current is None:
+                manifest = read_manifest(self.manifest_path)
+                self._install(self.loader(dataset_path))
+                if manifest and manifest.get('dataset') == dataset_path:
+                    self._manifest_version = manifest.get('version')
+            return self.current
+
+    def check(self) -> bool:
+        """Start a background reload if the manifest names a version that isn't being served.
+
+        Returns True when a reload was started.
+        """
+        manifest = read_manifest(self.manifest_path)
+        if not manifest or not os.path.exists(manifest.get('dataset', '')):
+            return False
+        version = manifest.get('version')
+        with self._lock:
+            current = self.current.version if self.current is not None else None
+            if version in (current, self._manifest_version) or self._reloading is not None:
+                return False
+            self._reloading = self._manifest_version = version
+        threading.Thread(target=self._reload, args=(manifest['dataset'],), name='model-reload', daemon=True).start()
+        return True
+
+    def watch(self):
+        """Start the manifest watcher thread (idempotent)."""
+        with self._lock:
+            if self._watcher is not None:
+                return
+            self._watcher = threading.Thread(target=self._watch, name='model-watcher', daemon=True)
+            self._watcher.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def status(self) -> Dict:
+        with self._lock:
+            current = self.current
+            return {
+                'version': current.version if current is not None else None,
+                'dataset': current.dataset_path if current is not None else None,
+                'loaded_at': current.loaded_at if current is not None else None,
+                'reloading': self._reloading,
+                'swaps': self.swaps,
+                'last_error': self.last_error,
+            }
+
+    # --- Internals ---
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.check()
+            except Exception as e:
+                self.last_error = str(e)
+
+    def _reload(self, dataset_path: str):
+        try:
+            bundle = self.loader(dataset_path)
+        except Exception as e:
+            # Keep serving the current version; the next manifest change retries
+            with self._lock:
+                self.last_error = f"Reload of {dataset_path} failed: {e}"
+                self._reloading = None
+            return
+        self._install(bundle)
+        with self._lock:
+            self._reloading = None
+        # Stores older than the one just replaced are no longer mapped by anyone new
+        catalog_store.prune_stores(keep=2)
+
+    def _install(self, bundle: ModelBundle):
+        with self._lock:
+            old, self.current = self.current, bundle
+            if old is not None:
+                self.swaps += 1
+            self.last_error = None
+        for listener in self._listeners:
+            listener(old, bundle)
+        if old is not None:
+            old.close()
@@ -0,0 +1,136 @@
+# personalization.py - Personalized recommendations from a user's ratings
+import threading
+from collections import OrderedDict
+import numpy as np
+from typing import Dict, Iterable, Mapping, NamedTuple, Optional, Tuple
+
+from recommender import top_k_rows
+
+# Ratings above the midpoint pull the profile towards a movie, ratings below push it away.
+RATING_MIDPOINT = 5.5
+# Profiles kept per process (each is one float32 per TF-IDF feature); least recently used go first
+MAX_PROFILES = 1024
+
+
+def rating_weight(rating: Optional[float]) -> float:
+    """Contribution of one rating to the profile (0 for unrated)."""
+    return 0.0 if rating is None else float(rating) - RATING_MIDPOINT
+
+
+class ProfileState(NamedTuple):
+    """One published version of a profile: never mutated once readers can see it."""
+    vector: np.ndarray
+    ratings: Dict[int, float]
+
+
+class UserProfile:
+    """A user's taste vector: the rating-weighted sum of their rated movies' TF-IDF rows.
+
+    The vector is kept dense (one float32 per TF-IDF feature) so a new or changed
+    rating is applied by adding one sparse row, never by replaying the history.
+    Updates build a new ProfileState and publish it with a single assignment, so a
+    reader that takes `state` once always sees a vector and ratings that belong
+    together, without taking a lock. `vector` and `ratings` are shortcuts for
+    callers that need only one of them.
+    """
+
+    def __init__(self, n_features: int):
+        self.state = ProfileState(np.zeros(n_features, dtype=np.float32), {})
+
+    @property
+    def vector(self) -> np.ndarray:
+        return self.state.vector
+
+    @property
+    def ratings(self) -> Dict[int, float]:
+        return self.state.ratings
+
+    @classmethod
+    def from_ratings(cls, vectors, ratings: Mapping[int, float]) -> "UserProfile":
+        """Build a profile from {row position: rating} in one sparse product."""
+        profile = cls(vectors.shape[1])
+        if ratings:
+            positions = np.fromiter(ratings.keys(), dtype=np.int64, count=len(ratings))
+            weights = np.array([rating_weight(r) for r in ratings.values()], dtype=np.float32)
+            profile.state = ProfileState(np.asarray(vectors[positions].T.dot(weights), dtype=np.float32).ravel(),
+                                         {int(pos): float(r) for pos, r in ratings.items()})
+        return profile
+
+    def update(self, vectors, pos: int, rating: Optional[float]):
+        """Apply a new, changed (or with rating=None, removed) rating for one movie."""
+        state = self.state
+        delta = rating_weight(rating) - rating_weight(state.ratings.get(pos))
+        ratings = dict(state.ratings)
+        if rating is None:
+            ratings.pop(pos, None)
+        else:
+            ratings[pos] = float(rating)
+        vector = state.vector
+        if delta:
+            row = vectors[pos]
+            vector = vector.copy()
+            vector[row.indices] += delta * row.data
+        self.state = ProfileState(vector, ratings)
+
+    def recommend(self, vectors, k: int = 10, exclude: Iterable[int] = ()) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (positions, scores) for the whole catalog in one sparse mat-vec.
+
+        Rated movies and anything in exclude (e.g. the watchlist) are skipped. Returns
+        empty arrays when the profile carries no signal yet.
+        """
+        vector, ratings = self.state
+        if not vector.any():
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        scores = np.asarray(vectors.dot(vector), dtype=np.float32).reshape(1, -1)
+        skip = list(ratings) + [int(pos) for pos in exclude]
+        if skip:
+            scores[0, skip] = -np.inf
+        indices, values = top_k_rows(scores, k)
+        keep = indices[0] >= 0
+        return indices[0][keep], values[0][keep]
+
+
+class ProfileStore:
+    """Process-wide user profiles for one model version, kept current by rating events.
+
+    A profile is built from the user's full rating history the first time it is
+    requested; after that on_rating() applies each saved rating incrementally. Ratings
+    saved by other worker processes never reach on_rating(), so get() rebuilds a profile
+    whose ratings no longer match the stored ones. At most max_profiles are kept (LRU).
+    """
+
+    def __init__(self, vectors, position_by_id: Mapping[int, int], max_profiles: int = MAX_PROFILES):
+        self.vectors = vectors
+        self.position_by_id = position_by_id
+        self.max_profiles = max_profiles
+        self._profiles: "OrderedDict[str, UserProfile]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.rebuilds = 0
+
+    def get(self, user_id: str, ratings: Mapping[str, Dict]) -> UserProfile:
+        """Profile for user_id, (re)built from UserManager-style ratings when they changed elsewhere."""
+        by_position = {}
+        for movie_id, rating_data in ratings.items():
+            pos = self.position_by_id.get(int(movie_id))
+            if pos is not None:
+                by_position[pos] = float(rating_data['rating'])
+        with self._lock:
+            profile = self._profiles.get(user_id)
+            if profile is not None and profile.ratings == by_position:
+                self._profiles.move_to_end(user_id)
+                return profile
+            if profile is not None:
+                self.rebuilds += 1
+            profile = self._profiles[user_id] = UserProfile.from_ratings(self.vectors, by_position)
+            self._profiles.move_to_end(user_id)
+            while len(self._profiles) > self.max_profiles:
+                self._profiles.popitem(last=False)
+            return profile
+
+    def on_rating(self, user_id: str, movie_id: int, rating: Optional[float]):
+        """Rating listener: update an already-built profile."""
+        pos = self.position_by_id.get(int(movie_id))
+        with self._lock:
+            profile = self._profiles.get(user_id)
+            if profile is not None and pos is not None:
+                profile.update(self.vectors, pos, rating)
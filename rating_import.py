@@ -0,0 +1,184 @@
+# rating_import.py - Bulk import of rating histories exported from other services (CSV: title, year, rating)
+import csv
+import io
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from user_store import rating_op
+
+# Fuzzy matches below this score are reported as unmatched
+MIN_SCORE = 75
+# Matches below this score, or whose year is off by more than YEAR_TOLERANCE, are reported as low confidence
+CONFIDENT_SCORE = 90
+YEAR_TOLERANCE = 1
+# Titles scoring within this many points of a row's best are told apart by release year
+YEAR_TIE_MARGIN = 3
+# Query x catalog scores computed per cdist call; bounds memory for large imports or catalogs
+MAX_CELLS = 20_000_000
+# Ratings on a 0.5-5 scale (e.g. star ratings) are doubled onto the app's 1-10 scale
+FIVE_POINT_MAX = 5.0
+
+TITLE_COLUMNS = ('title', 'name', 'movie', 'film')
+YEAR_COLUMNS = ('year', 'release_year', 'released')
+RATING_COLUMNS = ('rating', 'score', 'stars', 'your rating')
+# "Godfather, The" as exported by some services
+_TRAILING_ARTICLE = re.compile(r'^(.*),\s*(the|a|an)$', re.IGNORECASE)
+
+
+class ImportRow(NamedTuple):
+    line: int
+    title: str
+    year: Optional[int]
+    rating: float
+
+
+class TitleMatch(NamedTuple):
+    row: ImportRow
+    position: Optional[int]
+    score: float
+    confident: bool
+
+
+def parse_ratings_csv(source) -> Tuple[List[ImportRow], List[str]]:
+    """Rows of a (title, year, rating) CSV given as text, bytes or a file; returns (rows, problems).
+
+    A header naming the columns (title/name, year, rating/score...) is used when
+    present; otherwise the first three columns are taken in that order.
+    """
+    if isinstance(source, bytes):
+        source = source.decode('utf-8-sig')
+    text = source if isinstance(source, str) else source.read()
+    if isinstance(text, bytes):
+        text = text.decode('utf-8-sig')
+    records = [record for record in csv.reader(io.StringIO(text)) if any(cell.strip() for cell in record)]
+    if not records:
+        return [], []
+
+    header = [cell.strip().lower() for cell in records[0]]
+    def column(names: Sequence[str], default: int) -> Optional[int]:
+        return next((header.index(name) for name in names if name in header), default)
+    if any(name in header for name in TITLE_COLUMNS):
+        title_col = column(TITLE_COLUMNS, 0)
+        year_col = column(YEAR_COLUMNS, None)
+        rating_col = column(RATING_COLUMNS, None)
+        first = 1
+    else:
+        title_col, year_col, rating_col, first = 0, 1, 2, 0
+    if rating_col is None:
+        return [], ["No rating column found (expected a header like: title, year, rating)."]
+
+    rows, problems = [], []
+    for line, record in enumerate(records[first:], start=first + 1):
+        try:
+            title = record[title_col].strip()
+            rating = float(record[rating_col])
+        except (IndexError, ValueError):
+            problems.append(f"Line {line}: expected a title and a numeric rating")
+            continue
+        year = None
+        if year_col is not None and year_col < len(record):
+            digits = re.search(r'\d{4}', record[year_col])
+            year = int(digits.group()) if digits else None
+        if title:
+            rows.append(ImportRow(line, title, year, rating))
+    return rows, problems
+
+
+def rating_scale(rows: Sequence[ImportRow]) -> float:
+    """Factor onto the 1-10 scale: 2 if every rating is on a 5-point scale, else 1."""
+    return 2.0 if rows and max(row.rating for row in rows) <= FIVE_POINT_MAX else 1.0
+
+
+class TitleMatcher:
+    """Matches exported titles to catalog rows against the search index's normalized titles.
+
+    Titles equal to a catalog title after normalization are looked up in a dict.
+    The rest are scored against every catalog title in one batched rapidfuzz cdist
+    (chunked to MAX_CELLS scores). Among titles within YEAR_TIE_MARGIN points of a
+    row's best, the one whose release year is closest wins, so remakes and
+    same-named films resolve by year.
+    """
+
+    def __init__(self, normalized: Sequence[str], years: np.ndarray, workers: int = -1):
+        self.normalized = list(normalized)
+        self.years = np.asarray(years, dtype=np.float64)
+        self.workers = workers
+        self._exact: Dict[str, List[int]] = {}
+        for pos, title in enumerate(self.normalized):
+            self._exact.setdefault(title, []).append(pos)
+
+    @staticmethod
+    def normalize(title: str) -> str:
+        from rapidfuzz import utils
+        moved = _TRAILING_ARTICLE.match(title.strip())
+        if moved:
+            title = f"{moved.group(2)} {moved.group(1)}"
+        return utils.default_process(title)
+
+    def _year_gap(self, positions: np.ndarray, year: Optional[int]) -> np.ndarray:
+        if year is None:
+            return np.zeros(len(positions))
+        gap = np.abs(self.years[positions] - year)
+        return np.where(np.isnan(gap), YEAR_TOLERANCE + 1, gap)
+
+    def _result(self, row: ImportRow, position: Optional[int], score: float) -> TitleMatch:
+        if position is None:
+            return TitleMatch(row, None, score, False)
+        gap = self._year_gap(np.array([position]), row.year)[0]
+        return TitleMatch(row, position, score, bool(score >= CONFIDENT_SCORE and gap <= YEAR_TOLERANCE))
+
+    def match(self, rows: Sequence[ImportRow]) -> List[TitleMatch]:
+        """One TitleMatch per row, in order; position None when nothing scored MIN_SCORE."""
+        from rapidfuzz import fuzz, process
+
+        queries = [self.normalize(row.title) for row in rows]
+        results: List[Optional[TitleMatch]] = [None] * len(rows)
+        fuzzy = []
+        for i, (row, query) in enumerate(zip(rows, queries)):
+            exact = self._exact.get(query)
+            if exact:
+                positions = np.array(exact)
+                best = positions[np.argmin(self._year_gap(positions, row.year))]
+                results[i] = self._result(row, int(best), 100.0)
+            else:
+                fuzzy.append(i)
+
+        if fuzzy and self.normalized:
+            chunk = max(1, MAX_CELLS // len(self.normalized))
+            for start in range(0, len(fuzzy), chunk):
+                batch = fuzzy[start:start + chunk]
+                scores = process.cdist([queries[i] for i in batch], self.normalized, scorer=fuzz.ratio,
+                                       processor=None, score_cutoff=MIN_SCORE, dtype=np.uint8,
+                                       workers=self.workers)
+                best = scores.max(axis=1).astype(np.int16)
+                near_rows, near_cols = np.nonzero((scores.astype(np.int16) >= (best - YEAR_TIE_MARGIN)[:, None])
+                                                  & (best > 0)[:, None])
+                years = np.array([np.nan if rows[i].year is None else rows[i].year for i in batch])
+                # Rows without a year don't prefer any candidate; candidates without one come last
+                gaps = np.nan_to_num(np.abs(self.years[near_cols] - years[near_rows]), nan=np.inf)
+                gaps[np.isnan(years[near_rows])] = 0
+                # Per row: closest year first, then highest score, then catalog order
+                order = np.lexsort((near_cols, -scores[near_rows, near_cols].astype(np.int16), gaps, near_rows))
+                near_rows, near_cols = near_rows[order], near_cols[order]
+                first = np.flatnonzero(np.r_[True, near_rows[1:] != near_rows[:-1]]) if len(near_rows) else []
+                chosen = {int(near_rows[f]): int(near_cols[f]) for f in first}
+                for j, i in enumerate(batch):
+                    position = chosen.get(j)
+                    results[i] = self._result(rows[i], position, float(scores[j, position]) if position is not None
+                                              else 0.0)
+        return [result if result is not None else TitleMatch(rows[i], None, 0.0, False)
+                for i, result in enumerate(results)]
+
+
+def import_ops(user_id: str, matches: Iterable[TitleMatch], movie_ids: np.ndarray, scale: float = 1.0,
+               timestamp: Optional[float] = None) -> List[Tuple]:
+    """Rating ops for the matched rows (later rows win when two match the same movie), clamped to 1-10."""
+    ops: Dict[int, Tuple] = {}
+    for match in matches:
+        if match.position is not None:
+            movie_id = int(movie_ids[match.position])
+            rating = min(max(round(match.row.rating * scale * 2) / 2, 1.0), 10.0)
+            ops[movie_id] = rating_op(user_id, movie_id, rating, timestamp)
+    return list(ops.values())
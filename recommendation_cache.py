@@ -0,0 +1,122 @@
+# recommendation_cache.py - Process-wide LRU cache of recommendation results
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class _Pending:
+    """A computation in flight; waiters block on the event and share its result."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class RecommendationCache:
+    """Bounded, thread-safe LRU cache shared by every session in the process.
+
+    Entries are keyed by (model version, key), so a new version never sees an old
+    version's results; nothing is dropped when the version changes, the old entries
+    just stop being used and age out of the LRU. Concurrent misses on the same key are coalesced: the first caller
+    computes, the others wait for its result instead of recomputing.
+    """
+
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        # The most recently seen version, for stats
+        self.model_version: Optional[str] = None
+        self._entries: "OrderedDict[Tuple[str, Hashable], Any]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, Hashable], _Pending] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+        # Model version changes seen (the old entries age out rather than being dropped)
+        self.invalidations = 0
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any], model_version: str) -> Any:
+        """Return the cached value for key, computing it at most once per model version."""
+        entry_key = (model_version, key)
+        with self._lock:
+            if model_version != self.model_version:
+                if self.model_version is not None:
+                    self.invalidations += 1
+                self.model_version = model_version
+            if entry_key in self._entries:
+                self._entries.move_to_end(entry_key)
+                self.hits += 1
+                return self._entries[entry_key]
+            pending = self._inflight.get(entry_key)
+            owner = pending is None
+            if owner:
+                pending = self._inflight[entry_key] = _Pending()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not owner:
+            pending.event.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.value
+
+        try:
+            value = compute()
+        except BaseException as e:
+            pending.error = e
+            with self._lock:
+                self._inflight.pop(entry_key, None)
+            pending.event.set()
+            raise
+
+        with self._lock:
+            self._inflight.pop(entry_key, None)
+            self._entries[entry_key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        pending.value = value
+        pending.event.set()
+        return value
+
+    def peek(self, key: Hashable, model_version: str) -> Optional[Any]:
+        """Cached value for key under model_version, or None. Only hits are counted."""
+        entry_key = (model_version, key)
+        with self._lock:
+            if entry_key not in self._entries:
+                return None
+            self._entries.move_to_end(entry_key)
+            self.hits += 1
+            return self._entries[entry_key]
+
+    def clear(self):
+        """Drop all entries (counters are kept)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit, miss, eviction and coalescing counters plus current size."""
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                'model_version': self.model_version,
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'hit_rate': (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            }
+
+
+def model_fingerprint(vectors) -> str:
+    """Cheap version string for a sparse TF-IDF matrix (shape, nnz and a sampled checksum)."""
+    step = max(1, vectors.nnz // 4096)
+    checksum = zlib.crc32(vectors.data[::step].tobytes())
+    checksum = zlib.crc32(vectors.indptr[::max(1, len(vectors.indptr) // 4096)].tobytes(), checksum)
+    return f"{vectors.shape[0]}x{vectors.shape[1]}-{vectors.nnz}-{checksum:08x}"
@@ -0,0 +1,329 @@
+# recommender.py - Batched content-based scoring over the TF-IDF vectors
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from typing import List, Optional, Sequence, Tuple
+
+# MMR trade-off: 1.0 ranks purely by similarity to the seed, lower values favour variety.
+DEFAULT_MMR_LAMBDA = 0.7
+# Share of candidate-to-candidate redundancy that comes from genre overlap (rest: content).
+GENRE_REDUNDANCY_WEIGHT = 0.3
+# Seeds scored per sparse product; bounds the dense score block to block_size x n_movies.
+DEFAULT_BLOCK_SIZE = 256
+# Filtered queries score only the qualifying rows when they are at most this share of the catalog.
+SUBSET_SCAN_SHARE = 0.25
+
+
+def top_k_rows(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Top-k columns of each row, best score first, ties broken by lower column index.
+
+    The tie-break is explicit so a row's result doesn't depend on which other rows
+    share its block. Slots without a finite score are padded with -1 / -inf.
+    """
+    n_rows, n_cols = scores.shape
+    k_eff = min(k, n_cols)
+    indices = np.full((n_rows, k), -1, dtype=np.int64)
+    values = np.full((n_rows, k), -np.inf, dtype=np.float32)
+    if k_eff == 0 or n_rows == 0:
+        return indices, values
+
+    cols = np.argpartition(scores, n_cols - k_eff, axis=1)[:, n_cols - k_eff:]
+    vals = np.take_along_axis(scores, cols, axis=1)
+    # argpartition picks arbitrarily among scores tied with the kth one; redo those rows exactly
+    kth = vals.min(axis=1, keepdims=True)
+    ambiguous = np.flatnonzero((scores == kth).sum(axis=1) != (vals == kth).sum(axis=1))
+    for row in ambiguous:
+        row_scores = scores[row]
+        above = np.flatnonzero(row_scores > kth[row])
+        tied = np.flatnonzero(row_scores == kth[row])[:k_eff - len(above)]
+        cols[row] = np.concatenate([above, tied])
+        vals[row] = row_scores[cols[row]]
+
+    # Sort by column, then stably by descending score: score order with index tie-break
+    order = np.argsort(cols, axis=1, kind='stable')
+    cols = np.take_along_axis(cols, order, axis=1)
+    vals = np.take_along_axis(vals, order, axis=1)
+    order = np.argsort(-vals, axis=1, kind='stable')
+    cols = np.take_along_axis(cols, order, axis=1)
+    vals = np.take_along_axis(vals, order, axis=1)
+    cols[~np.isfinite(vals)] = -1
+    indices[:, :k_eff] = cols
+    values[:, :k_eff] = vals
+    return indices, values
+
+
+def recommend_batch(vectors, seeds: Sequence[int], k: int = 10, weights: Optional[Sequence[float]] = None,
+                    aggregate: bool = False, exclude_seeds: bool = True,
+                    block_size: int = DEFAULT_BLOCK_SIZE, workers: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+    """Nearest neighbours for many seed movies with sparse matrix-matrix products.
+
+    vectors is the L2-normalized TF-IDF matrix from build_models, so dot products are
+    cosine similarities (the same metric as the brute-force cosine KNN). Scoring is
+    done in float32; build_models already produces float32 vectors.
+
+    Per-seed mode returns (indices, scores) of shape (len(seeds), k); each row excludes
+    its own seed. With aggregate=True the seeds' similarity rows are combined with the
+    optional weights into one ranking of shape (k,), excluding every seed. Missing
+    results are padded with index -1.
+
+    Seed blocks are independent, so workers > 1 (or -1 for all cores) scores them on a
+    thread pool; scipy's sparse kernels release the GIL.
+    """
+    seeds = np.asarray(seeds, dtype=np.int64)
+    vectors = vectors.astype(np.float32, copy=False)
+    n_movies = vectors.shape[0]
+    if weights is None:
+        weights = np.ones(len(seeds), dtype=np.float32)
+    else:
+        weights = np.asarray(weights, dtype=np.float32)
+        if weights.shape != seeds.shape:
+            raise ValueError("weights must have one entry per seed")
+
+    if aggregate:
+        profile = vectors[seeds].T.dot(weights).reshape(-1, 1)
+        scores = np.asarray(vectors.dot(profile), dtype=np.float32).reshape(1, n_movies)
+        if exclude_seeds:
+            scores[0, seeds] = -np.inf
+        indices, values = top_k_rows(scores, k)
+        return indices[0], values[0]
+
+    indices = np.full((len(seeds), k), -1, dtype=np.int64)
+    values = np.full((len(seeds), k), -np.inf, dtype=np.float32)
+
+    def score_block(start: int):
+        block = seeds[start:start + block_size]
+        # CSR x dense is much faster than sparse x sparse here: similarity rows are nearly dense
+        queries = vectors[block].T.toarray() * weights[start:start + block_size]
+        scores = np.ascontiguousarray(vectors.dot(queries).T)
+        if exclude_seeds:
+            scores[np.arange(len(block)), block] = -np.inf
+        indices[start:start + len(block)], values[start:start + len(block)] = top_k_rows(scores, k)
+
+    starts = range(0, len(seeds), block_size)
+    if workers == -1:
+        workers = os.cpu_count() or 1
+    if workers > 1 and len(starts) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(score_block, starts))
+    else:
+        for start in starts:
+            score_block(start)
+    return indices, values
+
+
+def top_k_neighbors(vectors, movie_idx: int, k: int) -> np.ndarray:
+    """Single-seed convenience wrapper: positions of the k most similar movies, best first."""
+    indices, _ = recommend_batch(vectors, [movie_idx], k)
+    return indices[0][indices[0] >= 0]
+
+
+def diversity_settings(mmr_lambda: float = DEFAULT_MMR_LAMBDA) -> Tuple:
+    """Diversity strategy and parameters; part of every recommendation cache key."""
+    return ("mmr", round(float(mmr_lambda), 2), GENRE_REDUNDANCY_WEIGHT)
+
+
+def build_list_bitmap(movies_df, column: str) -> Tuple[np.ndarray, List[str]]:
+    """Boolean movies x values matrix (and its column names) from a list column such as genres."""
+    value_lists = [v if isinstance(v, list) else [] for v in movies_df[column].tolist()]
+    names = sorted({value for values in value_lists for value in values})
+    position = {name: j for j, name in enumerate(names)}
+    rows = np.repeat(np.arange(len(value_lists)), [len(v) for v in value_lists])
+    cols = np.fromiter((position[value] for values in value_lists for value in values), dtype=np.int64, count=len(rows))
+    bitmap = np.zeros((len(value_lists), len(names)), dtype=bool)
+    bitmap[rows, cols] = True
+    return bitmap, names
+
+
+def recommendation_filters(genres: Sequence[str] = (), year_range: Optional[Tuple[int, int]] = None,
+                           min_rating: float = 0.0, providers: Sequence[str] = (),
+                           languages: Sequence[str] = ()) -> Optional[Tuple]:
+    """Canonical, hashable form of metadata filters, or None when none is set.
+
+    Genres, providers and languages each match any of the listed values. The result is
+    what FilterIndex.mask takes and what recommendation cache keys include.
+    """
+    filters = (
+        tuple(sorted(set(genres))),
+        (int(year_range[0]), int(year_range[1])) if year_range is not None else None,
+        float(min_rating),
+        tuple(sorted(set(providers))),
+        tuple(sorted(set(languages))),
+    )
+    return None if filters == ((), None, 0.0, (), ()) else filters
+
+
+class FilterIndex:
+    """Per-row metadata for filtering recommendation candidates, built once per catalog.
+
+    Genres and streaming providers are boolean bitmaps (rows x values), languages are
+    integer codes and release year and rating are plain arrays, so a filter becomes a
+    row mask in a few vector operations. Masks are memoized by their filters.
+    """
+
+    def __init__(self, genre_bitmap: np.ndarray, genre_names: List[str], provider_bitmap: np.ndarray,
+                 provider_names: List[str], language_codes: np.ndarray, language_names: List[str],
+                 years: np.ndarray, ratings: np.ndarray):
+        self.genre_bitmap = genre_bitmap
+        self.genre_names = genre_names
+        self.provider_bitmap = provider_bitmap
+        self.provider_names = provider_names
+        self.language_codes = language_codes
+        self.language_names = language_names
+        self.years = years
+        self.ratings = ratings
+        self.mask = lru_cache(maxsize=256)(self._mask)
+
+    @classmethod
+    def from_catalog(cls, movies_df, details=None) -> "FilterIndex":
+        """Index a catalog frame; list columns come from details (a store's CatalogDetails) when given."""
+        n = len(movies_df)
+        lists = details.lists if details is not None else {}
+        bitmaps = {}
+        for column in ('genres', 'streaming_on'):
+            if column in lists:
+                bitmaps[column] = (lists[column].bitmap(), lists[column].name_list())
+            elif column in movies_df.columns:
+                bitmaps[column] = build_list_bitmap(movies_df, column)
+            else:
+                bitmaps[column] = (np.zeros((n, 0), dtype=bool), [])
+        if 'original_language' in movies_df.columns:
+            codes, names = pd.factorize(movies_df['original_language'], sort=True)
+            language_codes, language_names = codes.astype(np.int32), [str(name) for name in names]
+        else:
+            language_codes, language_names = np.full(n, -1, dtype=np.int32), []
+
+        def numeric(column: str) -> np.ndarray:
+            if column not in movies_df.columns:
+                return np.full(n, np.nan, dtype=np.float32)
+            return pd.to_numeric(movies_df[column], errors='coerce').to_numpy(dtype=np.float32, na_value=np.nan)
+
+        return cls(*bitmaps['genres'], *bitmaps['streaming_on'], language_codes, language_names,
+                   numeric('release_year'), numeric('rating'))
+
+    @staticmethod
+    def _any_of(bitmap: np.ndarray, names: List[str], wanted: Sequence[str]) -> np.ndarray:
+        wanted = set(wanted)
+        columns = [j for j, name in enumerate(names) if name in wanted]
+        return bitmap[:, columns].any(axis=1)
+
+    def _mask(self, filters: Optional[Tuple]) -> Optional[np.ndarray]:
+        """Read-only boolean mask of the rows passing filters (from recommendation_filters); None passes all."""
+        if filters is None:
+            return None
+        genres, year_range, min_rating, providers, languages = filters
+        mask = np.ones(len(self.years), dtype=bool)
+        if genres:
+            mask &= self._any_of(self.genre_bitmap, self.genre_names, genres)
+        if providers:
+            mask &= self._any_of(self.provider_bitmap, self.provider_names, providers)
+        if languages:
+            wanted = set(languages)
+            mask &= np.isin(self.language_codes, [j for j, name in enumerate(self.language_names) if name in wanted])
+        if year_range is not None:
+            mask &= (self.years >= year_range[0]) & (self.years <= year_range[1])
+        if min_rating > 0:
+            mask &= self.ratings >= min_rating
+        mask.setflags(write=False)
+        return mask
+
+
+def filtered_neighbors(vectors, movie_idx: int, k: int, allowed: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Top-k neighbours of one movie among the rows set in the boolean mask allowed.
+
+    The filter is applied inside the scan rather than to a fixed-size neighbour list,
+    so k qualifying movies are found whenever k exist, however selective the filter.
+    The cost is bounded by one product over the catalog: selective filters score only
+    their own rows, broad ones score every row and mask out the rest. Returns
+    (indices, scores) of shape (k,), padded with -1 / -inf like recommend_batch.
+    """
+    vectors = vectors.astype(np.float32, copy=False)
+    query = vectors[[movie_idx]].T.toarray()
+    indices = np.full(k, -1, dtype=np.int64)
+    values = np.full(k, -np.inf, dtype=np.float32)
+    rows = np.flatnonzero(allowed)
+    rows = rows[rows != movie_idx]
+    if len(rows) == 0:
+        return indices, values
+
+    if len(rows) <= SUBSET_SCAN_SHARE * vectors.shape[0]:
+        scores = np.asarray(vectors[rows].dot(query), dtype=np.float32).reshape(1, -1)
+        cols, vals = top_k_rows(scores, k)
+        found = cols[0] >= 0
+        indices[found], values[found] = rows[cols[0][found]], vals[0][found]
+    else:
+        scores = np.asarray(vectors.dot(query), dtype=np.float32).reshape(1, -1)
+        scores[0, ~allowed] = -np.inf
+        scores[0, movie_idx] = -np.inf
+        cols, vals = top_k_rows(scores, k)
+        indices, values = cols[0], vals[0]
+    return indices, values
+
+
+def mmr_rerank(vectors, genre_bitmap: np.ndarray, candidates: Sequence[int], relevance: Sequence[float],
+               num_recommendations: int, mmr_lambda: float = DEFAULT_MMR_LAMBDA) -> np.ndarray:
+    """Maximal marginal relevance over a candidate set.
+
+    Each step picks the candidate maximising
+        lambda * relevance - (1 - lambda) * max redundancy with the already picked ones,
+    where redundancy blends TF-IDF cosine similarity (near-duplicates such as sequels)
+    with genre Jaccard overlap from the precomputed bitmap. All pairwise terms are one
+    small matrix product over the candidates; the greedy loop only updates a vector.
+    """
+    candidates = np.asarray(candidates, dtype=np.int64)
+    relevance = np.asarray(relevance, dtype=np.float32)
+    num = min(num_recommendations, len(candidates))
+    if num == 0:
+        return np.empty(0, dtype=np.int64)
+
+    # Candidate rows gathered straight from the CSR arrays into a dense block over the
+    # features they actually use; avoids sparse-matrix overhead for a ~60 x 60 product.
+    starts, ends = vectors.indptr[candidates], vectors.indptr[candidates + 1]
+    lengths = ends - starts
+    nnz_pos = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+    features, columns = np.unique(vectors.indices[nnz_pos], return_inverse=True)
+    content = np.zeros((len(candidates), len(features)), dtype=np.float32)
+    content[np.repeat(np.arange(len(candidates)), lengths), columns] = vectors.data[nnz_pos]
+    content_sim = content @ content.T
+
+    genres = genre_bitmap[candidates].astype(np.float32)
+    shared = genres @ genres.T
+    sizes = genres.sum(axis=1)
+    union = sizes[:, None] + sizes[None, :] - shared
+    jaccard = np.divide(shared, union, out=np.zeros_like(shared), where=union > 0)
+    redundancy = (1 - GENRE_REDUNDANCY_WEIGHT) * content_sim + GENRE_REDUNDANCY_WEIGHT * jaccard
+
+    base = mmr_lambda * relevance
+    penalty = 1 - mmr_lambda
+    max_redundancy = np.zeros(len(candidates), dtype=np.float32)
+    taken = np.zeros(len(candidates), dtype=bool)
+    picked = np.empty(num, dtype=np.int64)
+    for step in range(num):
+        # Picked candidates are masked after the subtraction: an inf redundancy would
+        # turn into NaN at penalty 0 (lambda = 1) and argmax would return it again
+        score = base - penalty * max_redundancy
+        score[taken] = -np.inf
+        best = int(np.argmax(score))
+        picked[step] = best
+        taken[best] = True
+        np.maximum(max_redundancy, redundancy[best], out=max_redundancy)
+    return candidates[picked]
+
+
+def diverse_recommendations(vectors, genre_bitmap: np.ndarray, movie_idx: int, num_recommendations: int = 5,
+                            mmr_lambda: float = DEFAULT_MMR_LAMBDA, allowed: Optional[np.ndarray] = None) -> np.ndarray:
+    """Row positions of one movie's nearest neighbours, MMR-reranked for diversity.
+
+    allowed (a FilterIndex mask) restricts the neighbour search to the rows it sets.
+    """
+    if allowed is None:
+        indices, scores = recommend_batch(vectors, [movie_idx], num_recommendations * 3)
+        indices, scores = indices[0], scores[0]
+    else:
+        indices, scores = filtered_neighbors(vectors, movie_idx, num_recommendations * 3, allowed)
+    keep = indices >= 0
+    positions = mmr_rerank(vectors, genre_bitmap, indices[keep], scores[keep], num_recommendations, mmr_lambda)
+    positions.setflags(write=False)
+    return positions
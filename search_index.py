@@ -0,0 +1,196 @@
+# search_index.py - Precomputed title search index (prefix + fuzzy) built once at load
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Prefix keys are truncated to this many characters; longer queries narrow by the
+# truncated key and are then ranked with fuzzy scores.
+PREFIX_KEY_LEN = 12
+# Queries up to this length are answered from a precomputed top-N table.
+SHORT_PREFIX_LEN = 2
+# Queries shorter than this never fall back to fuzzy matching.
+MIN_FUZZY_LEN = 3
+# Number of trigram-shortlisted titles that get a full fuzzy score per query.
+FUZZY_CANDIDATES = 256
+# Upper bound on trigram postings read per query; the rarest trigrams are read first.
+MAX_POSTINGS = 200_000
+
+
+def trigrams(text: str) -> set:
+    """Padded character trigrams of an already-normalized string."""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TitleSearchIndex:
+    """Title search service: normalized titles, a word-prefix index and batched fuzzy matching.
+
+    Titles are normalized once with rapidfuzz's default processor. Every word-aligned
+    suffix of a normalized title ("dark knight rises", "knight rises", "rises") is stored
+    in a sorted array so a prefix lookup is a pair of binary searches. Fuzzy matching
+    shortlists titles through a trigram inverted index and scores only that shortlist,
+    so its cost does not grow with the catalog. Results are returned as row positions
+    into the frame the index was built from.
+    """
+
+    def __init__(self, titles: Sequence[str], popularity: Optional[Sequence[float]] = None,
+                 workers: int = -1, cache_size: int = 50):
+        # rapidfuzz is imported where it is used, so importing this module stays free
+        from rapidfuzz import utils
+
+        self.titles = list(titles)
+        self.normalized = [utils.default_process(str(t)) for t in self.titles]
+        self.workers = workers
+        self.cache_size = cache_size
+        n = len(self.titles)
+
+        # Popularity rank (0 = most popular) breaks ties and orders prefix hits
+        if popularity is None:
+            self.rank = np.arange(n, dtype=np.int64)
+        else:
+            order = np.argsort(-np.asarray(popularity, dtype=np.float64), kind='stable')
+            self.rank = np.empty(n, dtype=np.int64)
+            self.rank[order] = np.arange(n)
+        self.by_popularity = np.argsort(self.rank, kind='stable')
+
+        # Word-prefix index: (suffix key, owner) sorted by key, then popularity
+        keys, owners = [], []
+        for pos, title in enumerate(self.normalized):
+            words = title.split()
+            for w in range(len(words)):
+                keys.append(" ".join(words[w:])[:PREFIX_KEY_LEN])
+                owners.append(pos)
+        keys_arr = np.array(keys, dtype=f'U{PREFIX_KEY_LEN}')
+        owners_arr = np.array(owners, dtype=np.int64)
+        order = np.lexsort((self.rank[owners_arr] if n else owners_arr, keys_arr))
+        self._keys = keys_arr[order]
+        self._owners = owners_arr[order]
+
+        # Trigram postings in CSR form: owners of gram g are _gram_owners[_gram_ptr[g]:_gram_ptr[g + 1]]
+        self._gram_ids: Dict[str, int] = {}
+        gram_rows, gram_counts = [], np.zeros(n, dtype=np.int64)
+        for pos, title in enumerate(self.normalized):
+            grams = trigrams(title)
+            gram_counts[pos] = len(grams)
+            gram_rows.extend(self._gram_ids.setdefault(g, len(self._gram_ids)) for g in grams)
+        gram_rows = np.array(gram_rows, dtype=np.int64)
+        order = np.argsort(gram_rows, kind='stable')
+        self._gram_owners = np.repeat(np.arange(n, dtype=np.int32), gram_counts)[order]
+        self._gram_ptr = np.zeros(len(self._gram_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(gram_rows, minlength=len(self._gram_ids)), out=self._gram_ptr[1:])
+        self._gram_counts = gram_counts.astype(np.int32)
+
+        # Short prefixes match huge ranges, so their top hits are computed up front
+        self._short_prefix_top: Dict[str, np.ndarray] = {}
+        for length in range(1, SHORT_PREFIX_LEN + 1):
+            for prefix in np.unique(self._keys.astype(f'U{length}')):
+                if len(prefix) == length:
+                    self._short_prefix_top[prefix] = self._prefix_range_top(prefix, cache_size)
+
+    def __len__(self) -> int:
+        return len(self.titles)
+
+    def _prefix_range_top(self, key: str, limit: int) -> np.ndarray:
+        """Most popular owners whose indexed key starts with key."""
+        # Bounds share the array's dtype; a wider key would make numpy cast the whole array
+        upper = key[:-1] + chr(ord(key[-1]) + 1)
+        lo, hi = np.searchsorted(self._keys, np.array([key, upper], dtype=self._keys.dtype), side='left')
+        if hi <= lo:
+            return np.empty(0, dtype=np.int64)
+        owners = np.unique(self._owners[lo:hi])
+        if len(owners) > limit:
+            ranks = self.rank[owners]
+            owners = owners[np.argpartition(ranks, limit - 1)[:limit]]
+        return owners[np.argsort(self.rank[owners], kind='stable')]
+
+    def prefix_search(self, query: str, limit: int = 10) -> List[int]:
+        """Positions of titles containing a word that starts with the query, most popular first."""
+        from rapidfuzz import utils
+
+        q = utils.default_process(query)
+        if not q:
+            return []
+        if len(q) <= SHORT_PREFIX_LEN and limit <= self.cache_size:
+            return self._short_prefix_top.get(q, np.empty(0, dtype=np.int64))[:limit].tolist()
+        hits = self._prefix_range_top(q[:PREFIX_KEY_LEN], max(limit, 1) * 20)
+        if len(q) > PREFIX_KEY_LEN:
+            hits = [pos for pos in hits.tolist() if f" {q}" in f" {self.normalized[pos]}"]
+        else:
+            hits = hits.tolist()
+        return hits[:limit]
+
+    def candidates(self, query: str, limit: int = FUZZY_CANDIDATES) -> np.ndarray:
+        """Positions sharing the most trigrams with an already-normalized query."""
+        query_grams = trigrams(query)
+        gram_ids = sorted((self._gram_ids[g] for g in query_grams if g in self._gram_ids),
+                          key=lambda g: self._gram_ptr[g + 1] - self._gram_ptr[g])
+        if not gram_ids:
+            return np.empty(0, dtype=np.int64)
+        lists, budget = [], MAX_POSTINGS
+        for g in gram_ids:
+            size = self._gram_ptr[g + 1] - self._gram_ptr[g]
+            if lists and size > budget:
+                break
+            lists.append(self._gram_owners[self._gram_ptr[g]:self._gram_ptr[g + 1]])
+            budget -= size
+        hits, shared = np.unique(np.concatenate(lists), return_counts=True)
+        # Dice overlap, so short exact titles beat long titles that merely contain the query
+        overlap = shared / (len(query_grams) + self._gram_counts[hits])
+        if len(hits) > limit:
+            hits = hits[np.argpartition(-overlap, limit - 1)[:limit]]
+        return hits
+
+    def fuzzy_search(self, query: str, limit: int = 10, score_cutoff: float = 60,
+                     exhaustive: bool = False) -> List[Tuple[int, float]]:
+        """Fuzzy title matches, best first.
+
+        By default only the trigram shortlist is scored; exhaustive=True scores every
+        title with rapidfuzz's batched cdist across all workers.
+        """
+        from rapidfuzz import fuzz, process, utils
+
+        q = utils.default_process(query)
+        if len(q) < MIN_FUZZY_LEN or not self.normalized:
+            return []
+        if exhaustive:
+            pool = np.arange(len(self.normalized))
+            choices = self.normalized
+        else:
+            pool = self.candidates(q)
+            choices = [self.normalized[pos] for pos in pool]
+        if not len(pool):
+            return []
+        scores = process.cdist([q], choices, scorer=fuzz.WRatio, processor=None,
+                               score_cutoff=score_cutoff, dtype=np.uint8, workers=self.workers)[0]
+        keep = np.flatnonzero(scores)
+        if len(keep) > limit:
+            keep = keep[np.argpartition(-scores[keep].astype(np.int16), limit - 1)[:limit]]
+        order = np.lexsort((self.rank[pool[keep]], -scores[keep].astype(np.int16)))
+        return [(int(pool[i]), float(scores[i])) for i in keep[order]]
+
+    def search(self, query: str, limit: int = 10, score_cutoff: float = 60) -> List[Tuple[int, float]]:
+        """Typeahead search merging prefix hits with fuzzy matches for typos.
+
+        Returns (position, score) pairs, best first. Prefix hits are scored against the
+        query so both sources rank on the same scale; very short queries are answered
+        from the prefix index alone, most popular first.
+        """
+        from rapidfuzz import fuzz, process, utils
+
+        q = utils.default_process(query)
+        if not q:
+            return []
+        prefix_hits = self.prefix_search(q, limit)
+        if len(q) < MIN_FUZZY_LEN:
+            return [(pos, float(score_cutoff)) for pos in prefix_hits]
+        best: Dict[int, float] = {}
+        if prefix_hits:
+            choices = [self.normalized[pos] for pos in prefix_hits]
+            scores = process.cdist([q], choices, scorer=fuzz.WRatio, processor=None, dtype=np.uint8)[0]
+            best = {pos: float(max(score, score_cutoff)) for pos, score in zip(prefix_hits, scores)}
+        for pos, score in self.fuzzy_search(q, limit, score_cutoff):
+            best[pos] = max(score, best.get(pos, 0.0))
+        return sorted(best.items(), key=lambda item: (-item[1], self.rank[item[0]]))[:limit]
+
+    def popular(self, limit: int = 10) -> List[int]:
+        """Positions of the most popular titles."""
+        return self.by_popularity[:limit].tolist()
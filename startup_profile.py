@@ -0,0 +1,137 @@
+# startup_profile.py - Cold-start timing: imports, artifact load, index warm-up, time to first render
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# Set to 1 to record the phases of a process's first run and report them
+PROFILE_ENV = 'POPCORN_PROFILE_STARTUP'
+# One JSON line per report, so time-to-first-render can be tracked across deploys
+PROFILE_FILE = 'startup_profile.jsonl'
+PHASES = ('imports', 'artifact_load', 'index_warm', 'first_render')
+
+_MODULE_LOADED = time.time()
+
+
+def process_age() -> float:
+    """Seconds since this process was started (since this module was imported where /proc is missing)."""
+    try:
+        with open('/proc/self/stat') as f:
+            # Field 22 (after the parenthesised command name) is the start time in clock ticks since boot
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return max(uptime - start_ticks / os.sysconf('SC_CLK_TCK'), 0.0)
+    except (OSError, ValueError, IndexError):
+        return time.time() - _MODULE_LOADED
+
+
+class StartupProfile:
+    """Durations of one process's cold-start phases.
+
+    Each phase is recorded the first time it completes; later reruns and hot reloads
+    don't overwrite it, so the report always describes the cold start. Disabled
+    profiles record nothing and cost one attribute check per phase.
+    """
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.phases: Dict[str, float] = {}
+        self.mode: Optional[str] = None
+        self.reported = False
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time the enclosed block as phase name."""
+        if not self.enabled or name in self.phases:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.setdefault(name, time.perf_counter() - started)
+
+    def first_render(self, mode: str):
+        """Record time to first render (from process start) and report once."""
+        if not self.enabled or self.reported:
+            return
+        self.phases['first_render'] = process_age()
+        self.mode = mode
+        self.reported = True
+        self.write()
+
+    def report(self) -> Dict:
+        return {
+            'timestamp': time.time(),
+            'pid': os.getpid(),
+            'mode': self.mode,
+            **{name: round(self.phases[name], 4) for name in PHASES if name in self.phases},
+        }
+
+    def write(self, path: str = PROFILE_FILE):
+        report = self.report()
+        print("Startup profile: " + ", ".join(f"{k}={v}" for k, v in report.items() if k in PHASES + ('mode',)),
+              flush=True)
+        try:
+            with open(path, 'a') as f:
+                f.write(json.dumps(report) + "\n")
+        except OSError:
+            pass
+
+
+PROFILE = StartupProfile(os.getenv(PROFILE_ENV) == '1')
+
+
+def _profile_child(app_path: str):
+    """One cold start: render the app once in this fresh interpreter and print its report."""
+    from streamlit.testing.v1 import AppTest
+    # This file runs as __main__ here; the app records into the importable module's PROFILE
+    from startup_profile import PROFILE as app_profile
+
+    at = AppTest.from_file(app_path, default_timeout=600)
+    at.run()
+    if at.exception:
+        raise SystemExit(f"App raised on first render: {at.exception[0].message}")
+    print(json.dumps(app_profile.report()))
+
+
+def profile_cold_starts(app_path: str, runs: int) -> List[Dict]:
+    """Run the app's first render in `runs` fresh interpreters and collect their reports."""
+    env = dict(os.environ, **{PROFILE_ENV: '1'})
+    reports = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, __file__, '--child', app_path], env=env,
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            raise SystemExit(result.stderr.strip() or result.stdout.strip())
+        reports.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report PopcornPicks cold-start phase timings")
+    parser.add_argument('--app', default='app_enhanced.py')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--child', metavar='APP', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        _profile_child(args.child)
+        return
+
+    reports = profile_cold_starts(args.app, args.runs)
+    print(f"{'phase':<16}{'median s':>10}{'max s':>10}")
+    for name in PHASES:
+        values = [r[name] for r in reports if name in r]
+        if values:
+            print(f"{name:<16}{statistics.median(values):>10.3f}{max(values):>10.3f}")
+    print(f"mode: {reports[-1].get('mode')}  (reports appended to {PROFILE_FILE})")
+
+
+if __name__ == "__main__":
+    main()
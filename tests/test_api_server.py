@@ -0,0 +1,55 @@
+import asyncio
+import json
+
+import numpy as np
+import pandas as pd
+import tornado.httpclient
+import tornado.httpserver
+import tornado.testing
+from scipy import sparse
+
+from api_server import RecommendationService, make_app
+from search_index import TitleSearchIndex
+
+
+def make_service(n=40, features=16, seed=0):
+    rng = np.random.default_rng(seed)
+    dense = rng.random((n, features)).astype(np.float32)
+    dense /= np.linalg.norm(dense, axis=1, keepdims=True)
+    genres = ['Action', 'Drama', 'Comedy', 'Horror']
+    movies = pd.DataFrame({
+        'id': np.arange(1000, 1000 + n),
+        'title': [f"Movie {i}" for i in range(n)],
+        'genres': [[genres[i % 4], genres[(i + 1) % 4]] for i in range(n)],
+        'popularity': rng.random(n),
+        'streaming_on': [['Netflix'] if i % 7 == 0 else [] for i in range(n)],
+    })
+    return RecommendationService(movies, sparse.csr_matrix(dense), TitleSearchIndex(movies['title'].tolist()))
+
+
+def fetch_json(service, path):
+    async def run():
+        sock, port = tornado.testing.bind_unused_port()
+        server = tornado.httpserver.HTTPServer(make_app(service))
+        server.add_sockets([sock])
+        try:
+            response = await tornado.httpclient.AsyncHTTPClient().fetch(f"http://127.0.0.1:{port}{path}")
+        finally:
+            server.stop()
+        return json.loads(response.body)
+    return asyncio.run(run())
+
+
+def test_recommend_without_diversity_returns_distinct_ids():
+    payload = fetch_json(make_service(), '/recommend?id=1000&k=5&diversity=0')
+    ids = [movie['id'] for movie in payload['results']]
+    assert len(ids) == 5
+    assert len(set(ids)) == 5
+
+
+def test_recommend_applies_filters_inside_the_search():
+    payload = fetch_json(make_service(), '/recommend?id=1000&k=5&providers=Netflix&genres=Drama')
+    results = payload['results']
+    # Rows 21 and 28 are the only other Drama movies on Netflix
+    assert sorted(movie['id'] for movie in results) == [1021, 1028]
+    assert all('Netflix' in movie['streaming_on'] and 'Drama' in movie['genres'] for movie in results)
@@ -0,0 +1,37 @@
+import io
+
+import pandas as pd
+
+from catalog_benchmark import CatalogGenerator, skip_reason
+from data_processing_enhanced import process_movies
+
+
+def test_generated_chunks_are_deterministic_and_fetch_shaped():
+    generator = CatalogGenerator(1000, seed=3)
+    first, again = generator.chunk(500, 200), CatalogGenerator(1000, seed=3).chunk(500, 200)
+    pd.testing.assert_frame_equal(first, again)
+    assert first['id'].tolist() == list(range(501, 701))
+    assert all(1 <= len(genres) <= 3 for genres in first['genres'])
+    assert all(len(cast) <= 5 for cast in first['cast'])
+
+
+def test_generated_csv_goes_through_the_processing_step():
+    buffer = io.StringIO()
+    CatalogGenerator(300, seed=1).chunk(0, 300).to_csv(buffer, index=False)
+    buffer.seek(0)
+    processed = process_movies(pd.read_csv(buffer))
+    # Rows without an overview are dropped, as for a real fetch
+    assert 290 <= len(processed) <= 300
+    assert isinstance(processed['genres'].iloc[0], list)
+    row = processed.iloc[0]
+    assert row['genres'][0].replace(' ', '').lower() in row['enhanced_tags']
+
+
+def test_sizes_that_would_not_fit_are_skipped():
+    completed = [{'rows': 1000, 'build_peak_rss_mb': 200, 'serve_peak_rss_mb': 100, 'disk_mb': 10},
+                 {'rows': 2000, 'build_peak_rss_mb': 300, 'serve_peak_rss_mb': 120, 'disk_mb': 20}]
+    free = {'memory_mb': 1000, 'disk_mb': 10_000}
+    assert skip_reason(1000, [], free) is None
+    # 300 MB + 0.1 MB per extra row, plus the margin
+    assert skip_reason(7000, completed, free) is None
+    assert skip_reason(9000, completed, free).startswith("needs about 1,200 MB of memory")
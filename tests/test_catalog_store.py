@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+import catalog_store
+
+
+def make_movies():
+    return pd.DataFrame({
+        'id': np.array([10, 11, 12], dtype=np.int64),
+        'title': ['Alpha', 'Beta', 'Gamma'],
+        'overview': ['First film.', None, 'Über long text'],
+        'genres': [['Drama', 'Action'], [], ['Comedy', 'Drama']],
+        'cast': [['Ann Lee', 'Bo Chan'], ['Bo Chan'], None],
+        'streaming_on': [[], ['Hulu'], ['Netflix']],
+        'director': ['Dir A', None, 'Dir A'],
+        'rating': [7.3, 6.1, 8.0],
+        'revenue': np.array([0, 3_000_000_000, 5], dtype=np.int64),
+        'enhanced_tags': ['a', 'b', 'c'],
+    })
+
+
+def test_round_trip(tmp_path):
+    movies_df = make_movies()
+    vectors = sparse.csr_matrix(np.eye(3, dtype=np.float32))
+    catalog_store.write_store(movies_df, None, vectors, str(tmp_path))
+    movies, mapped, details = catalog_store.open_store(str(tmp_path))
+
+    assert list(movies['title']) == ['Alpha', 'Beta', 'Gamma']
+    assert 'enhanced_tags' not in movies.columns
+    assert movies['id'].dtype == np.int32
+    assert movies['rating'].dtype == np.float32
+    # Values beyond int32 keep their width
+    assert movies['revenue'].dtype == np.int64
+    assert movies['director'].iloc[0] == 'Dir A' and pd.isna(movies['director'].iloc[1])
+    assert (mapped != vectors).nnz == 0
+
+    expanded = details.expand(movies.iloc[[2, 0]])
+    assert expanded['genres'].tolist() == [['Comedy', 'Drama'], ['Drama', 'Action']]
+    assert expanded['cast'].tolist() == [[], ['Ann Lee', 'Bo Chan']]
+    assert expanded['overview'].tolist() == ['Über long text', 'First film.']
+
+
+def test_list_column_queries(tmp_path):
+    catalog_store.write_store(make_movies(), None, sparse.csr_matrix(np.eye(3)), str(tmp_path))
+    _, _, details = catalog_store.open_store(str(tmp_path))
+    genres, cast = details.lists['genres'], details.lists['cast']
+
+    assert genres.name_list() == ['Action', 'Comedy', 'Drama']
+    assert genres.rows_containing(genres.codes_of(['Drama', 'Unknown'])).tolist() == [True, False, True]
+    assert cast.rows_containing(cast.codes_matching('bo ch')).tolist() == [True, True, False]
+    assert genres.bitmap().tolist() == [[True, False, True], [False, False, False], [False, True, True]]
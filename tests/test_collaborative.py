@@ -0,0 +1,112 @@
+import numpy as np
+
+from collaborative import ItemItemCF
+from user_store import SQLiteUserStore
+
+
+def make_ratings(n_users=60, n_items=30, per_user=8, seed=0):
+    rng = np.random.default_rng(seed)
+    users, items, ratings = [], [], []
+    for u in range(n_users):
+        for item in rng.choice(n_items, per_user, replace=False):
+            users.append(u)
+            items.append(item)
+            ratings.append(float(rng.integers(1, 11)) / 2)
+    return [f"user{u}" for u in range(n_users)], np.array(users), np.array(items), np.array(ratings)
+
+
+def dense_similarities(users, items, ratings, n_users, n_items, shrinkage):
+    matrix = np.full((n_users, n_items), np.nan)
+    matrix[users, items] = ratings
+    centered = np.nan_to_num(matrix - np.nanmean(matrix, axis=1, keepdims=True))
+    rated = ~np.isnan(matrix)
+    dots = centered.T @ centered
+    norms = np.sqrt(np.diag(dots))
+    counts = rated.T.astype(float) @ rated
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sims = np.nan_to_num(dots / np.outer(norms, norms)) * counts / (counts + shrinkage)
+    np.fill_diagonal(sims, 0)
+    return sims
+
+
+def test_build_matches_dense_computation():
+    user_ids, users, items, ratings = make_ratings()
+    cf = ItemItemCF.build(user_ids, users, items, ratings, 30, k=5, shrinkage=3.0, block_size=7, block_pairs=100)
+    sims = dense_similarities(users, items, ratings, 60, 30, 3.0)
+    for item in range(30):
+        neighbors, values = cf.item_neighbors(item)
+        expected = np.sort(sims[item][sims[item] > 0])[::-1][:5]
+        np.testing.assert_allclose(values, expected, rtol=1e-4)
+        np.testing.assert_allclose(sims[item, neighbors], values, rtol=1e-4)
+
+
+def test_update_matches_rebuild_for_the_rated_movie():
+    user_ids, users, items, ratings = make_ratings()
+    cf = ItemItemCF.build(user_ids, users, items, ratings, 30, k=30, shrinkage=3.0)
+    cf.update('user0', 29, 5.0)
+    cf.update('user0', 29, 1.0)
+    cf.update('newcomer', 29, 4.0)
+    cf.update('newcomer', 3, 2.0)
+
+    rows = {(u, i): r for u, i, r in zip(users, items, ratings)}
+    rows[(0, 29)] = 1.0
+    rows[(60, 29)] = 4.0
+    rows[(60, 3)] = 2.0
+    keys = list(rows)
+    sims = dense_similarities(np.array([u for u, _ in keys]), np.array([i for _, i in keys]),
+                              np.array(list(rows.values())), 61, 30, 3.0)
+    neighbors, values = cf.item_neighbors(29)
+    np.testing.assert_allclose(values, sims[29, neighbors], rtol=1e-4)
+    assert set(neighbors.tolist()) == set(np.flatnonzero(sims[29] > 0).tolist())
+
+
+def test_full_deltas_trigger_a_rebuild_from_the_current_ratings():
+    user_ids, users, items, ratings = make_ratings()
+    cf = ItemItemCF.build(user_ids, users, items, ratings, 30, k=30, shrinkage=3.0, max_deltas=300)
+    rows = {(u, i): r for u, i, r in zip(users, items, ratings)}
+    rng = np.random.default_rng(1)
+    for u, item, rating in zip(rng.integers(0, 62, 40), rng.integers(0, 30, 40), rng.integers(1, 11, 40)):
+        cf.update(f"user{u}", int(item), float(rating))
+        rows[(u, item)] = float(rating)
+    assert cf.rebuilds >= 1
+    assert len(cf._delta_keys) + cf._ratings_since_count <= 300
+
+    # A rebuild leaves every list exact for the ratings as they now stand
+    keys = list(rows)
+    sims = dense_similarities(np.array([cf.user_index[f"user{u}"] for u, _ in keys]),
+                              np.array([i for _, i in keys]), np.array(list(rows.values())),
+                              len(cf.user_ids), 30, 3.0)
+    cf._rebuild()
+    for item in range(30):
+        neighbors, values = cf.item_neighbors(item)
+        np.testing.assert_allclose(values, sims[item, neighbors], rtol=1e-4)
+
+
+def test_recommend_skips_rated_movies_and_ranks_by_prediction():
+    user_ids, users, items, ratings = make_ratings()
+    cf = ItemItemCF.build(user_ids, users, items, ratings, 30, k=10)
+    profile = cf.user_ratings('user1')
+    recommended, predicted = cf.recommend(profile, k=5)
+    assert len(recommended) == 5
+    assert not set(recommended.tolist()) & set(profile)
+    assert np.all(np.diff(predicted) <= 0)
+
+
+def test_from_store_maps_movie_ids_and_follows_rating_events(tmp_path):
+    store = SQLiteUserStore(str(tmp_path / 'users.db'))
+    for user in range(4):
+        store.set_rating(f"u{user}", 100, 9.0)
+        store.set_rating(f"u{user}", 101, 8.0 + user % 2)
+        store.set_rating(f"u{user}", 102, 2.0)
+    store.set_rating('u0', 999, 5.0)  # not in the catalog
+    cf = ItemItemCF.from_store(store, {100: 0, 101: 1, 102: 2, 103: 3}, k=3, shrinkage=0.0)
+    assert set(cf.item_neighbors(0)[0].tolist()) == {1}
+    cf.on_rating('u9', 102, 1.0)
+    cf.on_rating('u9', 103, 9.0)
+    cf.on_rating('u9', 100, 10.0)
+    # Applied by the background thread
+    cf.wait()
+    assert cf.updates == 3 and cf.last_error is None
+    assert 3 in cf.item_neighbors(0)[0].tolist()
+    cf.close()
+
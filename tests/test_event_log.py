@@ -0,0 +1,82 @@
+import os
+import shutil
+
+from event_log import COUNTER_DIR, SEGMENT_DIR, EventCounters, EventLog, compact
+
+
+def make_log(directory, **options):
+    return EventLog(str(directory), flush_interval=60, compact_interval=None, **options)
+
+
+def test_compaction_counts_events_per_movie_and_user(tmp_path):
+    log = make_log(tmp_path)
+    for movie_id in (10, 10, 11):
+        log.log('alice', 'view', movie_id)
+    log.log('bob', 'select', 10)
+    log.log('bob', 'search', detail='dark knight')
+    log.close()
+
+    manifest = compact(str(tmp_path))
+    assert manifest['events'] == 5
+    counters = EventCounters.open(str(tmp_path))
+    assert counters.item(10) == {'view': 2, 'select': 1, 'search': 0, 'page': 0}
+    assert counters.item(99)['view'] == 0
+    assert counters.user('bob') == {'view': 0, 'select': 1, 'search': 1, 'page': 0}
+    assert counters.catalog_counts('view', {10: 1, 11: 0, 12: 2}, 3).tolist() == [1, 2, 0]
+    assert os.listdir(tmp_path / SEGMENT_DIR) == []
+
+
+def test_generations_accumulate_and_absorbed_segments_are_not_recounted(tmp_path):
+    log = make_log(tmp_path, segment_seconds=0)
+    log.log('alice', 'view', 10)
+    log.flush()
+    first = compact(str(tmp_path))
+    log.log('alice', 'view', 10)
+    log.close()
+    # A crash between publishing the counters and deleting the segments leaves them behind
+    segments = tmp_path / SEGMENT_DIR
+    kept = tmp_path / 'kept'
+    shutil.copytree(segments, kept)
+    second = compact(str(tmp_path))
+    for name in os.listdir(kept):
+        shutil.copy(kept / name, segments / name)
+
+    assert compact(str(tmp_path)) is None
+    assert os.listdir(segments) == []
+    counters = EventCounters.open(str(tmp_path))
+    assert counters.generation == second['generation'] != first['generation']
+    assert counters.item(10)['view'] == 2
+    assert sorted(os.listdir(tmp_path / COUNTER_DIR)) == [second['generation'], 'CURRENT']
+
+
+def test_restart_with_the_same_pid_does_not_reuse_absorbed_segment_names(tmp_path):
+    log = make_log(tmp_path)
+    log.log('alice', 'view', 10)
+    log.close()
+    compact(str(tmp_path))
+
+    # A second log in this process stands in for a restart that got the same pid
+    log = make_log(tmp_path)
+    log.log('alice', 'view', 10)
+    log.log('bob', 'view', 11)
+    log.close()
+    manifest = compact(str(tmp_path))
+    assert manifest['total_events'] == 3
+    counters = EventCounters.open(str(tmp_path))
+    assert counters.item(10)['view'] == 2 and counters.item(11)['view'] == 1
+
+
+def test_open_segment_of_a_dead_process_is_compacted(tmp_path):
+    segments = tmp_path / SEGMENT_DIR
+    os.makedirs(segments)
+    (segments / '999999.1.open').write_text('[1.0,"carol","page",null,"For You"]\n[2.0,"carol","vi')
+    compact(str(tmp_path))
+    assert EventCounters.open(str(tmp_path)).user('carol')['page'] == 1
+
+
+def test_full_buffer_drops_instead_of_blocking(tmp_path):
+    log = make_log(tmp_path, max_buffered=2)
+    assert log.log('alice', 'view', 1) and log.log('alice', 'view', 2)
+    assert not log.log('alice', 'view', 3)
+    assert log.dropped == 1
+    log.close()
@@ -0,0 +1,56 @@
+import numpy as np
+from scipy import sparse
+
+from collaborative import ItemItemCF
+from hybrid import MIN_CF_RATINGS, cf_weight, hybrid_recommend, hybrid_scores
+from personalization import UserProfile
+
+
+def make_inputs(n_items=40, features=12, n_users=80, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = sparse.csr_matrix(rng.random((n_items, features)).astype(np.float32))
+    users, items, ratings = [], [], []
+    for u in range(n_users):
+        for item in rng.choice(n_items - 1, 8, replace=False):  # the last movie is new: nobody rated it
+            users.append(u)
+            items.append(item)
+            ratings.append(float(rng.integers(1, 11)))
+    cf = ItemItemCF.build([f"u{u}" for u in range(n_users)], np.array(users), np.array(items),
+                          np.array(ratings), n_items, k=10)
+    return vectors, cf
+
+
+def test_cf_weight_is_zero_for_new_users_and_grows_with_ratings():
+    assert cf_weight(0) == cf_weight(MIN_CF_RATINGS - 1) == 0.0
+    weights = [cf_weight(n) for n in (MIN_CF_RATINGS, 10, 50, 500)]
+    assert all(a < b for a, b in zip(weights, weights[1:]))
+
+
+def test_new_user_gets_content_only_results():
+    vectors, cf = make_inputs()
+    ratings = {0: 9.0, 1: 2.0}
+    profile = UserProfile.from_ratings(vectors, ratings)
+    positions, _, weight = hybrid_recommend(vectors, profile.vector, ratings, cf, k=5)
+    expected, _ = profile.recommend(vectors, 5)
+    assert weight == 0.0
+    assert positions.tolist() == expected.tolist()
+
+
+def test_blend_skips_rated_and_excluded_movies():
+    vectors, cf = make_inputs()
+    ratings = {0: 9.0, 1: 2.0, 2: 8.0, 3: 7.0, 4: 1.0}
+    profile = UserProfile.from_ratings(vectors, ratings)
+    positions, scores, weight = hybrid_recommend(vectors, profile.vector, ratings, cf, k=10, exclude=[5, 6])
+    assert weight > 0
+    assert len(positions) == 10
+    assert not set(positions.tolist()) & {0, 1, 2, 3, 4, 5, 6}
+    assert np.all(np.diff(scores) <= 0)
+
+
+def test_movies_without_cf_support_keep_their_content_score():
+    content = np.array([0.2, 0.4, 1.0], dtype=np.float32)
+    predicted = np.array([9.0, 3.0, 0.0], dtype=np.float32)
+    support = np.array([1.0, 1.0, 0.0], dtype=np.float32)
+    scores = hybrid_scores(content, predicted, support, 0.5)
+    # The unsupported movie is blended from content alone: normalized 1.0
+    np.testing.assert_allclose(scores, [0.5 * 0.0 + 0.5 * 1.0, 0.5 * 0.25 + 0.5 * 0.0, 1.0])
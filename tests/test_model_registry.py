@@ -0,0 +1,95 @@
+import json
+import threading
+import time
+
+import pandas as pd
+
+from model_registry import ModelBundle, ModelRegistry
+
+
+def make_bundle(dataset_path):
+    movies = pd.DataFrame({'id': [1, 2, 3], 'title': ['Alpha', 'Beta', 'Gamma'], 'popularity': [3.0, 2.0, 1.0]})
+    return ModelBundle(f"version-of-{dataset_path}", dataset_path, movies, None, None)
+
+
+def publish(tmp_path, dataset):
+    (tmp_path / dataset).write_text('')
+    manifest = tmp_path / 'manifest.json'
+    manifest.write_text(json.dumps({'version': dataset, 'dataset': str(tmp_path / dataset)}))
+    return str(manifest)
+
+
+def wait_for_swap(registry, swaps):
+    deadline = time.monotonic() + 5
+    while (registry.swaps < swaps or registry.status()['reloading']) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_resources_are_created_once_per_bundle():
+    first, second = make_bundle('a.csv'), make_bundle('b.csv')
+    calls = []
+    def factory(bundle):
+        calls.append(bundle.version)
+        time.sleep(0.01)
+        return object()
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(first.resource('thing', factory))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert calls == ['version-of-a.csv']
+    assert all(result is results[0] for result in results)
+    assert second.resource('thing', factory) is not results[0]
+    assert calls == ['version-of-a.csv', 'version-of-b.csv']
+
+
+def test_swap_notifies_listeners_and_finalizes_the_old_bundle(tmp_path, monkeypatch):
+    # A reload prunes old catalog stores under the working directory
+    monkeypatch.chdir(tmp_path)
+    manifest = publish(tmp_path, 'v1.csv')
+    registry = ModelRegistry(manifest, loader=make_bundle)
+    swaps, finalized = [], []
+    registry.add_swap_listener(lambda old, new: swaps.append((old and old.dataset_path, new.dataset_path)))
+
+    def factory(bundle):
+        # As the app's profile stores do: unregister a listener when the version retires
+        bundle.add_finalizer(lambda: finalized.append(bundle.dataset_path))
+        return object()
+
+    old = registry.load(str(tmp_path / 'v1.csv'))
+    old.resource('store', factory)
+    # The manifest already names the served dataset
+    assert not registry.check()
+
+    publish(tmp_path, 'v2.csv')
+    assert registry.check()
+    wait_for_swap(registry, 1)
+    new = registry.current
+    assert new.dataset_path == str(tmp_path / 'v2.csv')
+    assert swaps == [(None, str(tmp_path / 'v1.csv')), (str(tmp_path / 'v1.csv'), new.dataset_path)]
+    assert finalized == [str(tmp_path / 'v1.csv')]
+    # A request still holding the old bundle gets a fresh resource, never a finalized one
+    assert old.resource('store', lambda bundle: 'rebuilt') == 'rebuilt'
+    old.close()
+    assert finalized == [str(tmp_path / 'v1.csv')]
+
+    new.resource('store', factory)
+    new.close()
+    assert finalized == [str(tmp_path / 'v1.csv'), new.dataset_path]
+
+
+def test_failed_reload_keeps_serving_the_current_bundle(tmp_path):
+    manifest = publish(tmp_path, 'v1.csv')
+    def loader(dataset_path):
+        if dataset_path.endswith('v2.csv'):
+            raise OSError("truncated store")
+        return make_bundle(dataset_path)
+    registry = ModelRegistry(manifest, loader=loader)
+    served = registry.load(str(tmp_path / 'v1.csv'))
+    publish(tmp_path, 'v2.csv')
+    assert registry.check()
+    wait_for_swap(registry, 0)
+    assert registry.current is served
+    assert "truncated store" in registry.status()['last_error']
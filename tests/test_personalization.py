@@ -0,0 +1,45 @@
+import numpy as np
+from scipy import sparse
+
+from personalization import ProfileStore
+
+
+def make_store(n=20, features=8, max_profiles=1024):
+    rng = np.random.default_rng(0)
+    vectors = sparse.csr_matrix(rng.random((n, features)).astype(np.float32))
+    position_by_id = {100 + i: i for i in range(n)}
+    return ProfileStore(vectors, position_by_id, max_profiles=max_profiles)
+
+
+def test_profiles_are_bounded_lru():
+    store = make_store(max_profiles=2)
+    ratings = {'100': {'rating': 9}}
+    store.get('a', ratings)
+    store.get('b', ratings)
+    store.get('a', ratings)
+    store.get('c', ratings)
+    assert list(store._profiles) == ['a', 'c']
+
+
+def test_profile_rebuilt_when_ratings_changed_elsewhere():
+    store = make_store()
+    first = store.get('a', {'100': {'rating': 9}})
+    assert store.get('a', {'100': {'rating': 9}}) is first
+    # Saved by another worker: no on_rating event reached this process
+    second = store.get('a', {'100': {'rating': 9}, '101': {'rating': 2}})
+    assert second is not first
+    assert second.ratings == {0: 9.0, 1: 2.0}
+
+
+def test_on_rating_matches_full_rebuild():
+    store = make_store()
+    profile = store.get('a', {'100': {'rating': 9}})
+    old_state = profile.state
+    store.on_rating('a', 101, 2)
+    rebuilt = make_store().get('a', {'100': {'rating': 9}, '101': {'rating': 2}})
+    assert np.allclose(profile.vector, rebuilt.vector)
+    # Updates publish a new state instead of mutating the one readers may hold
+    assert profile.vector is not old_state.vector
+    assert old_state.ratings == {0: 9.0}
+    assert profile.state.ratings == {0: 9.0, 1: 2.0}
+    assert store.get('a', {'100': {'rating': 9}, '101': {'rating': 2}}) is profile
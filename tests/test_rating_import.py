@@ -0,0 +1,54 @@
+import numpy as np
+from rapidfuzz import utils
+
+from rating_import import TitleMatcher, import_ops, parse_ratings_csv, rating_scale
+from user_store import SQLiteUserStore, WriteBehindUserStore
+
+TITLES = ['The Godfather', 'Heat', 'Heat', 'Inception', 'The Dark Knight', 'Solaris', 'Solaris']
+YEARS = np.array([1972, 1986, 1995, 2010, 2008, 1972, 2002], dtype=float)
+
+
+def make_matcher():
+    return TitleMatcher([utils.default_process(t) for t in TITLES], YEARS, workers=1)
+
+
+def test_parse_accepts_header_aliases_and_reports_bad_lines():
+    rows, problems = parse_ratings_csv(b"Name,Release_Year,Stars\nHeat,1995,4.5\nInception,,x\n\n,2000,3\n")
+    assert [(r.title, r.year, r.rating) for r in rows] == [('Heat', 1995, 4.5)]
+    assert problems == ["Line 3: expected a title and a numeric rating"]
+    rows, _ = parse_ratings_csv("Solaris,2002-10-01,8\n")
+    assert [(r.title, r.year, r.rating) for r in rows] == [('Solaris', 2002, 8.0)]
+    assert rating_scale(rows) == 1.0
+    assert rating_scale(parse_ratings_csv("title,rating\nHeat,4\nSolaris,2.5\n")[0]) == 2.0
+
+
+def test_year_picks_among_same_titled_movies():
+    rows, _ = parse_ratings_csv("title,year,rating\nHeat,1995,9\nHeat,1986,5\nSolaris,,7\nSolaris,2003,6\n")
+    matches = make_matcher().match(rows)
+    assert [m.position for m in matches] == [2, 1, 5, 6]
+    assert all(m.score == 100 for m in matches)
+    assert [m.confident for m in matches] == [True, True, True, True]
+
+
+def test_fuzzy_matches_are_batched_and_flagged_by_confidence():
+    rows, _ = parse_ratings_csv("title,year,rating\n\"Godfather, The\",1972,10\nIncepton,2010,9\n"
+                                "The Dark Night,2008,8\nInception,1999,7\nZardoz,1974,3\n")
+    matches = make_matcher().match(rows)
+    assert [m.position for m in matches] == [0, 3, 4, 3, None]
+    # An exact title in the wrong decade is kept, but flagged for review
+    assert [m.confident for m in matches] == [True, True, True, False, False]
+
+
+def test_import_writes_one_batch(tmp_path):
+    store = WriteBehindUserStore(SQLiteUserStore(str(tmp_path / 'users.db')), str(tmp_path / 'journal'),
+                                 flush_interval=60)
+    rows, _ = parse_ratings_csv("title,year,rating\nHeat,1995,4.5\nInception,2010,3\nInception,2010,5\nZardoz,1974,1\n")
+    matches = make_matcher().match(rows)
+    ops = import_ops('alice', matches, np.arange(100, 107), rating_scale(rows), 1.0)
+    assert store.apply(ops) == 2
+    # Committed in one flush, not left for the background flusher
+    assert store.flushes == 1
+    assert store.store.get_ratings('alice') == {'102': {'rating': 9.0, 'timestamp': 1.0},
+                                                '103': {'rating': 10.0, 'timestamp': 1.0}}
+    assert store.get_rating('alice', 103) == 10.0
+    store.close()
@@ -0,0 +1,66 @@
+import threading
+import time
+
+import pytest
+
+from recommendation_cache import RecommendationCache
+
+
+def test_concurrent_misses_compute_once():
+    cache = RecommendationCache()
+    calls, release = [], threading.Event()
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return [1, 2, 3]
+
+    results = []
+    def lookup():
+        results.append(cache.get_or_compute('alice', compute, 'v1'))
+    threads = [threading.Thread(target=lookup) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    # Hold the first computation until every other lookup is waiting on it
+    deadline = time.monotonic() + 5
+    while cache.stats()['coalesced'] < 7 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert results == [[1, 2, 3]] * 8
+    stats = cache.stats()
+    assert (stats['misses'], stats['coalesced']) == (1, 7)
+
+
+def test_failed_computation_is_raised_to_waiters_and_not_cached():
+    cache = RecommendationCache()
+    with pytest.raises(ValueError):
+        cache.get_or_compute('alice', lambda: (_ for _ in ()).throw(ValueError("boom")), 'v1')
+    assert cache.get_or_compute('alice', lambda: 'ok', 'v1') == 'ok'
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = RecommendationCache(max_entries=2)
+    cache.get_or_compute('a', lambda: 'A', 'v1')
+    cache.get_or_compute('b', lambda: 'B', 'v1')
+    # Touching 'a' makes 'b' the oldest
+    assert cache.peek('a', 'v1') == 'A'
+    cache.get_or_compute('c', lambda: 'C', 'v1')
+    assert cache.peek('b', 'v1') is None
+    assert cache.peek('a', 'v1') == 'A' and cache.peek('c', 'v1') == 'C'
+    assert cache.stats()['evictions'] == 1
+
+
+def test_versions_are_kept_apart_and_old_entries_age_out():
+    cache = RecommendationCache(max_entries=2)
+    cache.get_or_compute('a', lambda: 'old', 'v1')
+    assert cache.get_or_compute('a', lambda: 'new', 'v2') == 'new'
+    # The old version's entry stays until the LRU pushes it out
+    assert cache.peek('a', 'v1') == 'old'
+    assert cache.peek('a', 'v2') == 'new'
+    cache.get_or_compute('b', lambda: 'B', 'v2')
+    assert cache.peek('a', 'v1') is None
+    stats = cache.stats()
+    assert (stats['model_version'], stats['invalidations'], stats['size']) == ('v2', 1, 2)
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from recommender import FilterIndex, filtered_neighbors, mmr_rerank, recommend_batch, recommendation_filters
+
+
+def make_inputs(n=12, features=8, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = sparse.csr_matrix(rng.random((n, features)).astype(np.float32))
+    genre_bitmap = rng.random((n, 4)) > 0.5
+    candidates = np.arange(n)
+    relevance = rng.random(n).astype(np.float32)
+    return vectors, genre_bitmap, candidates, relevance
+
+
+def test_mmr_lambda_one_returns_top_n_by_relevance():
+    vectors, genre_bitmap, candidates, relevance = make_inputs()
+    picked = mmr_rerank(vectors, genre_bitmap, candidates, relevance, 5, 1.0)
+    assert picked.tolist() == np.argsort(-relevance)[:5].tolist()
+
+
+def test_mmr_picks_are_distinct():
+    vectors, genre_bitmap, candidates, relevance = make_inputs()
+    for mmr_lambda in (0.0, 0.3, 0.7, 1.0):
+        picked = mmr_rerank(vectors, genre_bitmap, candidates, relevance, 10, mmr_lambda)
+        assert len(set(picked.tolist())) == 10
+
+
+def make_catalog(n=200, features=16, seed=0):
+    rng = np.random.default_rng(seed)
+    dense = rng.random((n, features)).astype(np.float32)
+    dense /= np.linalg.norm(dense, axis=1, keepdims=True)
+    movies = pd.DataFrame({
+        'genres': [['Action'] if i % 2 else ['Drama'] for i in range(n)],
+        'streaming_on': [['Netflix'] if i % 10 == 0 else [] for i in range(n)],
+        'original_language': ['en' if i % 3 else 'fr' for i in range(n)],
+        'release_year': 1950 + np.arange(n) % 70,
+        'rating': (np.arange(n) % 10).astype(float),
+    })
+    return sparse.csr_matrix(dense), movies
+
+
+def expected_neighbors(vectors, movie_idx, k, allowed):
+    scores = (vectors @ vectors[movie_idx].T).toarray().ravel()
+    scores[~allowed] = -np.inf
+    scores[movie_idx] = -np.inf
+    order = np.argsort(-scores, kind='stable')[:k]
+    return order[np.isfinite(scores[order])]
+
+
+def test_filtered_neighbors_match_masked_brute_force():
+    vectors, movies = make_catalog()
+    index = FilterIndex.from_catalog(movies)
+    for filters in [recommendation_filters(providers=['Netflix']),
+                    recommendation_filters(genres=['Action'], min_rating=2),
+                    recommendation_filters(languages=['fr'], year_range=(1960, 2000))]:
+        allowed = index.mask(filters)
+        indices, _ = filtered_neighbors(vectors, 3, 8, allowed)
+        assert indices.tolist() == expected_neighbors(vectors, 3, 8, allowed).tolist()
+
+
+def test_selective_filter_still_fills_k():
+    vectors, movies = make_catalog()
+    allowed = FilterIndex.from_catalog(movies).mask(recommendation_filters(providers=['Netflix'], languages=['fr']))
+    unfiltered, _ = recommend_batch(vectors, [3], 15)
+    # Post-filtering the unfiltered top 15 would keep far fewer than the 5 asked for
+    assert allowed[unfiltered[0]].sum() < 5
+    indices, _ = filtered_neighbors(vectors, 3, 5, allowed)
+    assert (indices >= 0).all() and allowed[indices].all()
+
+
+def test_no_filters_means_no_mask():
+    assert recommendation_filters() is None
+    assert FilterIndex.from_catalog(make_catalog()[1]).mask(None) is None
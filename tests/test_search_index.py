@@ -0,0 +1,58 @@
+from search_index import TitleSearchIndex
+
+TITLES = ['The Dark Knight', 'The Dark Knight Rises', 'Dark City', 'Inception', 'Interstellar',
+          'The Godfather', 'The Godfather Part II', 'Heat', 'Darkest Hour', 'Knight and Day']
+POPULARITY = [90, 70, 20, 95, 85, 80, 60, 50, 30, 10]
+
+
+def make_index(**options):
+    return TitleSearchIndex(TITLES, POPULARITY, workers=1, **options)
+
+
+def test_prefix_hits_match_any_word_and_rank_by_popularity():
+    index = make_index()
+    # 'dark' starts a word of four titles (as 'darkest' in one)
+    assert index.prefix_search('Dark') == [0, 1, 8, 2]
+    assert index.prefix_search('knight', limit=2) == [0, 1]
+    # Short queries come from the precomputed table, in the same order
+    assert index.prefix_search('in') == [3, 4]
+    assert index.prefix_search('godfather part ii') == [6]
+    assert index.prefix_search('zz') == []
+
+
+def test_trigram_candidates_shortlist_titles_for_cdist_ranking():
+    index = make_index()
+    candidates = index.candidates('the godfather', limit=3)
+    assert len(candidates) == 3
+    assert {5, 6} <= set(candidates.tolist())
+    # Every shortlisted title shares a trigram with the query
+    assert index.candidates('qqq').tolist() == []
+    # The exact title outscores the longer one containing it
+    results = index.fuzzy_search('the godfather', limit=2)
+    assert [pos for pos, _ in results] == [5, 6]
+    assert results[0][1] == 100
+    # The shortlist gives the same best match as scoring every title
+    assert index.fuzzy_search('interstelar', limit=1)[0][0] == index.fuzzy_search(
+        'interstelar', limit=1, exhaustive=True)[0][0] == 4
+
+
+def test_search_tolerates_typos_and_keeps_prefix_hits():
+    index = make_index()
+    assert index.search('Inceptoin')[0][0] == 3
+    assert index.search('godfater')[0][0] == 5
+    results = index.search('dark kni')
+    assert [pos for pos, _ in results[:2]] == [0, 1]
+    assert all(score >= 60 for _, score in results)
+    # Below MIN_FUZZY_LEN only prefix hits are returned, most popular first
+    assert [pos for pos, _ in index.search('he')] == [7]
+
+
+def test_empty_query_returns_nothing():
+    index = make_index()
+    for query in ('', '   ', '?!'):
+        assert index.search(query) == []
+        assert index.prefix_search(query) == []
+        assert index.fuzzy_search(query) == []
+    assert index.popular(3) == [3, 0, 4]
+    assert len(TitleSearchIndex([])) == 0
+    assert TitleSearchIndex([]).search('dark') == []
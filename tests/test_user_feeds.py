@@ -0,0 +1,86 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from user_feeds import FeedStore, FeedWorker
+from user_store import SQLiteUserStore
+
+
+def make_worker(tmp_path):
+    users = SQLiteUserStore(str(tmp_path / 'users.db'))
+    bundle = SimpleNamespace(version='v1')
+    scored = []
+
+    def score(bundle, user_id, ratings, watchlist, n):
+        scored.append(user_id)
+        positions = np.array(sorted(int(m) for m in ratings)[:n], dtype=np.int64)
+        return positions, np.ones(len(positions), dtype=np.float32), 0.25
+
+    worker = FeedWorker(FeedStore(str(tmp_path / 'feeds.db')), users, lambda: bundle, score, start=False)
+    return worker, users, bundle, scored
+
+
+def test_sweep_rebuilds_only_changed_users(tmp_path):
+    worker, users, bundle, scored = make_worker(tmp_path)
+    users.set_rating('alice', 3, 8.0)
+    users.set_rating('bob', 5, 6.0)
+    worker.touch('alice')
+    worker.touch('bob')
+    assert worker.refresh() == 2
+    assert worker.refresh() == 0
+
+    # Writes reach the worker through the rating and watchlist listeners
+    users.set_rating('alice', 4, 9.0)
+    worker.on_rating('alice', 4, 9.0)
+    assert worker.refresh() == 1
+    users.add_to_watchlist('bob', 7)
+    worker.on_watchlist('bob', 7, True)
+    assert worker.refresh() == 1
+    bundle.version = 'v2'
+    assert worker.refresh() == 2
+    assert scored == ['alice', 'bob', 'alice', 'bob', 'alice', 'bob']
+    feed = worker.feeds.get('alice')
+    assert feed.positions.tolist() == [3, 4] and feed.cf_weight == 0.25
+
+
+def test_feed_is_one_lookup_when_current_and_scored_when_stale(tmp_path):
+    worker, users, bundle, scored = make_worker(tmp_path)
+    users.set_rating('alice', 3, 8.0)
+    worker.touch('alice')
+    worker.refresh()
+    feed = worker.feed(bundle, 'alice', users.get_ratings('alice'), users.get_watchlist('alice'))
+    assert scored == ['alice'] and feed.positions.tolist() == [3]
+
+    users.set_rating('alice', 9, 2.0)
+    feed = worker.feed(bundle, 'alice', users.get_ratings('alice'), users.get_watchlist('alice'))
+    assert scored == ['alice', 'alice'] and feed.positions.tolist() == [3, 9]
+    # Stored on the way, so the next sweep has nothing to do
+    assert worker.refresh() == 0
+
+
+def test_inactive_users_are_not_refreshed(tmp_path):
+    worker, users, bundle, scored = make_worker(tmp_path)
+    worker.active_seconds = 0.0
+    users.set_rating('alice', 3, 8.0)
+    worker.touch('alice')
+    assert worker.refresh() == 0
+    assert scored == []
+
+
+def test_sweep_skips_users_without_writes(tmp_path):
+    worker, users, bundle, scored = make_worker(tmp_path)
+    users.set_rating('alice', 3, 8.0)
+    worker.touch('alice')
+    worker.refresh()
+    reads = []
+    get_ratings = users.get_ratings
+    users.get_ratings = lambda user_id: reads.append(user_id) or get_ratings(user_id)
+    assert worker.refresh() == 0
+    assert reads == []
+
+    # A write that changes nothing the feed depends on is checked once, not rescored
+    worker.on_rating('alice', 3, 8.0)
+    assert worker.refresh() == 0
+    assert reads == ['alice'] and scored == ['alice']
+    assert worker.refresh() == 0
+    assert reads == ['alice']
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+import catalog_store
+from user_stats import UserStatsCache, compute_user_stats, id_index
+
+
+def make_catalog(tmp_path):
+    movies_df = pd.DataFrame({
+        'id': np.array([30, 10, 20, 40], dtype=np.int64),
+        'title': ['Alpha', 'Beta', 'Gamma', 'Delta'],
+        'genres': [['Drama', 'Action'], ['Drama'], ['Comedy'], ['Action', 'Drama']],
+        'cast': [['Ann', 'Bo', 'Cy', 'Di'], ['Di', 'Ann'], ['Bo'], []],
+        'release_year': [1994.0, 1999.0, 2004.0, np.nan],
+        'rating': [7.0, 6.0, 8.0, 5.0],
+    })
+    catalog_store.write_store(movies_df, None, sparse.csr_matrix(np.eye(4, dtype=np.float32)), str(tmp_path))
+    movies, _, details = catalog_store.open_store(str(tmp_path))
+    return movies, details
+
+
+def test_stats_join_ratings_to_list_codes(tmp_path):
+    movies, details = make_catalog(tmp_path)
+    ratings = {'30': {'rating': 9.0}, '10': {'rating': 8.0}, '20': {'rating': 4.0},
+               '40': {'rating': 7.0}, '999': {'rating': 6.0}}
+    stats = compute_user_stats(ratings, 2, movies, details, id_index(movies))
+
+    assert stats['movies_rated'] == 5
+    assert stats['watchlist_size'] == 2
+    assert stats['average_rating'] == 34.0 / 5
+    assert stats['favorite_genres'] == [('Drama', 3), ('Action', 2)]
+    # Only the top-billed three count: Di is fourth for Alpha
+    assert stats['favorite_actors'] == [('Ann', 2), ('Bo', 1), ('Cy', 1), ('Di', 1)]
+    assert stats['ratings_by_decade'] == [(1990, 2, 8.5), (2000, 1, 4.0)]
+
+
+def test_stats_of_a_user_without_ratings(tmp_path):
+    movies, details = make_catalog(tmp_path)
+    stats = compute_user_stats({}, 0, movies, details, id_index(movies))
+    assert stats['average_rating'] == 0
+    assert stats['favorite_genres'] == stats['favorite_actors'] == stats['ratings_by_decade'] == []
+
+
+def test_cache_is_dropped_on_write_and_on_version_change():
+    cache = UserStatsCache()
+    calls = []
+    compute = lambda: calls.append(1) or {'n': len(calls)}
+    assert cache.get('alice', 'v1', compute) == {'n': 1}
+    assert cache.get('alice', 'v1', compute) == {'n': 1}
+    cache.invalidate('alice')
+    assert cache.get('alice', 'v1', compute) == {'n': 2}
+    assert cache.get('alice', 'v2', compute) == {'n': 3}
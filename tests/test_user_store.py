@@ -0,0 +1,128 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+
+import numpy as np
+
+from user_store import (ShardedUserStore, SQLiteUserStore, WriteBehindUserStore, create_layout, rebalance,
+                        shard_of)
+
+
+def test_migrates_json_once(tmp_path):
+    ratings = tmp_path / 'ratings.json'
+    preferences = tmp_path / 'preferences.json'
+    ratings.write_text(json.dumps({'u1': {'10': {'rating': 8.0, 'timestamp': 1.0}}}))
+    preferences.write_text(json.dumps({'u1': {'watchlist': [5, 3, 9], 'theme': 'dark'}}))
+    store = SQLiteUserStore(str(tmp_path / 'users.db'))
+
+    assert store.migrate_json(str(ratings), str(preferences))
+    assert not store.migrate_json(str(ratings), str(preferences))
+    assert store.get_ratings('u1') == {'10': {'rating': 8.0, 'timestamp': 1.0}}
+    assert store.get_preferences('u1') == {'theme': 'dark', 'watchlist': [5, 3, 9]}
+
+
+def test_upserts_touch_one_user(tmp_path):
+    store = SQLiteUserStore(str(tmp_path / 'users.db'))
+    store.set_rating('u1', 10, 6.0)
+    store.set_rating('u1', 10, 9.5)
+    store.set_rating('u2', 10, 2.0)
+    assert store.get_ratings('u1')['10']['rating'] == 9.5
+    assert store.add_to_watchlist('u1', 4)
+    assert not store.add_to_watchlist('u1', 4)
+    assert store.in_watchlist('u1', 4) and not store.in_watchlist('u2', 4)
+    assert store.remove_from_watchlist('u1', 4)
+    assert store.get_watchlist('u1') == []
+
+
+def test_concurrent_writers_keep_every_write(tmp_path):
+    store = SQLiteUserStore(str(tmp_path / 'users.db'))
+
+    def rate(user):
+        for movie_id in range(50):
+            store.set_rating(user, movie_id, 7.0)
+
+    threads = [threading.Thread(target=rate, args=(f"u{i}",)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(len(store.get_ratings(f"u{i}")) == 50 for i in range(8))
+
+
+def test_write_behind_reads_own_writes_and_flushes(tmp_path):
+    db = str(tmp_path / 'users.db')
+    cache = WriteBehindUserStore(SQLiteUserStore(db), str(tmp_path / 'journal'), flush_interval=60)
+    cache.set_rating('u1', 10, 8.0)
+    assert cache.add_to_watchlist('u1', 4)
+    assert not cache.add_to_watchlist('u1', 4)
+    assert cache.get_rating('u1', 10) == 8.0 and cache.in_watchlist('u1', 4)
+    # Nothing reaches the database until a flush
+    assert SQLiteUserStore(db).get_ratings('u1') == {}
+    assert cache.flush() == 2
+    assert SQLiteUserStore(db).get_watchlist('u1') == [4]
+    cache.close()
+    assert os.listdir(tmp_path / 'journal') == []
+
+
+def test_write_behind_replays_journal_of_crashed_process(tmp_path):
+    db, journal = str(tmp_path / 'users.db'), str(tmp_path / 'journal')
+    crash = (
+        "import os, sys\n"
+        "from user_store import SQLiteUserStore, WriteBehindUserStore\n"
+        f"cache = WriteBehindUserStore(SQLiteUserStore({db!r}), {journal!r}, flush_interval=60)\n"
+        "cache.set_rating('u1', 10, 9.0)\n"
+        "cache.add_to_watchlist('u1', 7)\n"
+        "os._exit(0)\n"
+    )
+    subprocess.run([sys.executable, '-c', crash], check=True,
+                   env=dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+    assert SQLiteUserStore(db).get_ratings('u1') == {}
+
+    cache = WriteBehindUserStore(SQLiteUserStore(db), journal, flush_interval=60)
+    assert cache.recovered == 2
+    assert SQLiteUserStore(db).get_rating('u1', 10) == 9.0
+    assert cache.get_watchlist('u1') == [7]
+    cache.close()
+
+
+def test_jump_hash_only_moves_users_to_new_shards():
+    users = [f"user-{i}" for i in range(5000)]
+    before = [shard_of(u, 8) for u in users]
+    after = [shard_of(u, 12) for u in users]
+    moved = [(b, a) for b, a in zip(before, after) if b != a]
+    assert all(a >= 8 for _, a in moved)
+    assert abs(len(moved) / len(users) - 4 / 12) < 0.03
+    assert max(np.bincount(after)) < 1.2 * len(users) / 12
+
+
+def test_sharded_store_imports_legacy_db_and_rebalances(tmp_path):
+    legacy = SQLiteUserStore(str(tmp_path / 'legacy.db'))
+    for i in range(300):
+        legacy.set_rating(f"u{i}", i, 7.0, timestamp=1.0)
+        legacy.add_to_watchlist(f"u{i}", 1000 + i)
+    shards, journal = str(tmp_path / 'shards'), str(tmp_path / 'journal')
+    os.makedirs(shards)
+    create_layout(shards, 4, legacy_db=str(tmp_path / 'legacy.db'),
+                  ratings_file=str(tmp_path / 'none.json'), preferences_file=str(tmp_path / 'none.json'))
+
+    store = ShardedUserStore.open(shards, journal)
+    assert store.get_rating('u42', 42) == 7.0
+    store.set_rating('u42', 1, 3.0)
+    try:
+        rebalance(shards, journal, 6)
+        raise AssertionError("rebalance ran while the shards were open")
+    except RuntimeError:
+        pass
+    store.close()
+
+    report = rebalance(shards, journal, 6)
+    assert 0 < report['moved_users'] < 300
+    store = ShardedUserStore.open(shards, journal)
+    assert len(store.shards) == 6
+    assert all(store.get_watchlist(f"u{i}") == [1000 + i] for i in range(300))
+    assert store.get_rating('u42', 1) == 3.0
+    # Every user lives in exactly one shard
+    assert sum(len(shard.store.user_ids()) for shard in store.shards) == 300
+    store.close()
@@ -0,0 +1,244 @@
+# user_feeds.py - Precomputed per-user recommendation feeds, refreshed in the background
+import atexit
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from user_store import BUSY_TIMEOUT_MS
+
+FEED_DB = 'user_feeds.db'
+# Movies kept per feed (the view shows the first FOR_YOU_COUNT)
+FEED_SIZE = 50
+# Seconds between sweeps over active users, and how long a user stays active after a visit
+REFRESH_INTERVAL = 5.0
+ACTIVE_SECONDS = 3600.0
+# Feeds not rebuilt for this long (users who left, retired model versions) are deleted
+FEED_MAX_AGE = 7 * 24 * 3600.0
+
+FEED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS feeds (
+    user_id TEXT PRIMARY KEY,
+    signature TEXT NOT NULL,
+    positions BLOB NOT NULL,
+    scores BLOB NOT NULL,
+    cf_weight REAL NOT NULL,
+    built_at REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+class Feed(NamedTuple):
+    signature: str
+    positions: np.ndarray
+    scores: np.ndarray
+    cf_weight: float
+    built_at: float
+
+
+def feed_signature(version: str, ratings: Mapping[str, Dict], watchlist: Sequence[int]) -> str:
+    """Digest of everything a feed depends on: model version, ratings and watchlist."""
+    state = [version, sorted((int(movie_id), float(data['rating'])) for movie_id, data in ratings.items()),
+             sorted(int(movie_id) for movie_id in watchlist)]
+    return hashlib.blake2b(json.dumps(state).encode(), digest_size=12).hexdigest()
+
+
+class FeedStore:
+    """Feeds keyed by user_id in one SQLite table (WAL); reading a feed is one primary-key lookup.
+
+    Positions (int32) and scores (float32) are stored as raw array bytes, about 400
+    bytes per 50-movie feed. They are catalog rows of the model version in the
+    signature, so a feed is only used when its signature matches the user's current one.
+    """
+
+    def __init__(self, path: str = FEED_DB):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(FEED_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000)
+            conn.execute('PRAGMA journal_mode=WAL')
+            # A feed lost in a power cut is rebuilt on the next visit
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, user_id: str) -> Optional[Feed]:
+        row = self._connect().execute(
+            'SELECT signature, positions, scores, cf_weight, built_at FROM feeds WHERE user_id = ?',
+            (user_id,)).fetchone()
+        if row is None:
+            return None
+        signature, positions, scores, cf_weight, built_at = row
+        return Feed(signature, np.frombuffer(positions, dtype=np.int32), np.frombuffer(scores, dtype=np.float32),
+                    cf_weight, built_at)
+
+    def put(self, user_id: str, feed: Feed):
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO feeds (user_id, signature, positions, scores, cf_weight, built_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (user_id, feed.signature, np.asarray(feed.positions, dtype=np.int32).tobytes(),
+                 np.asarray(feed.scores, dtype=np.float32).tobytes(), float(feed.cf_weight), feed.built_at))
+
+    def prune(self, max_age: float = FEED_MAX_AGE) -> int:
+        """Delete feeds not rebuilt within max_age seconds; returns how many."""
+        with self._connect() as conn:
+            return conn.execute('DELETE FROM feeds WHERE built_at < ?', (time.time() - max_age,)).rowcount
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+# score(bundle, user_id, ratings, watchlist, n) -> (positions, scores, cf_weight)
+Scorer = Callable[[object, str, Dict[str, Dict], List[int], int], Tuple[np.ndarray, np.ndarray, float]]
+
+
+class FeedWorker:
+    """Keeps the feed of every recently active user current from a background thread.
+
+    Users become active through touch() (e.g. when they open the For You view). The
+    rating and watchlist listeners (on_rating, on_watchlist) bump a per-user write
+    counter and wake the sweep early. A sweep skips every user whose counter and
+    served model version are unchanged since they were last checked, so an idle user
+    costs two dict lookups. For the others it compares the stored feed's signature
+    with one computed from their current ratings, watchlist and model version, and
+    rescores only the users whose signature changed. Writes that reach no listener
+    (imports, other worker processes) are picked up by feed() when the user next
+    opens the view.
+    """
+
+    def __init__(self, feeds: FeedStore, users, current_bundle: Callable[[], object], score: Scorer,
+                 interval: float = REFRESH_INTERVAL, active_seconds: float = ACTIVE_SECONDS,
+                 feed_size: int = FEED_SIZE, start: bool = True):
+        self.feeds = feeds
+        self.users = users
+        self.current_bundle = current_bundle
+        self.score = score
+        self.interval = interval
+        self.active_seconds = active_seconds
+        self.feed_size = feed_size
+        self.sweeps = 0
+        self.refreshed = 0
+        self.last_error: Optional[str] = None
+        self._active: Dict[str, float] = {}
+        # Signature of each active user's stored feed, so a sweep doesn't re-read it
+        self._signatures: Dict[str, str] = {}
+        # Writes seen by the listeners per active user, and (model version, writes) at their last check
+        self._writes: Dict[str, int] = {}
+        self._checked: Dict[str, Tuple[str, int]] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._last_prune = 0.0
+        self._thread = threading.Thread(target=self._run, name='feed-worker', daemon=True)
+        if start:
+            self._thread.start()
+            atexit.register(self.close)
+
+    def touch(self, user_id: str):
+        """Mark user_id active (kept up to date for the next active_seconds)."""
+        with self._lock:
+            self._active[user_id] = time.monotonic()
+
+    def on_rating(self, user_id: str, movie_id: int, rating: Optional[float]):
+        """Rating listener: refresh an active user's feed without waiting for the next sweep."""
+        self._written(user_id)
+
+    def on_watchlist(self, user_id: str, movie_id: int, added: bool):
+        """Watchlist listener: as on_rating (watchlisted movies are left out of the feed)."""
+        self._written(user_id)
+
+    def feed(self, bundle, user_id: str, ratings: Dict[str, Dict], watchlist: List[int]) -> Feed:
+        """The user's current feed: the stored one if its signature matches, else scored now and stored."""
+        signature = feed_signature(bundle.version, ratings, watchlist)
+        feed = self.feeds.get(user_id)
+        if feed is None or feed.signature != signature:
+            feed = self._build(bundle, user_id, ratings, watchlist, signature)
+        return feed
+
+    def refresh(self) -> int:
+        """One sweep over the active users; returns how many feeds were rebuilt."""
+        bundle = self.current_bundle()
+        if bundle is None:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            for user_id in [u for u, seen in self._active.items() if now - seen > self.active_seconds]:
+                del self._active[user_id]
+                self._signatures.pop(user_id, None)
+                self._writes.pop(user_id, None)
+                self._checked.pop(user_id, None)
+            # Counters are read before the user's state, so a write racing the sweep is rechecked next time
+            changed = [(user_id, (bundle.version, self._writes.get(user_id, 0))) for user_id in self._active
+                       if self._checked.get(user_id) != (bundle.version, self._writes.get(user_id, 0))]
+        rebuilt = 0
+        for user_id, checked in changed:
+            ratings = self.users.get_ratings(user_id)
+            watchlist = self.users.get_watchlist(user_id)
+            signature = feed_signature(bundle.version, ratings, watchlist)
+            with self._lock:
+                known = self._signatures.get(user_id)
+            if known is None:
+                stored = self.feeds.get(user_id)
+                known = stored.signature if stored is not None else None
+            if known != signature:
+                self._build(bundle, user_id, ratings, watchlist, signature)
+                rebuilt += 1
+            with self._lock:
+                self._signatures[user_id] = signature
+                if user_id in self._active:
+                    self._checked[user_id] = checked
+        self.sweeps += 1
+        self.refreshed += rebuilt
+        if time.time() - self._last_prune > FEED_MAX_AGE / 7:
+            self._last_prune = time.time()
+            self.feeds.prune()
+        return rebuilt
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    # --- Internals ---
+    def _build(self, bundle, user_id: str, ratings: Dict[str, Dict], watchlist: List[int], signature: str) -> Feed:
+        positions, scores, cf_weight = self.score(bundle, user_id, ratings, watchlist, self.feed_size)
+        feed = Feed(signature, np.asarray(positions, dtype=np.int32), np.asarray(scores, dtype=np.float32),
+                    float(cf_weight), time.time())
+        self.feeds.put(user_id, feed)
+        with self._lock:
+            self._signatures[user_id] = signature
+        return feed
+
+    def _written(self, user_id: str):
+        with self._lock:
+            if user_id not in self._active:
+                return
+            self._writes[user_id] = self._writes.get(user_id, 0) + 1
+        self._wake.set()
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._closed:
+                break
+            try:
+                self.refresh()
+            except Exception as e:
+                self.last_error = str(e)
@@ -1,27 +1,58 @@
 # user_management.py - User rating system and session management
 import streamlit as st
 import pandas as pd
-import json
-import os
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional, Tuple
 import hashlib
 import time
 
+from rating_import import TitleMatcher, import_ops, parse_ratings_csv, rating_scale
+from user_stats import UserStatsCache, compute_user_stats, id_index
+from user_store import ShardedUserStore
+
+# Callbacks run after a rating is saved: listener(user_id, movie_id, rating)
+_rating_listeners: List[Callable[[str, int, float], None]] = []
+
+def add_rating_listener(listener: Callable[[str, int, float], None]):
+    """Register a callback for saved ratings (e.g. to update a recommender profile)."""
+    if listener not in _rating_listeners:
+        _rating_listeners.append(listener)
+
+def remove_rating_listener(listener: Callable[[str, int, float], None]):
+    """Unregister a rating callback."""
+    if listener in _rating_listeners:
+        _rating_listeners.remove(listener)
+
+# Callbacks run after a watchlist change: listener(user_id, movie_id, added)
+_watchlist_listeners: List[Callable[[str, int, bool], None]] = []
+
+def add_watchlist_listener(listener: Callable[[str, int, bool], None]):
+    """Register a callback for watchlist additions and removals."""
+    if listener not in _watchlist_listeners:
+        _watchlist_listeners.append(listener)
+
+def remove_watchlist_listener(listener: Callable[[str, int, bool], None]):
+    """Unregister a watchlist callback."""
+    if listener in _watchlist_listeners:
+        _watchlist_listeners.remove(listener)
+
+# Dashboard statistics of recently seen users, dropped on each of their writes
+_user_stats = UserStatsCache()
+
+@st.cache_resource
+def get_user_store() -> ShardedUserStore:
+    """The process-wide user store: sharded SQLite databases, each behind a write-behind
+    cache, so widgets read user state from memory (legacy data is imported on first use)."""
+    return ShardedUserStore.open()
+
 class UserManager:
-    """Manages user ratings, preferences, and session data."""
-    
-    def __init__(self):
-        self.ratings_file = "user_ratings.json"
-        self.preferences_file = "user_preferences.json"
-        self.session_file = "user_sessions.json"
-        self.ensure_files_exist()
+    """Manages user ratings, preferences, and session data.
+
+    Data lives in the process-wide user store (see user_store.py); every call reads
+    or writes only the current user's state, so creating a UserManager per widget is cheap.
+    """
     
-    def ensure_files_exist(self):
-        """Create data files if they don't exist."""
-        for file_path in [self.ratings_file, self.preferences_file, self.session_file]:
-            if not os.path.exists(file_path):
-                with open(file_path, 'w') as f:
-                    json.dump({}, f)
+    def __init__(self, store: Optional[ShardedUserStore] = None):
+        self.store = store if store is not None else get_user_store()
     
     def get_user_id(self) -> str:
         """Get or create a unique user ID for the session."""
@@ -31,176 +62,100 @@ class UserManager:
             st.session_state.user_id = hashlib.md5(session_info.encode()).hexdigest()[:12]
         return st.session_state.user_id
     
-    def load_ratings(self) -> Dict:
-        """Load user ratings from file."""
-        try:
-            with open(self.ratings_file, 'r') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {}
-    
-    def save_ratings(self, ratings: Dict):
-        """Save user ratings to file."""
-        with open(self.ratings_file, 'w') as f:
-            json.dump(ratings, f, indent=2)
-    
     def rate_movie(self, movie_id: int, rating: float) -> bool:
         """Rate a movie (1-10 scale)."""
         user_id = self.get_user_id()
-        ratings = self.load_ratings()
-        
-        if user_id not in ratings:
-            ratings[user_id] = {}
-        
-        ratings[user_id][str(movie_id)] = {
-            'rating': rating,
-            'timestamp': time.time()
-        }
-        
-        self.save_ratings(ratings)
+        self.store.set_rating(user_id, movie_id, rating)
+        _user_stats.invalidate(user_id)
+        for listener in list(_rating_listeners):
+            listener(user_id, movie_id, rating)
         return True
     
-    def get_user_ratings(self) -> Dict[str, float]:
-        """Get current user's ratings."""
+    def import_ratings(self, bundle, source) -> Dict:
+        """Import a rating history CSV (title, year, rating) against a model bundle's catalog.
+
+        Titles are matched in one batch (see rating_import.py) and every matched rating
+        is written in one store transaction. Rating listeners aren't called per row: the
+        taste profile and For You feed pick the new ratings up from the store when the
+        user next opens them, and the collaborative model at its next build. Returns the counts plus the rows to review.
+        """
         user_id = self.get_user_id()
-        ratings = self.load_ratings()
-        return ratings.get(user_id, {})
+        rows, problems = parse_ratings_csv(source)
+        matcher = bundle.resource('title_matcher', lambda b: TitleMatcher(
+            b.search_index.normalized, b.movies['release_year'].to_numpy(dtype=float)))
+        matches = matcher.match(rows)
+        ops = import_ops(user_id, matches, bundle.movies['id'].to_numpy(), rating_scale(rows), time.time())
+        self.store.apply(ops)
+        _user_stats.invalidate(user_id)
+        return {
+            'imported': len(ops),
+            'low_confidence': [m for m in matches if m.position is not None and not m.confident],
+            'unmatched': [m.row for m in matches if m.position is None],
+            'problems': problems,
+        }
+    
+    def get_user_ratings(self) -> Dict[str, Dict]:
+        """Get current user's ratings."""
+        return self.store.get_ratings(self.get_user_id())
     
     def get_movie_rating(self, movie_id: int) -> Optional[float]:
         """Get user's rating for a specific movie."""
-        user_ratings = self.get_user_ratings()
-        return user_ratings.get(str(movie_id), {}).get('rating')
-    
-    def load_preferences(self) -> Dict:
-        """Load user preferences."""
-        try:
-            with open(self.preferences_file, 'r') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {}
-    
-    def save_preferences(self, preferences: Dict):
-        """Save user preferences."""
-        with open(self.preferences_file, 'w') as f:
-            json.dump(preferences, f, indent=2)
+        return self.store.get_rating(self.get_user_id(), movie_id)
     
     def update_preferences(self, **kwargs):
         """Update user preferences."""
-        user_id = self.get_user_id()
-        preferences = self.load_preferences()
-        
-        if user_id not in preferences:
-            preferences[user_id] = {}
-        
-        preferences[user_id].update(kwargs)
-        self.save_preferences(preferences)
+        self.store.update_preferences(self.get_user_id(), kwargs)
     
     def get_preferences(self) -> Dict:
         """Get current user's preferences."""
-        user_id = self.get_user_id()
-        preferences = self.load_preferences()
-        return preferences.get(user_id, {})
+        return self.store.get_preferences(self.get_user_id())
     
     def add_to_watchlist(self, movie_id: int):
         """Add movie to user's watchlist."""
         user_id = self.get_user_id()
-        preferences = self.load_preferences()
-        
-        if user_id not in preferences:
-            preferences[user_id] = {}
-        
-        if 'watchlist' not in preferences[user_id]:
-            preferences[user_id]['watchlist'] = []
-        
-        if movie_id not in preferences[user_id]['watchlist']:
-            preferences[user_id]['watchlist'].append(movie_id)
-            self.save_preferences(preferences)
-            return True
-        return False
+        changed = self.store.add_to_watchlist(user_id, movie_id)
+        _user_stats.invalidate(user_id)
+        if changed:
+            for listener in list(_watchlist_listeners):
+                listener(user_id, movie_id, True)
+        return changed
     
     def remove_from_watchlist(self, movie_id: int):
         """Remove movie from user's watchlist."""
         user_id = self.get_user_id()
-        preferences = self.load_preferences()
-        
-        if user_id in preferences and 'watchlist' in preferences[user_id]:
-            if movie_id in preferences[user_id]['watchlist']:
-                preferences[user_id]['watchlist'].remove(movie_id)
-                self.save_preferences(preferences)
-                return True
-        return False
+        changed = self.store.remove_from_watchlist(user_id, movie_id)
+        _user_stats.invalidate(user_id)
+        if changed:
+            for listener in list(_watchlist_listeners):
+                listener(user_id, movie_id, False)
+        return changed
     
     def get_watchlist(self) -> List[int]:
         """Get user's watchlist."""
-        preferences = self.get_preferences()
-        return preferences.get('watchlist', [])
+        return self.store.get_watchlist(self.get_user_id())
     
     def is_in_watchlist(self, movie_id: int) -> bool:
         """Check if movie is in user's watchlist."""
-        return movie_id in self.get_watchlist()
+        return self.store.in_watchlist(self.get_user_id(), movie_id)
     
-    def get_user_stats(self) -> Dict:
-        """Get user statistics."""
-        ratings = self.get_user_ratings()
-        watchlist = self.get_watchlist()
-        
-        return {
-            'movies_rated': len(ratings),
-            'watchlist_size': len(watchlist),
-            'average_rating': sum(r['rating'] for r in ratings.values()) / len(ratings) if ratings else 0,
-            'favorite_genres': self.get_favorite_genres(),
-            'favorite_actors': self.get_favorite_actors()
-        }
+    def get_user_stats(self, bundle) -> Dict:
+        """Dashboard statistics for the current user against a model bundle's catalog.
+
+        Computed in one vectorized pass (see user_stats.py) and cached per user until
+        they rate a movie or change their watchlist.
+        """
+        user_id = self.get_user_id()
+        index = bundle.resource('id_index', lambda b: id_index(b.movies))
+        return _user_stats.get(user_id, bundle.version, lambda: compute_user_stats(
+            self.get_user_ratings(), len(self.get_watchlist()), bundle.movies, bundle.details, index))
     
-    def get_favorite_genres(self, movies_df: pd.DataFrame) -> List[str]:
-        """Get user's favorite genres based on ratings."""
-        user_ratings = self.get_user_ratings()
-        if not user_ratings:
-            return []
-        
-        # Get movies user has rated highly (7+)
-        high_rated_movies = [
-            movie_id for movie_id, rating_data in user_ratings.items()
-            if rating_data['rating'] >= 7.0
-        ]
-        
-        # Count genres from highly rated movies
-        genre_counts = {}
-        for movie_id in high_rated_movies:
-            try:
-                movie = movies_df[movies_df['id'] == int(movie_id)].iloc[0]
-                for genre in movie['genres']:
-                    genre_counts[genre] = genre_counts.get(genre, 0) + 1
-            except (IndexError, ValueError):
-                continue
-        
-        # Return top 5 genres
-        return sorted(genre_counts.items(), key=lambda x: x[1], reverse=True)[:5]
+    def get_favorite_genres(self, bundle) -> List[Tuple[str, int]]:
+        """(genre, count) of the user's top genres among movies they rated 7+."""
+        return self.get_user_stats(bundle)['favorite_genres']
     
-    def get_favorite_actors(self, movies_df: pd.DataFrame) -> List[str]:
-        """Get user's favorite actors based on ratings."""
-        user_ratings = self.get_user_ratings()
-        if not user_ratings:
-            return []
-        
-        # Get movies user has rated highly (7+)
-        high_rated_movies = [
-            movie_id for movie_id, rating_data in user_ratings.items()
-            if rating_data['rating'] >= 7.0
-        ]
-        
-        # Count actors from highly rated movies
-        actor_counts = {}
-        for movie_id in high_rated_movies:
-            try:
-                movie = movies_df[movies_df['id'] == int(movie_id)].iloc[0]
-                for actor in movie['cast'][:3]:  # Top 3 cast members
-                    actor_counts[actor] = actor_counts.get(actor, 0) + 1
-            except (IndexError, ValueError):
-                continue
-        
-        # Return top 5 actors
-        return sorted(actor_counts.items(), key=lambda x: x[1], reverse=True)[:5]
+    def get_favorite_actors(self, bundle) -> List[Tuple[str, int]]:
+        """(actor, count) of the user's top actors (top-billed cast) among movies they rated 7+."""
+        return self.get_user_stats(bundle)['favorite_actors']
 
 def display_rating_widget(movie_id: int, movie_title: str, current_rating: Optional[float] = None):
     """Display a rating widget for a movie."""
@@ -242,10 +197,11 @@ def display_watchlist_widget(movie_id: int, movie_title: str):
             st.success(f"Added {movie_title} to watchlist!")
             st.rerun()
 
-def display_user_dashboard(movies_df: pd.DataFrame):
+def display_user_dashboard(bundle):
     """Display user dashboard with stats and preferences."""
+    movies_df = bundle.movies
     user_manager = UserManager()
-    stats = user_manager.get_user_stats()
+    stats = user_manager.get_user_stats(bundle)
     
     st.header("👤 Your Profile")
     
@@ -292,7 +248,9 @@ def display_user_dashboard(movies_df: pd.DataFrame):
         st.subheader("🎬 Your Favorite Actors")
         for actor, count in stats['favorite_actors']:
             st.write(f"• {actor} ({count} movies)")
-
-# Initialize user manager in session state
-if 'user_manager' not in st.session_state:
-    st.session_state.user_manager = UserManager()
+    
+    # Show ratings by decade
+    if stats['ratings_by_decade']:
+        st.subheader("📅 Your Ratings by Decade")
+        by_decade = pd.DataFrame(stats['ratings_by_decade'], columns=['Decade', 'Movies Rated', 'Avg Rating'])
+        st.bar_chart(by_decade.set_index(by_decade['Decade'].astype(str) + 's')['Movies Rated'])
@@ -0,0 +1,130 @@
+# user_stats.py - Dashboard statistics from a user's ratings joined to the compact catalog
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from catalog_store import CatalogDetails, ListColumn
+
+# Ratings at or above this count a movie's genres and cast as favourites
+HIGH_RATING = 7.0
+# Entries in the favourite genre and actor lists
+TOP_N = 5
+# Cast members counted per movie (the top-billed ones)
+TOP_BILLED = 3
+# Users whose statistics are kept per process, and seconds before a cached entry is
+# recomputed (catches writes made by other worker processes)
+MAX_CACHED_STATS = 1024
+STATS_TTL = 30.0
+
+
+def id_index(movies: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """(sorted movie ids, their row positions), for joining many ids to rows with one searchsorted."""
+    ids = movies['id'].to_numpy(dtype=np.int64)
+    order = np.argsort(ids, kind='stable')
+    return ids[order], order
+
+
+def join_ratings(ratings: Mapping[str, Dict], index: Tuple[np.ndarray, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """(row positions, ratings) of a user's rated movies that are in the catalog."""
+    sorted_ids, order = index
+    ids = np.fromiter((int(movie_id) for movie_id in ratings), dtype=np.int64, count=len(ratings))
+    values = np.fromiter((data['rating'] for data in ratings.values()), dtype=np.float64, count=len(ratings))
+    found = np.minimum(np.searchsorted(sorted_ids, ids), max(len(sorted_ids) - 1, 0))
+    hit = sorted_ids[found] == ids if len(sorted_ids) else np.zeros(len(ids), dtype=bool)
+    return order[found[hit]], values[hit]
+
+
+def list_counts(column: ListColumn, positions: np.ndarray, per_row: Optional[int] = None) -> np.ndarray:
+    """How many of the given rows hold each name (its first per_row entries only, if set), by code."""
+    offsets = np.asarray(column.offsets)
+    starts = offsets[positions]
+    lengths = offsets[positions + 1] - starts
+    if per_row is not None:
+        lengths = np.minimum(lengths, per_row)
+    # Index of every entry of every row, without a Python loop over rows
+    entries = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+    codes = np.asarray(column.codes)[entries]
+    return np.bincount(codes, minlength=len(column.names))
+
+
+def top_names(column: ListColumn, counts: np.ndarray, n: int = TOP_N) -> List[Tuple[str, int]]:
+    """The n names with the highest counts (ties alphabetical), as (name, count)."""
+    present = np.flatnonzero(counts)
+    best = present[np.lexsort((present, -counts[present]))][:n]
+    return [(column.names[int(code)], int(counts[code])) for code in best]
+
+
+def compute_user_stats(ratings: Mapping[str, Dict], watchlist_size: int, movies: pd.DataFrame,
+                       details: CatalogDetails, index: Tuple[np.ndarray, np.ndarray]) -> Dict:
+    """Rating count and average, favourite genres and actors, and ratings by decade.
+
+    The user's ratings are joined to catalog rows with one searchsorted. Genre and cast
+    counts are bincounts over the ListColumn codes of the highly rated rows. No
+    DataFrame row is built, so the cost grows with the number of ratings, not the catalog.
+    """
+    positions, values = join_ratings(ratings, index)
+    high = positions[values >= HIGH_RATING]
+    genres, cast = details.lists['genres'], details.lists['cast']
+
+    years = movies['release_year'].to_numpy(dtype=np.float64)[positions]
+    known = np.isfinite(years)
+    decades, inverse = np.unique((years[known] // 10 * 10).astype(np.int64), return_inverse=True)
+    counts = np.bincount(inverse, minlength=len(decades))
+    sums = np.bincount(inverse, weights=values[known], minlength=len(decades))
+
+    rated = sum(data['rating'] for data in ratings.values())
+    return {
+        'movies_rated': len(ratings),
+        'watchlist_size': watchlist_size,
+        'average_rating': rated / len(ratings) if ratings else 0,
+        'favorite_genres': top_names(genres, list_counts(genres, high)),
+        'favorite_actors': top_names(cast, list_counts(cast, high, TOP_BILLED)),
+        'ratings_by_decade': [(int(decade), int(count), float(total / count))
+                              for decade, count, total in zip(decades, counts, sums)],
+    }
+
+
+class UserStatsCache:
+    """Per-user statistics, computed once per model version and dropped when the user writes.
+
+    Entries also expire after ttl seconds so writes made through another worker
+    process show up; at most max_users are kept (LRU).
+    """
+
+    def __init__(self, max_users: int = MAX_CACHED_STATS, ttl: float = STATS_TTL):
+        self.max_users = max_users
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[str, float, Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by invalidate(), so a result computed across a write isn't cached
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: str, version: str, compute: Callable[[], Dict]) -> Dict:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] == version and time.monotonic() - entry[1] < self.ttl:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+            writes = self._writes
+        stats = compute()
+        with self._lock:
+            if self._writes != writes:
+                return stats
+            self._entries[user_id] = (version, time.monotonic(), stats)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+        return stats
+
+    def invalidate(self, user_id: str):
+        with self._lock:
+            self._writes += 1
+            self._entries.pop(user_id, None)
@@ -0,0 +1,828 @@
+# user_store.py - Sharded SQLite (WAL) storage for user ratings, preferences and watchlists, with a write-behind cache
+import argparse
+import atexit
+import hashlib
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import file_lock
+
+USER_DB = 'user_data.db'
+# Legacy whole-file stores, imported once into the database
+RATINGS_JSON = 'user_ratings.json'
+PREFERENCES_JSON = 'user_preferences.json'
+# Milliseconds a writer waits for another connection's write lock before failing
+BUSY_TIMEOUT_MS = 5000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ratings (
+    user_id TEXT NOT NULL,
+    movie_id INTEGER NOT NULL,
+    rating REAL NOT NULL,
+    timestamp REAL NOT NULL,
+    PRIMARY KEY (user_id, movie_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS preferences (
+    user_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (user_id, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS watchlist (
+    user_id TEXT NOT NULL,
+    movie_id INTEGER NOT NULL,
+    added_at REAL NOT NULL,
+    PRIMARY KEY (user_id, movie_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def rating_op(user_id: str, movie_id: int, rating: float, timestamp: Optional[float] = None) -> Tuple:
+    """A write op for SQLiteUserStore.apply.
+
+    Every write is a (kind, user_id, *args) tuple of JSON-serializable values, so it
+    can be journaled and applied in batches. Applying an op again gives the same state:
+        ('rating', user_id, movie_id, rating, timestamp)
+        ('preferences', user_id, {key: value, ...})   # 'watchlist' replaces the list
+        ('watch_add', user_id, movie_id, added_at)
+        ('watch_remove', user_id, movie_id)
+    """
+    return ('rating', user_id, int(movie_id), float(rating), timestamp if timestamp is not None else time.time())
+
+
+class SQLiteUserStore:
+    """Per-user rows in one SQLite database in WAL mode.
+
+    Every table is keyed by (user_id, ...), so a read is an index range scan over one
+    user and a write is a single-row upsert in its own short transaction. WAL lets
+    readers proceed while a write commits, and concurrent sessions no longer replace
+    each other's changes the way whole-file JSON rewrites did. Each thread gets its
+    own connection (sqlite3 connections must not be shared across threads).
+    """
+
+    def __init__(self, path: str = USER_DB):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000)
+            conn.execute('PRAGMA journal_mode=WAL')
+            # Durable at each checkpoint; a power loss can drop only the last commits, never corrupt
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """Close this thread's connection."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # --- Ratings ---
+    def get_ratings(self, user_id: str) -> Dict[str, Dict]:
+        """{movie id as str: {'rating', 'timestamp'}} for one user (the UserManager format)."""
+        rows = self._connect().execute(
+            'SELECT movie_id, rating, timestamp FROM ratings WHERE user_id = ?', (user_id,))
+        return {str(movie_id): {'rating': rating, 'timestamp': timestamp} for movie_id, rating, timestamp in rows}
+
+    def get_rating(self, user_id: str, movie_id: int) -> Optional[float]:
+        row = self._connect().execute(
+            'SELECT rating FROM ratings WHERE user_id = ? AND movie_id = ?', (user_id, int(movie_id))).fetchone()
+        return row[0] if row is not None else None
+
+    def set_rating(self, user_id: str, movie_id: int, rating: float, timestamp: Optional[float] = None):
+        self.apply([rating_op(user_id, movie_id, rating, timestamp)])
+
+    # --- Preferences ---
+    def get_preferences(self, user_id: str) -> Dict:
+        """One user's preferences, with the watchlist under 'watchlist' (the UserManager format)."""
+        conn = self._connect()
+        preferences = {key: json.loads(value) for key, value in conn.execute(
+            'SELECT key, value FROM preferences WHERE user_id = ?', (user_id,))}
+        watchlist = self.get_watchlist(user_id)
+        if watchlist:
+            preferences['watchlist'] = watchlist
+        return preferences
+
+    def update_preferences(self, user_id: str, values: Dict):
+        """Upsert the given keys; 'watchlist' replaces the user's watchlist."""
+        self.apply([('preferences', user_id, dict(values))])
+
+    # --- Watchlist ---
+    def get_watchlist(self, user_id: str) -> List[int]:
+        """Movie ids in the order they were added."""
+        rows = self._connect().execute(
+            'SELECT movie_id FROM watchlist WHERE user_id = ? ORDER BY added_at', (user_id,))
+        return [movie_id for movie_id, in rows]
+
+    def in_watchlist(self, user_id: str, movie_id: int) -> bool:
+        row = self._connect().execute(
+            'SELECT 1 FROM watchlist WHERE user_id = ? AND movie_id = ?', (user_id, int(movie_id))).fetchone()
+        return row is not None
+
+    def add_to_watchlist(self, user_id: str, movie_id: int) -> bool:
+        """Add movie_id; False if it was already there."""
+        return self.apply([('watch_add', user_id, int(movie_id), time.time())]) > 0
+
+    def remove_from_watchlist(self, user_id: str, movie_id: int) -> bool:
+        """Remove movie_id; False if it wasn't there."""
+        return self.apply([('watch_remove', user_id, int(movie_id))]) > 0
+
+    # --- Writes ---
+    def apply(self, ops: Iterable[Tuple]) -> int:
+        """Apply write ops (see rating_op) in one transaction; returns the number of rows changed."""
+        changed = 0
+        with self._connect() as conn:
+            for op in ops:
+                changed += self._apply(conn, op)
+        return changed
+
+    def _apply(self, conn: sqlite3.Connection, op: Tuple) -> int:
+        kind, user_id, *args = op
+        if kind == 'rating':
+            movie_id, rating, timestamp = args
+            return conn.execute(
+                'INSERT INTO ratings (user_id, movie_id, rating, timestamp) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (user_id, movie_id) DO UPDATE SET rating = excluded.rating, timestamp = excluded.timestamp',
+                (user_id, movie_id, rating, timestamp)).rowcount
+        if kind == 'preferences':
+            values = dict(args[0])
+            watchlist = values.pop('watchlist', None)
+            changed = conn.executemany(
+                'INSERT INTO preferences (user_id, key, value) VALUES (?, ?, ?) '
+                'ON CONFLICT (user_id, key) DO UPDATE SET value = excluded.value',
+                [(user_id, key, json.dumps(value)) for key, value in values.items()]).rowcount
+            if watchlist is not None:
+                conn.execute('DELETE FROM watchlist WHERE user_id = ?', (user_id,))
+                self._insert_watchlist(conn, user_id, watchlist)
+            return changed
+        if kind == 'watch_add':
+            movie_id, added_at = args
+            return conn.execute('INSERT OR IGNORE INTO watchlist (user_id, movie_id, added_at) VALUES (?, ?, ?)',
+                                (user_id, movie_id, added_at)).rowcount
+        if kind == 'watch_remove':
+            return conn.execute('DELETE FROM watchlist WHERE user_id = ? AND movie_id = ?', (user_id, args[0])).rowcount
+        raise ValueError(f"Unknown user store op '{kind}'")
+
+    @staticmethod
+    def _insert_watchlist(conn: sqlite3.Connection, user_id: str, movie_ids: List[int]):
+        # Spaced timestamps keep the list order of migrated/replaced watchlists
+        base = time.time()
+        conn.executemany(
+            'INSERT OR IGNORE INTO watchlist (user_id, movie_id, added_at) VALUES (?, ?, ?)',
+            [(user_id, int(movie_id), base + i * 1e-6) for i, movie_id in enumerate(movie_ids)])
+
+    # --- Migration ---
+    def _migrated(self) -> bool:
+        return self._connect().execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone() is not None
+
+    def migrate_json(self, ratings_file: str = RATINGS_JSON, preferences_file: str = PREFERENCES_JSON) -> bool:
+        """Import the legacy JSON files once, in one transaction.
+
+        Returns True if this call imported them. The files are left in place; a meta
+        row records the migration so it never runs twice, even across processes.
+        """
+        if not (os.path.exists(ratings_file) or os.path.exists(preferences_file)) or self._migrated():
+            return False
+        with self._connect() as conn:
+            # BEGIN IMMEDIATE takes the write lock first, so only one process can migrate
+            conn.execute('BEGIN IMMEDIATE')
+            if self._migrated():
+                return False
+            for op in legacy_json_ops(ratings_file, preferences_file):
+                self._apply(conn, op)
+            conn.execute("INSERT INTO meta (key, value) VALUES ('json_migrated', ?)", (str(time.time()),))
+        return True
+
+    # --- Moving users between stores ---
+    def user_ids(self) -> List[str]:
+        """Every user with at least one row."""
+        rows = self._connect().execute(
+            'SELECT user_id FROM ratings UNION SELECT user_id FROM preferences UNION SELECT user_id FROM watchlist')
+        return [user_id for user_id, in rows]
+
+    def export_ops(self, user_ids: Optional[Iterable[str]] = None) -> List[Tuple]:
+        """Ops that recreate the given users' rows (every user's when None) in another store."""
+        users = self.user_ids() if user_ids is None else list(user_ids)
+        conn = self._connect()
+        ops = []
+        for user_id in users:
+            ops.extend(('rating', user_id, movie_id, rating, timestamp) for movie_id, rating, timestamp in conn.execute(
+                'SELECT movie_id, rating, timestamp FROM ratings WHERE user_id = ?', (user_id,)))
+            preferences = {key: json.loads(value) for key, value in conn.execute(
+                'SELECT key, value FROM preferences WHERE user_id = ?', (user_id,))}
+            if preferences:
+                ops.append(('preferences', user_id, preferences))
+            ops.extend(('watch_add', user_id, movie_id, added_at) for movie_id, added_at in conn.execute(
+                'SELECT movie_id, added_at FROM watchlist WHERE user_id = ?', (user_id,)))
+        return ops
+
+    def rating_rows(self) -> Iterator[Tuple[str, int, float]]:
+        """(user_id, movie_id, rating) for every stored rating, e.g. to train a model."""
+        return self._connect().execute('SELECT user_id, movie_id, rating FROM ratings')
+
+    def delete_users(self, user_ids: Iterable[str]) -> int:
+        """Delete every row of the given users in one transaction; returns the rows deleted."""
+        users = [(user_id,) for user_id in user_ids]
+        deleted = 0
+        with self._connect() as conn:
+            for table in ('ratings', 'preferences', 'watchlist'):
+                deleted += conn.executemany(f'DELETE FROM {table} WHERE user_id = ?', users).rowcount
+        return deleted
+
+
+def legacy_json_ops(ratings_file: str = RATINGS_JSON, preferences_file: str = PREFERENCES_JSON) -> List[Tuple]:
+    """The contents of the legacy whole-file JSON stores as write ops."""
+    def load(path: str) -> Dict:
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    ops = []
+    for user_id, movies in load(ratings_file).items():
+        ops.extend(rating_op(user_id, movie_id, data['rating'], float(data.get('timestamp', 0.0)))
+                   for movie_id, data in movies.items())
+    # Spaced timestamps keep each watchlist's order
+    base = time.time()
+    for user_id, preferences in load(preferences_file).items():
+        preferences = dict(preferences)
+        watchlist = preferences.pop('watchlist', [])
+        if preferences:
+            ops.append(('preferences', user_id, preferences))
+        ops.extend(('watch_add', user_id, int(movie_id), base + i * 1e-6) for i, movie_id in enumerate(watchlist))
+    return ops
+
+
+# Write-behind journals, one append-only file per process and flush generation
+JOURNAL_DIR = 'user_journal'
+# Seconds between background flushes of buffered writes to the database
+FLUSH_INTERVAL = 2.0
+# Buffered writes that trigger a flush before the interval is up
+MAX_PENDING = 500
+# Users whose state is kept in memory, least recently used dropped first
+MAX_CACHED_USERS = 10000
+# Seconds a cached user is served before their rows are re-read (picks up other processes' writes)
+CACHE_TTL = 30.0
+
+
+class _UserState:
+    """One user's ratings, preferences and watchlist (an insertion-ordered dict used as a set)."""
+
+    __slots__ = ('ratings', 'preferences', 'watchlist', 'loaded_at')
+
+    def __init__(self, ratings: Dict[str, Dict], preferences: Dict, watchlist: List[int]):
+        self.ratings = ratings
+        self.preferences = preferences
+        self.watchlist = dict.fromkeys(watchlist)
+        self.loaded_at = time.monotonic()
+
+    def apply(self, op: Tuple):
+        kind, _, *args = op
+        if kind == 'rating':
+            movie_id, rating, timestamp = args
+            self.ratings[str(movie_id)] = {'rating': rating, 'timestamp': timestamp}
+        elif kind == 'preferences':
+            values = dict(args[0])
+            watchlist = values.pop('watchlist', None)
+            self.preferences.update(values)
+            if watchlist is not None:
+                self.watchlist = dict.fromkeys(int(movie_id) for movie_id in watchlist)
+        elif kind == 'watch_add':
+            self.watchlist.setdefault(args[0])
+        elif kind == 'watch_remove':
+            self.watchlist.pop(args[0], None)
+
+
+class WriteBehindUserStore:
+    """A user store with reads served from memory and writes flushed to it in batches.
+
+    Same methods as SQLiteUserStore. A user's rows are read once and cached (LRU,
+    re-read after CACHE_TTL); rendering a page of cards with rating and watchlist
+    state is then a few dict lookups. A write updates the cached state, is appended
+    to this process's journal and fsynced before the call returns, then buffered.
+    A background thread applies the buffer to the database in one transaction every
+    flush_interval seconds (sooner once max_pending writes are waiting) and at exit.
+
+    Journals are rotated at each flush and deleted once their writes are committed.
+    Each is locked by its process, so at startup any journal nobody holds belongs to
+    a process that died before flushing and is replayed into the database. Ops are
+    idempotent, so a journal whose batch was already committed can be replayed safely.
+    """
+
+    def __init__(self, store: SQLiteUserStore, journal_dir: str = JOURNAL_DIR,
+                 flush_interval: float = FLUSH_INTERVAL, max_pending: int = MAX_PENDING,
+                 max_users: int = MAX_CACHED_USERS, ttl: float = CACHE_TTL):
+        self.store = store
+        self.journal_dir = journal_dir
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_users = max_users
+        self.ttl = ttl
+        self.flushes = 0
+        self.flushed_ops = 0
+        self.last_error: Optional[str] = None
+        self._users: "OrderedDict[str, _UserState]" = OrderedDict()
+        self._pending: List[Tuple] = []
+        self._flushing: List[Tuple] = []
+        # Journals whose ops are buffered or being flushed, oldest first
+        self._sealed: List[Tuple[str, object]] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        os.makedirs(journal_dir, exist_ok=True)
+        self.recovered = self.recover()
+        self._sequence = 0
+        self._journal_path, self._journal = self._open_journal()
+        self._thread = threading.Thread(target=self._run, name='user-store-flush', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # --- Reads ---
+    def get_ratings(self, user_id: str) -> Dict[str, Dict]:
+        state = self._state(user_id)
+        with self._lock:
+            return dict(state.ratings)
+
+    def get_rating(self, user_id: str, movie_id: int) -> Optional[float]:
+        state = self._state(user_id)
+        with self._lock:
+            rating = state.ratings.get(str(movie_id))
+        return rating['rating'] if rating is not None else None
+
+    def get_preferences(self, user_id: str) -> Dict:
+        state = self._state(user_id)
+        with self._lock:
+            preferences = dict(state.preferences)
+            if state.watchlist:
+                preferences['watchlist'] = list(state.watchlist)
+        return preferences
+
+    def get_watchlist(self, user_id: str) -> List[int]:
+        state = self._state(user_id)
+        with self._lock:
+            return list(state.watchlist)
+
+    def in_watchlist(self, user_id: str, movie_id: int) -> bool:
+        state = self._state(user_id)
+        with self._lock:
+            return int(movie_id) in state.watchlist
+
+    # --- Writes ---
+    def set_rating(self, user_id: str, movie_id: int, rating: float, timestamp: Optional[float] = None):
+        self._write(rating_op(user_id, movie_id, rating, timestamp))
+
+    def update_preferences(self, user_id: str, values: Dict):
+        self._write(('preferences', user_id, dict(values)))
+
+    def add_to_watchlist(self, user_id: str, movie_id: int) -> bool:
+        movie_id = int(movie_id)
+        return self._write(('watch_add', user_id, movie_id, time.time()), lambda s: movie_id not in s.watchlist)
+
+    def remove_from_watchlist(self, user_id: str, movie_id: int) -> bool:
+        movie_id = int(movie_id)
+        return self._write(('watch_remove', user_id, movie_id), lambda s: movie_id in s.watchlist)
+
+    def apply(self, ops: Iterable[Tuple]) -> int:
+        """Write a batch of ops (e.g. an import) together; returns how many were taken.
+
+        The batch is journaled with one write and one fsync, then committed right
+        away, so it lands in the database in one transaction rather than
+        trickling in over several flushes.
+        """
+        ops = list(ops)
+        if not ops:
+            return 0
+        loaded = {user_id: self._state(user_id) for user_id in dict.fromkeys(op[1] for op in ops)}
+        lines = "".join(json.dumps(op) + "\n" for op in ops)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("User store is closed")
+            self._journal.write(lines)
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+            for op in ops:
+                self._users.get(op[1], loaded[op[1]]).apply(op)
+            self._pending.extend(ops)
+        try:
+            self.flush()
+        except Exception as e:
+            # Already durable in the journal; the flusher retries
+            self.last_error = str(e)
+        return len(ops)
+
+    def rating_rows(self) -> Iterator[Tuple[str, int, float]]:
+        """Every rating, buffered writes included (they are committed first)."""
+        self.flush()
+        return self.store.rating_rows()
+
+    # --- Flushing ---
+    def flush(self) -> int:
+        """Commit buffered writes to the database now; returns the number of ops written."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch, self._pending = self._pending, []
+                self._flushing = batch
+                # New writes go to a fresh journal; this one is deleted once the batch commits
+                self._sealed.append((self._journal_path, self._journal))
+                sealed = list(self._sealed)
+                self._journal_path, self._journal = self._open_journal()
+            try:
+                self.store.apply(batch)
+            except Exception:
+                # Requeue ahead of newer writes; the sealed journals stay until a flush succeeds
+                with self._lock:
+                    self._pending = batch + self._pending
+                    self._flushing = []
+                raise
+            with self._lock:
+                self._flushing = []
+                self._sealed = self._sealed[len(sealed):]
+                self.flushes += 1
+                self.flushed_ops += len(batch)
+            for path, journal in sealed:
+                os.unlink(path)
+                journal.close()
+            return len(batch)
+
+    def close(self):
+        """Stop the flusher and commit what is buffered (idempotent; also run at exit)."""
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._thread.join()
+        try:
+            self.flush()
+        except Exception as e:
+            # The journals stay on disk and are replayed by the next process to start
+            self.last_error = str(e)
+        with self._lock:
+            if not self._pending:
+                os.unlink(self._journal_path)
+            self._journal.close()
+
+    def recover(self) -> int:
+        """Replay journals left by processes that died before flushing; returns the ops replayed."""
+        journals = []
+        for name in os.listdir(self.journal_dir):
+            parts = name.split('.')
+            if len(parts) == 3 and parts[2] == 'jsonl' and parts[0].isdigit() and parts[1].isdigit():
+                journals.append((int(parts[0]), int(parts[1]), os.path.join(self.journal_dir, name)))
+        replayed = 0
+        for _, _, path in sorted(journals):
+            try:
+                journal = open(path, 'a+')
+            except FileNotFoundError:
+                continue
+            if not file_lock.lock(journal, blocking=False):
+                # Its process is alive and will flush it
+                journal.close()
+                continue
+            journal.seek(0)
+            ops = []
+            for line in journal:
+                try:
+                    ops.append(tuple(json.loads(line)))
+                except ValueError:
+                    # A torn last line: that write was never acknowledged
+                    break
+            self.store.apply(ops)
+            replayed += len(ops)
+            os.unlink(path)
+            journal.close()
+        return replayed
+
+    # --- Internals ---
+    def _open_journal(self) -> Tuple[str, object]:
+        self._sequence += 1
+        path = os.path.join(self.journal_dir, f"{os.getpid()}.{self._sequence}.jsonl")
+        journal = open(path, 'a')
+        file_lock.lock(journal, blocking=False)
+        return path, journal
+
+    def _state(self, user_id: str) -> _UserState:
+        with self._lock:
+            state = self._users.get(user_id)
+            if state is not None and time.monotonic() - state.loaded_at < self.ttl:
+                self._users.move_to_end(user_id)
+                return state
+            flushes = self.flushes
+        while True:
+            preferences = self.store.get_preferences(user_id)
+            watchlist = preferences.pop('watchlist', [])
+            state = _UserState(self.store.get_ratings(user_id), preferences, watchlist)
+            with self._lock:
+                if self.flushes != flushes:
+                    # A batch committed mid-read; it may be in some rows and not others
+                    flushes = self.flushes
+                    continue
+                # Writes not in the database yet go on top of what was read
+                for op in self._flushing + self._pending:
+                    if op[1] == user_id:
+                        state.apply(op)
+                self._users[user_id] = state
+                self._users.move_to_end(user_id)
+                while len(self._users) > self.max_users:
+                    self._users.popitem(last=False)
+                return state
+
+    def _write(self, op: Tuple, changes: Optional[Callable[[_UserState], bool]] = None) -> bool:
+        """Journal op durably, then apply it to the cached state and buffer it.
+
+        changes(state) decides whether op changes anything (a no-op is neither
+        journaled nor buffered); the result is what the write method returns.
+        """
+        loaded = self._state(op[1])
+        line = json.dumps(op) + "\n"
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("User store is closed")
+            state = self._users.get(op[1], loaded)
+            if changes is not None and not changes(state):
+                return False
+            self._journal.write(line)
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+            state.apply(op)
+            self._pending.append(op)
+            if len(self._pending) >= self.max_pending:
+                self._wake.set()
+        return True
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            if self._closed:
+                break
+            try:
+                self.flush()
+            except Exception as e:
+                self.last_error = str(e)
+
+
+# Sharded layout: one SQLite database per shard, users placed by a hash of user_id
+SHARD_DIR = 'user_shards'
+DEFAULT_SHARDS = 8
+LAYOUT_FILE = 'layout.json'
+# Held shared by every process using the shards, exclusively while they're created or rebalanced
+LAYOUT_LOCK = 'layout.lock'
+
+
+def user_key(user_id: str) -> int:
+    """Stable 64-bit hash of a user id (Python's hash() is salted per process)."""
+    return int.from_bytes(hashlib.blake2b(user_id.encode(), digest_size=8).digest(), 'little')
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """Jump consistent hash: the bucket of key among `buckets`.
+
+    Growing from n to m buckets moves only the keys that land in the new buckets
+    (about (m - n) / m of them); no key moves between existing buckets.
+    """
+    bucket, jump = -1, 0
+    while jump < buckets:
+        bucket = jump
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        jump = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def shard_of(user_id: str, shards: int) -> int:
+    return jump_hash(user_key(user_id), shards)
+
+
+class ShardedUserStore:
+    """User state spread over shard stores by a hash of user_id.
+
+    Each shard is its own SQLite database, behind its own write-behind cache with
+    its own lock, journal and flusher (see WriteBehindUserStore), so one user's
+    reads and writes touch only that user's shard and sessions of users on
+    different shards never wait for each other. Same methods as SQLiteUserStore.
+
+    The shard count lives in the shard directory's layout file; open() creates the
+    layout on first use and imports the single-database store and legacy JSON files.
+    Every process holds a shared lock on the layout while it has the shards open;
+    rebalance() needs it exclusively, so it only runs while the app is stopped.
+    """
+
+    def __init__(self, shards: List, lock_file=None):
+        self.shards = shards
+        self._lock_file = lock_file
+
+    @classmethod
+    def open(cls, directory: str = SHARD_DIR, journal_dir: str = JOURNAL_DIR, shards: int = DEFAULT_SHARDS,
+             write_behind: bool = True) -> "ShardedUserStore":
+        """Open the shards under directory, creating `shards` of them on first use."""
+        os.makedirs(directory, exist_ok=True)
+        lock_file = open(os.path.join(directory, LAYOUT_LOCK), 'a')
+        # Shared for as long as the shards are open: other processes may open them too, nobody may rebalance
+        file_lock.lock(lock_file, shared=True)
+        layout = read_layout(directory)
+        if layout is None:
+            # First use: one process creates the layout while the others wait
+            file_lock.lock(lock_file)
+            try:
+                layout = read_layout(directory) or create_layout(directory, shards)
+            finally:
+                file_lock.lock(lock_file, shared=True)
+        stores = [SQLiteUserStore(shard_path(directory, i)) for i in range(layout['shards'])]
+        if write_behind:
+            stores = [WriteBehindUserStore(store, os.path.join(journal_dir, f"shard-{i:04d}"),
+                                           max_users=max(MAX_CACHED_USERS // len(stores), 1))
+                      for i, store in enumerate(stores)]
+        return cls(stores, lock_file)
+
+    def shard(self, user_id: str):
+        """The store holding user_id."""
+        return self.shards[shard_of(user_id, len(self.shards))]
+
+    # --- Per-user reads and writes, routed to one shard ---
+    def get_ratings(self, user_id: str) -> Dict[str, Dict]:
+        return self.shard(user_id).get_ratings(user_id)
+
+    def get_rating(self, user_id: str, movie_id: int) -> Optional[float]:
+        return self.shard(user_id).get_rating(user_id, movie_id)
+
+    def set_rating(self, user_id: str, movie_id: int, rating: float, timestamp: Optional[float] = None):
+        self.shard(user_id).set_rating(user_id, movie_id, rating, timestamp)
+
+    def get_preferences(self, user_id: str) -> Dict:
+        return self.shard(user_id).get_preferences(user_id)
+
+    def update_preferences(self, user_id: str, values: Dict):
+        self.shard(user_id).update_preferences(user_id, values)
+
+    def get_watchlist(self, user_id: str) -> List[int]:
+        return self.shard(user_id).get_watchlist(user_id)
+
+    def in_watchlist(self, user_id: str, movie_id: int) -> bool:
+        return self.shard(user_id).in_watchlist(user_id, movie_id)
+
+    def add_to_watchlist(self, user_id: str, movie_id: int) -> bool:
+        return self.shard(user_id).add_to_watchlist(user_id, movie_id)
+
+    def remove_from_watchlist(self, user_id: str, movie_id: int) -> bool:
+        return self.shard(user_id).remove_from_watchlist(user_id, movie_id)
+
+    def apply(self, ops: Iterable[Tuple]) -> int:
+        """Apply ops, one batch per shard."""
+        by_shard: Dict[int, List[Tuple]] = {}
+        for op in ops:
+            by_shard.setdefault(shard_of(op[1], len(self.shards)), []).append(op)
+        return sum(self.shards[i].apply(batch) for i, batch in by_shard.items())
+
+    def rating_rows(self) -> Iterator[Tuple[str, int, float]]:
+        """Every rating across the shards."""
+        return itertools.chain.from_iterable(store.rating_rows() for store in self.shards)
+
+    def flush(self) -> int:
+        return sum(store.flush() for store in self.shards if hasattr(store, 'flush'))
+
+    def close(self):
+        for store in self.shards:
+            store.close()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+
+def shard_path(directory: str, index: int) -> str:
+    return os.path.join(directory, f"shard-{index:04d}.db")
+
+
+def read_layout(directory: str = SHARD_DIR) -> Optional[Dict]:
+    try:
+        with open(os.path.join(directory, LAYOUT_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_layout(directory: str, layout: Dict):
+    """Atomic rename, so a reader sees the old layout or the new one."""
+    path = os.path.join(directory, LAYOUT_FILE)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(layout, f, indent=2)
+    os.replace(tmp, path)
+
+
+def create_layout(directory: str, shards: int, legacy_db: str = USER_DB, ratings_file: str = RATINGS_JSON,
+                  preferences_file: str = PREFERENCES_JSON) -> Dict:
+    """Create empty shards and import the single-database store (or, failing that, the JSON files)."""
+    for i in range(shards):
+        if os.path.exists(shard_path(directory, i)):
+            os.unlink(shard_path(directory, i))
+    stores = [SQLiteUserStore(shard_path(directory, i)) for i in range(shards)]
+    if os.path.exists(legacy_db):
+        legacy = SQLiteUserStore(legacy_db)
+        legacy.migrate_json(ratings_file, preferences_file)
+        ops, source = legacy.export_ops(), legacy_db
+    else:
+        ops, source = legacy_json_ops(ratings_file, preferences_file), 'json'
+    ShardedUserStore(stores).apply(ops)
+    layout = {'shards': shards, 'imported_from': source, 'imported_ops': len(ops), 'created_at': time.time()}
+    # Written last: until it exists the next process to start redoes the import
+    write_layout(directory, layout)
+    return layout
+
+
+def rebalance(directory: str = SHARD_DIR, journal_dir: str = JOURNAL_DIR, shards: int = DEFAULT_SHARDS) -> Dict:
+    """Grow the shard count to `shards`, moving only the users whose shard changes.
+
+    Needs the layout lock exclusively (raises RuntimeError while any process has the
+    shards open). Unflushed journals are replayed first. Movers are copied to their new
+    shard, then the layout is switched, then they're deleted from their old shard, so
+    an interruption at any point is repaired by running rebalance again.
+    """
+    lock_file = open(os.path.join(directory, LAYOUT_LOCK), 'a')
+    try:
+        if not file_lock.lock(lock_file, blocking=False):
+            raise RuntimeError("User shards are open in another process; stop the app before rebalancing")
+        layout = read_layout(directory)
+        if layout is None:
+            raise RuntimeError(f"No shard layout in {directory}")
+        old = layout['shards']
+        if shards < old:
+            raise ValueError(f"Shards can only be added ({old} -> {shards})")
+        for i in range(old):
+            WriteBehindUserStore(SQLiteUserStore(shard_path(directory, i)),
+                                 os.path.join(journal_dir, f"shard-{i:04d}")).close()
+        stores = [SQLiteUserStore(shard_path(directory, i)) for i in range(old)]
+        # Rows left behind by an interrupted rebalance: their users already live elsewhere
+        leftovers = _delete_strays(stores)
+
+        moved = 0
+        if shards > old:
+            for i in range(old, shards):
+                if os.path.exists(shard_path(directory, i)):
+                    os.unlink(shard_path(directory, i))
+            stores += [SQLiteUserStore(shard_path(directory, i)) for i in range(old, shards)]
+            for store in stores[:old]:
+                movers = [user_id for user_id in store.user_ids() if shard_of(user_id, shards) >= old]
+                by_target: Dict[int, List[Tuple]] = {}
+                for op in store.export_ops(movers):
+                    by_target.setdefault(shard_of(op[1], shards), []).append(op)
+                for target, ops in by_target.items():
+                    stores[target].apply(ops)
+                moved += len(movers)
+            layout = dict(layout, shards=shards, rebalanced_at=time.time())
+            write_layout(directory, layout)
+            _delete_strays(stores)
+        return {'shards': shards, 'previous_shards': old, 'moved_users': moved, 'leftover_rows_removed': leftovers}
+    finally:
+        lock_file.close()
+
+
+def _delete_strays(stores: List[SQLiteUserStore]) -> int:
+    """Delete, from each shard, the users that belong to another one."""
+    deleted = 0
+    for i, store in enumerate(stores):
+        deleted += store.delete_users([u for u in store.user_ids() if shard_of(u, len(stores)) != i])
+    return deleted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PopcornPicks user store maintenance")
+    commands = parser.add_subparsers(dest='command', required=True)
+    grow = commands.add_parser('rebalance', help="Grow the number of user shards (stop the app first)")
+    grow.add_argument('--shards', type=int, required=True)
+    grow.add_argument('--directory', default=SHARD_DIR)
+    grow.add_argument('--journal-dir', default=JOURNAL_DIR)
+    info = commands.add_parser('layout', help="Show the shard layout and users per shard")
+    info.add_argument('--directory', default=SHARD_DIR)
+    args = parser.parse_args()
+
+    if args.command == 'rebalance':
+        print(json.dumps(rebalance(args.directory, args.journal_dir, args.shards), indent=2))
+    else:
+        layout = read_layout(args.directory)
+        if layout is None:
+            raise SystemExit(f"No shard layout in {args.directory}")
+        for i in range(layout['shards']):
+            print(f"shard {i:4d}: {len(SQLiteUserStore(shard_path(args.directory, i)).user_ids()):>10,} users")
+
+
+if __name__ == "__main__":
+    main()